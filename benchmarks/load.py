@@ -0,0 +1,308 @@
+"""
+Load generator - many players playing at once, in a single process
+or in a pool of processes.
+
+    python benchmarks/load.py --sessions 200 --turns 50000
+    python benchmarks/load.py --world resources --mix go=1,look=1 --processes 2
+
+Every session is a game of its own in the shared world (see
+`OtherWorldGame.new_session()`). Sessions play random commands - a weighted
+mix of `go`, `take`, `drop`, `look` and `consume`, with exits and item codes
+valid at the moment - through `CliApp.handle_cmd()` in a random order.
+Players who die are replaced by new ones.
+
+Throughput and percentiles of turn latencies are reported. Everything random
+is seeded, so runs with the same arguments play the same turns with the same
+results. The digest of all the replies tells.
+"""
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import zlib
+
+from argparse import ArgumentParser
+from collections import Counter
+from itertools import accumulate
+from multiprocessing import get_context
+from pathlib import Path
+from random import Random
+from typing import Any, Optional
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "otherworld"))
+
+from app import CliApp                          # noqa: E402
+from charproperties import ROLLS, CharacterStats    # noqa: E402
+from constants import INVENTORY_PAGE_SIZE, PATH_CACHE   # noqa: E402
+from game import OtherWorldGame                 # noqa: E402
+from worldcache import WorldCache               # noqa: E402
+from worldgen import WorldGenerator             # noqa: E402
+
+
+# Relative frequencies of the commands played
+DEFAULT_MIX = "go=4,look=2,take=2,drop=1,consume=1"
+
+COMMANDS = ("go", "take", "drop", "look", "consume")
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def parse_mix(text: str) -> dict[str, int]:
+    """
+    Parse a command mix, e.g. `go=4,look=1`.
+
+    Raises:
+        ValueError: If the mix is invalid
+    """
+    mix = {}
+    for part in text.split(","):
+        cmd, _, weight = part.partition("=")
+        cmd = cmd.strip()
+        if cmd not in COMMANDS:
+            raise ValueError(f"Unknown command in the mix: {cmd}")
+        mix[cmd] = int(weight or 1)
+    if sum(mix.values()) <= 0:
+        raise ValueError("The mix has no commands.")
+    return mix
+
+
+def next_command(game: OtherWorldGame, rng: Random, names: list[str],
+    cum_weights: list[int]) -> str:
+    """
+    Choose the next command of a session. Targets of the commands are chosen
+    among the exits of the current map and the items on the first page
+    of the inventories.
+
+    Args:
+        game (OtherWorldGame): Game of the session
+        rng (Random): Random generator of the session
+        names (list[str]): Commands of the mix
+        cum_weights (list[int]): Cumulative weights of the commands
+
+    Returns:
+        str: The command
+    """
+    cmd = rng.choices(names, cum_weights=cum_weights)[0]
+    if cmd == "go":
+        exits = list(game.current_map.exits)
+        return f"go {rng.choice(exits)}" if exits else "look"
+    if cmd == "take":
+        inventory = game.map_inventory()
+    elif cmd in ("drop", "consume"):
+        inventory = game.player.inventory
+    else:
+        return cmd
+    # Commands without a target are played too, they fail
+    codes = [code for code, _ in inventory.iter_codes(0, INVENTORY_PAGE_SIZE)]
+    return f"{cmd} {rng.choice(codes) if codes else 'a'}"
+
+
+def run_sessions(world_dir: str, sessions: int, turns: int, mix: dict[str, int],
+    seed: int, first: int = 0, max_resident_maps: Optional[int] = None,
+    isolated: bool = False) -> dict[str, Any]:
+    """
+    Play turns of sessions in a world loaded by this process.
+
+    Args:
+        world_dir (str): Directory with the world
+        sessions (int): Number of sessions
+        turns (int): Number of turns of all the sessions together
+        mix (dict[str, int]): Command -> its weight
+        seed (int): Seed of the run
+        first (int, optional): Number of the first session, sessions
+            of a run get different numbers in every process. Defaults to 0.
+        max_resident_maps (Optional[int], optional): Maximum number of maps
+            kept in the memory. Defaults to None (all).
+        isolated (bool, optional): If the players have their own world
+            state. Defaults to False.
+
+    Returns:
+        dict[str, Any]: Elapsed time, turn latencies in nanoseconds, digest
+            of the replies, numbers of played commands and deaths
+    """
+    ROLLS.seed(seed)
+    app = CliApp(max_resident_maps, world_dir=world_dir, seed=seed)
+    names = list(mix)
+    cum_weights = list(accumulate(mix.values()))
+    rngs = [Random(f"{seed}:{first + x}") for x in range(sessions)]
+    order = Random(f"{seed}:order:{first}")
+
+    def new_game(idx: int) -> OtherWorldGame:
+        return app.game.new_session(f"player{first + idx}", isolated,
+            CharacterStats.roll(rngs[idx]))
+    games = [new_game(x) for x in range(sessions)]
+
+    latencies = np.zeros(turns, dtype=np.int64)
+    played: Counter = Counter()
+    digest = deaths = 0
+    started = time.perf_counter()
+    for turn in range(turns):
+        idx = order.randrange(sessions)
+        game = games[idx]
+        cmd = next_command(game, rngs[idx], names, cum_weights)
+        turn_started = time.perf_counter_ns()
+        msg, finished = app.handle_cmd(cmd, game)
+        msg_effects, death = game.end_turn()
+        latencies[turn] = time.perf_counter_ns() - turn_started
+
+        played[cmd.partition(" ")[0]] += 1
+        digest = zlib.crc32(f"{msg}\n{msg_effects}\n".encode(), digest)
+        if finished or death:
+            deaths += death
+            game.end_session()
+            games[idx] = new_game(idx)
+    elapsed = time.perf_counter() - started
+
+    app.close()
+    return {"elapsed": elapsed, "latencies": latencies, "digest": digest,
+        "played": dict(played), "deaths": deaths}
+
+
+def _run_sessions(args: tuple) -> dict[str, Any]:
+    return run_sessions(*args)
+
+
+def run(world_dir: str, sessions: int, turns: int, mix: dict[str, int], seed: int,
+    processes: int = 1, max_resident_maps: Optional[int] = None,
+    isolated: bool = False) -> dict[str, Any]:
+    """
+    Run the load test. With several processes, every process loads
+    the world and plays its share of sessions and turns, the world state
+    isn't shared among the processes.
+
+    Args:
+        world_dir (str): Directory with the world
+        sessions (int): Number of sessions
+        turns (int): Number of turns of all the sessions together
+        mix (dict[str, int]): Command -> its weight
+        seed (int): Seed of the run
+        processes (int, optional): Number of processes. Defaults to 1.
+        max_resident_maps (Optional[int], optional): Maximum number of maps
+            kept in the memory of a process. Defaults to None (all).
+        isolated (bool, optional): If the players have their own world
+            state. Defaults to False.
+
+    Returns:
+        dict[str, Any]: Report of the run
+    """
+    shares = []
+    first = 0
+    for idx in range(processes):
+        share = sessions // processes + (idx < sessions % processes)
+        share_turns = turns // processes + (idx < turns % processes)
+        shares.append((world_dir, share, share_turns, mix, seed, first,
+            max_resident_maps, isolated))
+        first += share
+
+    started = time.perf_counter()
+    if processes == 1:
+        parts = [run_sessions(*shares[0])]
+    else:
+        # Fill the world cache first, so the processes only read it
+        cache = WorldCache(PATH_CACHE)
+        cache.load()
+        world = OtherWorldGame(cache)
+        world.load_items(str(Path(world_dir) / "items"))
+        world.load_maps(str(Path(world_dir) / "maps"))
+        cache.save()
+        started = time.perf_counter()
+        with get_context("spawn").Pool(processes) as pool:
+            parts = pool.map(_run_sessions, shares)
+    elapsed = time.perf_counter() - started
+
+    latencies = np.concatenate([x["latencies"] for x in parts])
+    played: Counter = Counter()
+    for each in parts:
+        played.update(each["played"])
+    # The slowest process tells the throughput, loading worlds doesn't count
+    busy = max(x["elapsed"] for x in parts)
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "sessions": sessions,
+        "processes": processes,
+        "isolated": isolated,
+        "turns": int(latencies.size),
+        "elapsed": round(elapsed, 3),
+        "turns_per_s": round(latencies.size / busy, 1) if busy > 0 else 0.0,
+        "latency_us": {
+            **{f"p{x:g}": round(float(y) / 1000, 2)
+                for x, y in zip(PERCENTILES, np.percentile(latencies, PERCENTILES))},
+            "mean": round(float(latencies.mean()) / 1000, 2),
+            "max": round(float(latencies.max()) / 1000, 2),
+        },
+        "played": dict(sorted(played.items())),
+        "deaths": sum(x["deaths"] for x in parts),
+        "digest": f"{zlib.crc32(repr([x['digest'] for x in parts]).encode()):08x}",
+    }
+
+
+def render(report: dict[str, Any]) -> str:
+    latency = ", ".join(f"{k} {v:.1f}" for k, v in report["latency_us"].items())
+    played = ", ".join(f"{k} {v}" for k, v in report["played"].items())
+    return "\n".join([
+        f"Sessions: {report['sessions']} in {report['processes']} process(es)"
+            + (", isolated" if report["isolated"] else ""),
+        f"Turns: {report['turns']} ({report['turns_per_s']:.0f} turns/s)",
+        f"Latency (us): {latency}",
+        f"Played: {played}",
+        f"Deaths: {report['deaths']}",
+        f"Digest: {report['digest']}",
+    ])
+
+
+def parse_args():
+    parser = ArgumentParser(description="Simulate many players of the OtherWorld game.")
+    parser.add_argument("--world", metavar="DIR",
+        help="directory with the world, a world of --size maps is generated by default")
+    parser.add_argument("--size", type=int, default=1000,
+        help="number of maps of the generated world")
+    parser.add_argument("--sessions", type=int, default=100, help="number of players")
+    parser.add_argument("--turns", type=int, default=20000,
+        help="number of turns of all the players together")
+    parser.add_argument("--mix", default=DEFAULT_MIX,
+        help="weights of the commands played")
+    parser.add_argument("--processes", type=int, default=1,
+        help="number of processes, each with its own copy of the world")
+    parser.add_argument("--max-resident-maps", type=int, metavar="N",
+        help="load maps on demand and keep at most N of them in the memory")
+    parser.add_argument("--isolated", action="store_true",
+        help="give every player their own world state")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the run")
+    parser.add_argument("--output", metavar="FILE", help="write the report to FILE")
+    args = parser.parse_args()
+    try:
+        args.mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.sessions < 1 or args.processes < 1 or args.sessions < args.processes:
+        parser.error("Every process needs at least one session.")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="otherworld-load-") as tmp:
+        world_dir = args.world and str(Path(args.world).resolve())
+        if world_dir is None:
+            world_dir = str(Path(tmp) / "world")
+            WorldGenerator(args.size, max(30, args.size // 10),
+                seed=args.seed).write(world_dir)
+            # The world cache of CliApp is written relative to the working directory
+            os.chdir(tmp)
+        try:
+            report = run(world_dir, args.sessions, args.turns, args.mix, args.seed,
+                args.processes, args.max_resident_maps, args.isolated)
+        finally:
+            os.chdir(cwd)
+
+    print(render(report))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
@@ -0,0 +1,389 @@
+"""
+Benchmarks of the game's hot paths on generated worlds of several sizes.
+
+    python benchmarks/run.py --sizes 100,1000,10000 --output results.json
+    python benchmarks/run.py --compare results.json
+
+Results are written as JSON. With `--compare`, results slower than
+the baseline by more than `--threshold` are listed and the exit code is 1.
+"""
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+from argparse import ArgumentParser
+from itertools import cycle, islice
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "otherworld"))
+
+from app import CliApp                          # noqa: E402
+from charproperties import CharacterStats       # noqa: E402
+from constants import MAP_START                 # noqa: E402
+from effect import Effect                       # noqa: E402
+from game import OtherWorldGame                 # noqa: E402
+from inventory import DEFAULT_MAX_ITEMS, OtherWorldInventory    # noqa: E402
+from npc import OtherWorldNpc                   # noqa: E402
+from npcengine import NpcEngine                 # noqa: E402
+from persistence import GameJournal             # noqa: E402
+from player import Player                       # noqa: E402
+from worldcache import WorldCache               # noqa: E402
+from worldgen import WorldGenerator             # noqa: E402
+
+
+# Commands cycled by the `handle_cmd` benchmark, the player ends each cycle
+# on the start map
+COMMAND_CYCLE = ("look", "inventory", "examine a", "take a", "inventory",
+    "drop a", "go north", "look", "go south")
+
+# A restored game has changed inventories of this fraction of the maps and
+# replays this many commands of the journal after the snapshot
+RESTORE_DIRTY_FRACTION = 0.1
+RESTORE_JOURNAL = 500
+
+EFFECT_COUNTS = (1, 10, 100)
+
+NPC_COUNTS = (1000, 10000)
+
+# Numbers of item stacks of the benchmarked inventories
+INVENTORY_SIZES = (DEFAULT_MAX_ITEMS, 1000)
+
+# Size of the world checked to start on the start map, map IDs of large
+# worlds have more digits
+START_CHECK_MAPS = 100000
+
+
+def measure(fn: Callable[[], Any], number: int, repeat: int) -> float:
+    """
+    Measure a function.
+
+    Args:
+        fn (Callable[[], Any]): The function
+        number (int): Number of calls in a single measurement
+        repeat (int): Number of measurements
+
+    Returns:
+        float: Best time of a single call in nanoseconds
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter_ns() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / number
+
+
+def load_world(world: Path, cache: Optional[WorldCache] = None) -> OtherWorldGame:
+    game = OtherWorldGame(cache)
+    game.load_items(str(world / "items"))
+    game.load_maps(str(world / "maps"))
+    return game
+
+
+def check_start_map(world: Path, seed: int) -> None:
+    """
+    Check a large generated world can be started, i.e. its start map
+    is `MAP_START`.
+
+    Args:
+        world (Path): Directory to generate the world to
+        seed (int): Seed of the world generator
+
+    Raises:
+        RuntimeError: If the world doesn't start on `MAP_START`
+    """
+    WorldGenerator(START_CHECK_MAPS, 30, items_per_map=0, seed=seed).write(str(world))
+    game = OtherWorldGame(max_resident_maps=10)
+    game.load_items(str(world / "items"))
+    try:
+        game.load_maps(str(world / "maps"))
+    except KeyError:
+        raise RuntimeError(f"A world of {START_CHECK_MAPS} maps has no {MAP_START}") from None
+    if game.current_map.id != MAP_START:
+        raise RuntimeError(f"A world of {START_CHECK_MAPS} maps starts on {game.current_map.id}")
+
+
+def bench_world(world: Path, size: int, repeat: int) -> list[dict[str, Any]]:
+    """
+    Run the benchmarks depending on the world size.
+
+    Args:
+        world (Path): Directory with the generated world
+        size (int): Number of maps of the world
+        repeat (int): Number of measurements
+
+    Returns:
+        list[dict[str, Any]]: Results
+    """
+    results = []
+
+    def add(name: str, fn: Callable[[], Any], number: int) -> None:
+        results.append({"name": name, "maps": size, "number": number,
+            "ns_per_op": round(measure(fn, number, repeat), 1)})
+
+    add("load_world", lambda: load_world(world), 1)
+    cache = WorldCache(str(world / "cache.bin"))
+    load_world(world, cache)
+    add("load_world_cached", lambda: load_world(world, cache), 1)
+
+    app = CliApp(world_dir=str(world))
+    cmds = iter(())
+
+    def handle_cmd():
+        nonlocal cmds
+        cmd = next(cmds, None)
+        if cmd is None:
+            cmds = iter(COMMAND_CYCLE)
+            cmd = next(cmds)
+        app.handle_cmd(cmd)
+    add("handle_cmd", handle_cmd, 50 * len(COMMAND_CYCLE))
+
+    game = app.game
+    start_map = game.current_map
+    add("render_map", lambda: game.render_map(start_map), 10000)
+    add("render_map_uncached", lambda: game._render_map(start_map, start_map.inventory), 2000)
+    results.append(bench_restore(world, size, repeat))
+    return results
+
+
+def bench_restore(world: Path, size: int, repeat: int) -> dict[str, Any]:
+    """
+    Measure restoring a saved game - loading the snapshot and replaying
+    the journal tail. Loading the world isn't included.
+
+    Args:
+        world (Path): Directory with the generated world
+        size (int): Number of maps of the world
+        repeat (int): Number of measurements
+
+    Returns:
+        dict[str, Any]: Result
+    """
+    save_dir = world / "save"
+    app = CliApp(world_dir=str(world), save_dir=str(save_dir))
+    game = app.game
+    items = list(game.items.values())
+    dirty = max(1, int(size * RESTORE_DIRTY_FRACTION))
+    for idx, map_id in enumerate(list(islice(game.maps, dirty))):
+        game.map_inventory(map_id, writable=True).add_item(items[idx % len(items)])
+    app.journal.snapshot(game)
+    for cmd in islice(cycle(COMMAND_CYCLE), RESTORE_JOURNAL):
+        app.play_turn(cmd)
+    # Left without the final snapshot, as if the game has crashed
+
+    best = None
+    for _ in range(repeat):
+        app = CliApp(world_dir=str(world))
+        start = time.perf_counter_ns()
+        for cmd in GameJournal(str(save_dir)).load(app.game):
+            app.play_turn(cmd, record=False)
+        elapsed = time.perf_counter_ns() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {"name": "restore", "maps": size, "dirty_maps": dirty,
+        "journal": RESTORE_JOURNAL, "number": 1, "ns_per_op": round(best, 1)}
+
+
+def bench_inventory(items: list, repeat: int) -> list[dict[str, Any]]:
+    """
+    Run the inventory benchmarks, full inventories are used.
+
+    Args:
+        items (list): Items to put into the inventories
+        repeat (int): Number of measurements
+
+    Returns:
+        list[dict[str, Any]]: Results
+    """
+    results = []
+
+    def add(name: str, fn: Callable[[], Any], number: int) -> None:
+        results.append({"name": name, "stacks": len(items), "number": number,
+            "ns_per_op": round(measure(fn, number, repeat), 1)})
+
+    inventory = OtherWorldInventory("bench", len(items))
+    for each in items:
+        inventory.add_item(each)
+    codes = [code for code, _ in inventory.iter_codes()]
+
+    def cycle(seq):
+        while True:
+            yield from seq
+    item_cycle, code_cycle = cycle(items), cycle(codes)
+
+    def add_remove():
+        item = next(item_cycle)
+        inventory.add_item(item)
+        inventory.remove_item(item)
+    add("inventory_add_remove_item", add_remove, 10000)
+    add("inventory_get_item_by_code",
+        lambda: inventory.get_item_by_code(next(code_cycle)), 10000)
+
+    game = OtherWorldGame()
+    other = OtherWorldInventory("other", len(items))
+    for each in items:
+        other.add_item(each)
+    code = codes[0]     # Both inventories hold the items under the same codes
+
+    def move():
+        game.move_item_inv2inv(code, inventory, other)
+        game.move_item_inv2inv(code, other, inventory)
+    add("move_item_inv2inv", move, 5000)
+    return results
+
+
+def bench_effects(repeat: int) -> list[dict[str, Any]]:
+    """
+    Run the `apply_effects()` benchmarks.
+
+    Args:
+        repeat (int): Number of measurements
+
+    Returns:
+        list[dict[str, Any]]: Results
+    """
+    results = []
+    for count in EFFECT_COUNTS:
+        player = Player("bench")
+        for idx in range(count):
+            player.add_effect(Effect(f"effect {idx}", "str", 0, 10 ** 9))
+        results.append({"name": "apply_effects", "effects": count, "number": 2000,
+            "ns_per_op": round(measure(player.apply_effects, 2000, repeat), 1)})
+    return results
+
+
+def bench_npcs(game: OtherWorldGame, repeat: int, seed: int) -> list[dict[str, Any]]:
+    """
+    Run the NPC benchmarks, NPCs are spread over all the maps of a world.
+
+    Args:
+        game (OtherWorldGame): Game with the loaded world
+        repeat (int): Number of measurements
+        seed (int): Seed of the NPCs' decisions
+
+    Returns:
+        list[dict[str, Any]]: Results
+    """
+    wolf = OtherWorldNpc("wolf", "wolf", "A wolf", "", CharacterStats(10, 5, 5, 5))
+    wolf.wander = 0.3
+    wolf.flee = 0.3
+    orc = OtherWorldNpc("orc", "orc", "An orc", "", CharacterStats(15, 8, 6, 2))
+    orc.aggressive = True
+    orc.wander = 0.1
+
+    results = []
+    graph = game.world_graph()
+    for count in NPC_COUNTS:
+        npcs = NpcEngine(graph, seed)
+        for idx in range(count):
+            npcs.spawn(orc if idx % 2 else wolf, graph.ids[idx % len(graph.ids)])
+        results.append({"name": "npc_tick", "npcs": count, "number": 200,
+            "ns_per_op": round(measure(npcs.tick, 200, repeat), 1)})
+        results.append({"name": "npc_strike", "npcs": count, "number": 2000,
+            "ns_per_op": round(measure(lambda: npcs.strike(graph.ids[0], 5), 2000, repeat), 1)})
+    return results
+
+
+def run(sizes: list[int], repeat: int, seed: int) -> dict[str, Any]:
+    """
+    Run all the benchmarks.
+
+    Args:
+        sizes (list[int]): Numbers of maps of the benchmarked worlds
+        repeat (int): Number of measurements
+        seed (int): Seed of the world generator
+
+    Returns:
+        dict[str, Any]: Description of the environment and the results
+    """
+    results = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="otherworld-bench-") as tmp:
+        # The world cache of CliApp is written relative to the working directory
+        os.chdir(tmp)
+        try:
+            check_start_map(Path(tmp) / "world_start", seed)
+            for size in sizes:
+                world = Path(tmp) / f"world_{size}"
+                WorldGenerator(size, max(30, size // 10), seed=seed).write(str(world))
+                results.extend(bench_world(world, size, repeat))
+                print(f"{size} maps done", file=sys.stderr)
+            game = load_world(world)
+            items = list(game.items.values())
+            for stacks in sorted({min(x, len(items)) for x in INVENTORY_SIZES}):
+                results.extend(bench_inventory(items[:stacks], repeat))
+            results.extend(bench_effects(repeat))
+            results.extend(bench_npcs(game, repeat, seed))
+        finally:
+            os.chdir(cwd)
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "results": results,
+    }
+
+
+def result_key(result: dict[str, Any]) -> tuple:
+    return tuple(sorted((k, v) for k, v in result.items() if k not in ("ns_per_op", "number")))
+
+
+def compare(report: dict[str, Any], baseline: dict[str, Any], threshold: float) -> list[str]:
+    """
+    Find results slower than the baseline.
+
+    Args:
+        report (dict[str, Any]): Current results
+        baseline (dict[str, Any]): Results to compare with
+        threshold (float): Allowed ratio of current and baseline times
+
+    Returns:
+        list[str]: Descriptions of the regressions
+    """
+    old = {result_key(x): x["ns_per_op"] for x in baseline["results"]}
+    regressions = []
+    for each in report["results"]:
+        before = old.get(result_key(each))
+        if before and each["ns_per_op"] > before * threshold:
+            params = ", ".join(f"{k}={v}" for k, v in result_key(each) if k != "name")
+            regressions.append(f"{each['name']} ({params}): "
+                f"{before:.0f} -> {each['ns_per_op']:.0f} ns")
+    return regressions
+
+
+def parse_args():
+    parser = ArgumentParser(description="Benchmark the OtherWorld game.")
+    parser.add_argument("--sizes", default="100,1000,10000",
+        help="comma separated numbers of maps of the benchmarked worlds")
+    parser.add_argument("--repeat", type=int, default=3,
+        help="number of measurements, the best one is reported")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the world generator")
+    parser.add_argument("--output", metavar="FILE", help="write the results to FILE")
+    parser.add_argument("--compare", metavar="FILE",
+        help="compare the results with results saved in FILE")
+    parser.add_argument("--threshold", type=float, default=1.25,
+        help="slowdown ratio reported as a regression")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = run([int(x) for x in args.sizes.split(",")], args.repeat, args.seed)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        regressions = compare(report, json.loads(Path(args.compare).read_text()),
+            args.threshold)
+        for each in regressions:
+            print(f"Regression: {each}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
@@ -1,11 +1,95 @@
+import asyncio
 import sys
+
+from argparse import ArgumentParser
+from typing import Optional
+
 from app import CliApp
+from instrumentation import STATS
+from server import GameServer
+from shards import ShardedServer
+from constants import FILE_ENCODING
+
+
+def parse_args():
+    parser = ArgumentParser(prog="otherworld", description="A simple text game.")
+    parser.add_argument("--batch", metavar="FILE",
+        help="run commands from FILE (one per line, `-` for stdin) without prompting")
+    parser.add_argument("--summary-only", action="store_true",
+        help="in batch mode print only the final state summary")
+    parser.add_argument("--serve", metavar="[HOST:]PORT",
+        help="host a multiplayer game on a TCP port")
+    parser.add_argument("--serve-unix", metavar="PATH",
+        help="host a multiplayer game on a Unix socket")
+    parser.add_argument("--isolated", action="store_true",
+        help="give every player of the multiplayer game their own world state")
+    parser.add_argument("--shards", type=int, default=1, metavar="N",
+        help="split the multiplayer world by regions across N worker processes")
+    parser.add_argument("--check", action="store_true",
+        help="validate exits of all the maps and exit")
+    parser.add_argument("--stats", metavar="FILE",
+        help="collect performance statistics and write them to FILE at exit")
+    parser.add_argument("--save-dir", metavar="DIR",
+        help="save the game to DIR continuously, restore a game saved there")
+    parser.add_argument("--world", metavar="DIR",
+        help="load the world from DIR/items and DIR/maps instead of ./resources")
+    parser.add_argument("--watch", action="store_true",
+        help="reload changed world files automatically while playing")
+    parser.add_argument("--max-resident-maps", type=int, metavar="N",
+        help="load maps on demand and keep at most N of them in the memory")
+    return parser.parse_args()
+
+
+def run_batch(app: CliApp, path: str, summary_only: bool) -> None:
+    if path == "-":
+        app.run_batch(sys.stdin, sys.stdout, summary_only)
+    else:
+        with open(path, encoding=FILE_ENCODING) as fd:
+            app.run_batch(fd, sys.stdout, summary_only)
+
+
+def serve(app: CliApp, address: Optional[str], unix_path: Optional[str],
+    isolated: bool, shards: int) -> None:
+    if shards > 1:
+        server = ShardedServer(app.game, shards, app.items_path, app.maps_path,
+            app.npcs_path, app.game.maps.max_resident, isolated)
+    else:
+        server = GameServer(app.game, isolated)
+
+    async def main():
+        if unix_path:
+            await server.start_unix(unix_path)
+        else:
+            host, _, port = address.rpartition(":")
+            await server.start_tcp(host or "localhost", int(port))
+        await server.serve_forever()
+
+    try:
+        asyncio.run(main())
+    finally:
+        if shards > 1:
+            server.close()
+
 
-try:
-    app = CliApp()
-    app.run()
-except KeyboardInterrupt:
-    print("Interrupted by user.", file=sys.stderr)
-except KeyError:
-    print("Unabled to initialize the game. Invalid YAML files?", 
-        file=sys.stderr)
+if __name__ == "__main__":
+    # The guard keeps worker processes of the YAML loader from starting the game.
+    args = parse_args()
+    STATS.enabled = args.stats is not None
+    try:
+        app = CliApp(args.max_resident_maps, args.save_dir, args.world, args.watch)
+        if args.check:
+            print(app.game.world_graph().report())
+        elif args.batch:
+            run_batch(app, args.batch, args.summary_only)
+        elif args.serve or args.serve_unix:
+            serve(app, args.serve, args.serve_unix, args.isolated, args.shards)
+        else:
+            app.run()
+    except KeyboardInterrupt:
+        print("Interrupted by user.", file=sys.stderr)
+    except KeyError:
+        print("Unabled to initialize the game. Invalid YAML files?", 
+            file=sys.stderr)
+    finally:
+        if args.stats:
+            STATS.dump(args.stats)
@@ -1,56 +1,196 @@
-import re
 import sys
 
 from pathlib import Path
+from time import perf_counter, perf_counter_ns
+from typing import Iterable, Optional, TextIO
 
-from constants import PATH_ITEMS, PATH_MAPS
-from commands import COMMANDS, CMD_ALIASES, get_cmd_handler
+from customtypes import CmdResult
+from constants import BATCH_FLUSH_LINES, PATH_CACHE, PATH_ITEMS, PATH_MAPS, \
+    PATH_NPCS, WATCH_INTERVAL
+from commands import CommandDispatcher, render_help
+from contentwatcher import ContentWatcher
 from game import OtherWorldGame
+from instrumentation import STATS
+from persistence import GameJournal
+from worldcache import WorldCache
 
 
 class CliApp:
-    def __init__(self) -> None:
-        self.game: OtherWorldGame = OtherWorldGame()
-        self.game.load_items(PATH_ITEMS)
-        self.game.load_maps(PATH_MAPS)
+    def __init__(self, max_resident_maps: Optional[int] = None,
+        save_dir: Optional[str] = None, world_dir: Optional[str] = None,
+        watch: bool = False, seed: Optional[int] = None) -> None:
+        """
+        Args:
+            max_resident_maps (Optional[int], optional): Maximum number of maps
+                kept in the memory, see `OtherWorldGame`. Defaults to None.
+            save_dir (Optional[str], optional): Directory the game is saved to.
+                A game saved there is restored. Defaults to None (no saving).
+            world_dir (Optional[str], optional): Directory with `items`, `maps`
+                and `npcs` of the world. Defaults to None (`./resources/`).
+            watch (bool, optional): If changed world files should be reloaded
+                automatically before the turns. Defaults to False (only
+                the `reload` command reloads them).
+            seed (Optional[int], optional): Seed of the NPCs' random
+                decisions. Defaults to None (unpredictable).
+        """
+        self.cache = WorldCache(PATH_CACHE)
+        self.cache.load()
+        self.game: OtherWorldGame = OtherWorldGame(self.cache, max_resident_maps)
+        self.items_path, self.maps_path = PATH_ITEMS, PATH_MAPS
+        self.npcs_path = PATH_NPCS
+        if world_dir is not None:
+            self.items_path = str(Path(world_dir) / "items")
+            self.maps_path = str(Path(world_dir) / "maps")
+            self.npcs_path = str(Path(world_dir) / "npcs")
+        self.game.load_items(self.items_path)
+        self.game.load_maps(self.maps_path)
+        self.game.load_npcs(self.npcs_path, seed)
+        self.save_cache()
+        self.watcher = ContentWatcher(self.game, self.items_path, self.maps_path)
+        self.watch = watch
+        self._last_poll = perf_counter()
+        self.dispatcher = CommandDispatcher()
+        self.dispatcher.register("reload", self.handle_cmd_reload)
+        self.dispatcher.register("stats", self.handle_cmd_stats)
+
+        self.journal: Optional[GameJournal] = None
+        if save_dir is not None:
+            self.journal = GameJournal(save_dir)
+            for cmd in self.journal.load(self.game):
+                self.play_turn(cmd, record=False)
+
+
+    def save_cache(self) -> None:
+        """
+        Save the world cache. Maps loaded on demand are cached as well.
+        """
+        try:
+            self.cache.save()
+        except OSError:
+            # The cache is an optimization only, the game can run without it.
+            pass
 
 
     def cmd_help_handler(self):
         """
         Handle `help` command.
         """
-        print("Available commands:")
-        for k, v in COMMANDS.items():
-            print(f"    {k:<{16}}{v['help']}")
+        print(self.render_help())
 
 
-    def handle_cmd(self, cmd: str) -> tuple[str, bool]:
+    def render_help(self) -> str:
+        """
+        Render the list of available commands.
+
+        Returns:
+            str: Rendered string
+        """
+        return render_help()
+
+
+    def handle_cmd(self, cmd: str,
+        game: Optional[OtherWorldGame] = None) -> tuple[str, bool]:
         """
         Handle user commands.
 
 
         Args:
             cmd (str): String command as entered by the user
+            game (Optional[OtherWorldGame], optional): The game the command
+                is applied to, e.g. a session of another player (see
+                `OtherWorldGame.new_session()`). Defaults to None (`self.game`).
 
         Returns:
             tuple[str, bool]: A tuple of command response (message) and
                 a flag indicating the game should finish.
         """
-        msg = "Unknown command. See help."
-        should_exit = False
+        if game is None:
+            game = self.game
+        started = perf_counter_ns() if STATS.enabled else 0
         try:
-            key = cmd.split(" ")[0]
-            cmd_name = CMD_ALIASES[key]
-            command = COMMANDS[cmd_name]
-            m = re.match(command["pattern"], cmd)
-            if m:
-                cmd_handler = get_cmd_handler(cmd_name, self.game)
-                msg, should_exit = cmd_handler(m.groupdict())
-            else:
-                msg = f"Error: {command['usage']}"
+            return self.dispatcher.dispatch(game, cmd)
         except KeyError as e:
-            msg = "Error: Unknown command."
-        return (msg, should_exit)
+            return ("Error: Unknown command.", False)
+        finally:
+            if started:
+                STATS.record("handle_cmd", perf_counter_ns() - started)
+
+
+    def handle_cmd_reload(self, game: OtherWorldGame, cmd_dict: dict[str, str]) -> CmdResult:
+        """
+        Handle `reload` command - reload changed world files.
+        """
+        msg = self.watcher.poll()
+        self._last_poll = perf_counter()
+        return (msg or "No world files have changed.", False)
+
+
+    def handle_cmd_stats(self, game: OtherWorldGame, cmd_dict: dict[str, str]) -> CmdResult:
+        """
+        Handle `stats` command. It controls the instrumentation of the whole
+        process, so it's available in the local game only.
+        """
+        action = cmd_dict["action"]
+        if action == "on":
+            STATS.enabled = True
+            return ("Instrumentation is on.", False)
+        if action == "off":
+            STATS.enabled = False
+            return ("Instrumentation is off.", False)
+        if action == "reset":
+            STATS.reset()
+            return ("Statistics have been reset.", False)
+        if cmd_dict["dump"]:
+            try:
+                STATS.dump(cmd_dict["file"])
+            except OSError as e:
+                return (f"Error: Cannot write statistics: {e}", False)
+            return (f"Statistics written to {cmd_dict['file']}.", False)
+        return (STATS.render(), False)
+
+
+    def play_turn(self, cmd: str, record: bool = True) -> tuple[str, str, bool]:
+        """
+        Play a single turn - handle a command and apply effects on the player.
+
+        Args:
+            cmd (str): String command as entered by the user
+            record (bool, optional): If the command should be written
+                to the journal. Defaults to True.
+
+        Returns:
+            tuple[str, str, bool]: A tuple of command response, effects message
+                and a flag indicating the game should finish.
+        """
+        if self.watch and perf_counter() - self._last_poll >= WATCH_INTERVAL:
+            self._last_poll = perf_counter()
+            reloaded = self.watcher.poll()
+            if reloaded:
+                print(reloaded, file=sys.stderr)
+
+        if cmd in "help,h,?".split(","):
+            msg, finished = self.render_help(), False
+        else:
+            msg, finished = self.handle_cmd(cmd)
+        msg_effects, death = self.game.end_turn()
+
+        if record and self.journal is not None:
+            if death:
+                # Next time, start a new game
+                self.journal.clear()
+            else:
+                self.journal.record(cmd, self.game)
+        return (msg, msg_effects, finished or death)
+
+
+    def close(self) -> None:
+        """
+        Save the world cache and the game (if persistent), release resources.
+        """
+        self.save_cache()
+        if self.journal is not None:
+            self.journal.close(self.game)
+        self.game.maps.close()
 
 
     def run(self) -> None:
@@ -58,26 +198,99 @@ class CliApp:
         Main loop. This is where the commands are handled.
         """
         try:
+            print(f"\n\nYou are here:  {self.game.current_map.title}")
             finished = False
-            msg = f"\nYou are here:  {self.game.current_map.title}"
-            while True:
-                if msg:
-                    print(f"\n{msg}")
-
-                msg, death = self.game.player.apply_effects()
-                if msg:
-                    print(f"\n{msg}")
-                finished = finished or death
-
-                if finished or death:
-                    break
-
+            while not finished:
                 cmd = input(f"\n[HP: {self.game.player.stats.hp}]  Your action: ").lower()
                 print()
 
-                if cmd in "help,h,?".split(","):
-                    self.cmd_help_handler()
-                else:
-                    msg, finished = self.handle_cmd(cmd)                        
+                msg, msg_effects, finished = self.play_turn(cmd)
+                for each in (msg, msg_effects):
+                    if each:
+                        print(f"\n{each}")
         except KeyError as e:
             print(f"Error: Invalid map specified. No maps found?", file=sys.stderr)
+        finally:
+            self.close()
+
+
+    def run_batch(self, commands: Iterable[str], out: TextIO,
+        summary_only: bool = False) -> int:
+        """
+        Non-interactive loop. Runs commands from a script (one per line)
+        the same way `run()` does, without prompting the user.
+        Empty lines and lines starting with `#` are skipped.
+
+        Args:
+            commands (Iterable[str]): Command lines, e.g. an open file
+            out (TextIO): Output stream
+            summary_only (bool, optional): Write only the final state summary.
+                Defaults to False.
+
+        Returns:
+            int: Number of turns played
+        """
+        chunks: list[str] = []
+        write = chunks.append
+        turns = 0
+        finished = False
+        started = perf_counter()
+        try:
+            if not summary_only:
+                write(f"You are here:  {self.game.current_map.title}")
+            for line in commands:
+                cmd = line.strip().lower()
+                if not cmd or cmd.startswith("#"):
+                    continue
+
+                turns += 1
+                msg, msg_effects, finished = self.play_turn(cmd)
+                if not summary_only:
+                    for each in (msg, msg_effects):
+                        if each:
+                            write(each)
+                if finished:
+                    break
+
+                if len(chunks) >= BATCH_FLUSH_LINES:
+                    out.write("\n".join(chunks) + "\n")
+                    chunks.clear()
+        finally:
+            self.close()
+
+        if summary_only:
+            write(self.render_summary(turns, perf_counter() - started, finished))
+        if chunks:
+            out.write("\n".join(chunks) + "\n")
+        out.flush()
+        return turns
+
+
+    def render_summary(self, turns: int, elapsed: float, finished: bool) -> str:
+        """
+        Render the final state of the game after a batch run.
+
+        Args:
+            turns (int): Number of turns played
+            elapsed (float): Duration of the run in seconds
+            finished (bool): If the game has finished (quit or death)
+
+        Returns:
+            str: Rendered string
+        """
+        player = self.game.player
+        stats = player.stats
+        rate = turns / elapsed if elapsed > 0 else 0.0
+        lines = [
+            f"Turns: {turns} in {elapsed:.3f} s ({rate:.0f} turns/s)",
+            f"Finished: {'yes' if finished else 'no'}",
+            f"Map: {self.game.current_map_id} ({self.game.current_map.title})",
+            f"Stats: HP {stats.hp}, STR {stats.str}, CON {stats.con}, WIS {stats.wis}",
+            f"Active effects: {len(player.effects)}",
+        ]
+        if len(player.inventory) > 0:
+            lines.append("Inventory:")
+            lines.append(self.game.render_inventory(player.inventory, detailed=True))
+        else:
+            lines.append("Inventory: empty")
+        return "\n".join(lines)
@@ -3,6 +3,8 @@ from typing import TextIO
 
 
 class YAMLSourced:
+    __slots__ = ()
+
     @abstractclassmethod
     def load_yaml_file(self, fd: TextIO) -> None:
         """
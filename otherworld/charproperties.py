@@ -1,9 +1,42 @@
-from dataclasses import dataclass
-from random import randint
+from dataclasses import dataclass, field
+from random import Random
+from typing import Optional
 
-@dataclass
+# Rolls the stats of new characters. Seed it (`ROLLS.seed()`) for repeatable
+# games, or roll with a generator of your own, see `CharacterStats.roll()`.
+ROLLS = Random()
+
+# Stat -> range of its roll
+RANGES = {"hp": (4, 20), "str": (1, 18), "con": (1, 18), "wis": (1, 18)}
+
+
+def _roll(stat: str):
+    low, high = RANGES[stat]
+    return field(default_factory=lambda: ROLLS.randint(low, high))
+
+
+@dataclass(slots=True)
 class CharacterStats:
-    hp: int = randint(4, 20)
-    str: int = randint(1, 18)
-    con: int = randint(1, 18)
-    wis: int = randint(1, 18)
+    """
+    Stats of a character. Stats not given are rolled for every instance.
+    """
+    hp: int = _roll("hp")
+    str: int = _roll("str")
+    con: int = _roll("con")
+    wis: int = _roll("wis")
+
+
+    @classmethod
+    def roll(cls, rng: Optional[Random] = None) -> "CharacterStats":
+        """
+        Roll all the stats.
+
+        Args:
+            rng (Optional[Random], optional): Random generator used for
+                the rolls. Defaults to None (`ROLLS`).
+
+        Returns:
+            CharacterStats: The stats
+        """
+        rng = rng if rng is not None else ROLLS
+        return cls(**{k: rng.randint(*v) for k, v in RANGES.items()})
@@ -1,13 +1,19 @@
-from typing import Callable
+import re
+
+from time import perf_counter_ns
+from typing import Callable, Optional
+
+from customtypes import CmdResult
 from game import OtherWorldGame
+from instrumentation import STATS
 
 # A dictionary of the available commands.
 # Keep it sorted so that it's easy to locate individual commands.
 COMMANDS = {
     "attack": {
-        "help": "Not implemented yet.",
-        "usage": "Use `attack <NPC code>` to attack a NPC.",
-        "pattern": r"^(?P<cmd>\w+)\s+(?P<code>[^\s]+)$",
+        "help": "Attack an NPC on the current map",
+        "usage": "Use `attack <NPC code or name>` to attack an NPC.",
+        "pattern": r"^(?P<cmd>\w+)\s+(?P<code>\S.*?)\s*$",
     },
     "close": {
         "help": "Not implemented yet.",
@@ -16,21 +22,21 @@ COMMANDS = {
     },
     "consume": {
         "help": "Eat an item if it's consumable",
-        "usage": "Use `consume <inventory item code>` to consume an item.",
-        "pattern": r"^(?P<cmd>\w+)\s+(?P<code>[^\s]+)$",
+        "usage": "Use `consume <inventory item code or name>` to consume an item.",
+        "pattern": r"^(?P<cmd>\w+)\s+(?P<code>\S.*?)\s*$",
     },
     "drop": {
         "help": "Drop an item from player's inventory",
-        "usage": "Use `drop <item code>` to drop an item.",
-        "pattern": r"^(?P<cmd>\w+)\s+(?P<code>[^\s]+)$",
+        "usage": "Use `drop <item code or name>` to drop an item.",
+        "pattern": r"^(?P<cmd>\w+)\s+(?P<code>\S.*?)\s*$",
     },
     "examine": {
         "help": "Examine an item in the player's inventory or on the current map",
-        "usage": "Use `examine <item code>` to examine an item.",
-        "pattern": r"^(?P<cmd>\w+)\s+(?P<code>[^\s]+)$",
+        "usage": "Use `examine <item code or name>` to examine an item.",
+        "pattern": r"^(?P<cmd>\w+)\s+(?P<code>\S.*?)\s*$",
     },
     "flee": {
-        "help": "Not implemented yet.",
+        "help": "Run away from hostile NPCs through a random exit",
         "usage": "",
         "pattern": r"^(?P<cmd>\w+)$",
     },
@@ -41,13 +47,13 @@ COMMANDS = {
     },
     "inventory": {
         "help": "List the player's inventory",
-        "usage": "",
-        "pattern": r"^(?P<cmd>\w+)$",
+        "usage": "Use `inventory [page]` to list the inventory.",
+        "pattern": r"^(?P<cmd>\w+)(\s+(?P<page>\d+))?$",
     },
     "look": {
         "help": "Display a map description",
-        "usage": "",
-        "pattern": r"^(?P<cmd>\w+)$",
+        "usage": "Use `look [page]` to display the map and its items.",
+        "pattern": r"^(?P<cmd>\w+)(\s+(?P<page>\d+))?$",
     },
     "open": {
         "help": "Not implemented yet.",
@@ -59,10 +65,30 @@ COMMANDS = {
         "usage": "",
         "pattern": r"^(?P<cmd>\w+)$",
     },
+    "reload": {
+        "help": "Reload changed world files (single player only)",
+        "usage": "",
+        "pattern": r"^(?P<cmd>\w+)$",
+    },
+    "search": {
+        "help": "Find maps and items by words in their descriptions",
+        "usage": "Use `search <words>` to find maps and items.",
+        "pattern": r"^(?P<cmd>\w+)\s+(?P<query>\S.*?)\s*$",
+    },
+    "stats": {
+        "help": "Show or control the performance statistics (single player only)",
+        "usage": "Use `stats [on|off|reset|dump <file>]`.",
+        "pattern": r"^(?P<cmd>\w+)(\s+(?P<action>on|off|reset)|\s+(?P<dump>dump)\s+(?P<file>\S+))?$",
+    },
     "take": {
         "help": "Take an item from the floor / map",
-        "usage": "Use `take <item code>` to take items.",
-        "pattern": r"^(?P<cmd>\w+)\s+(?P<code>[^\s]+)$",
+        "usage": "Use `take <item code or name>` to take items.",
+        "pattern": r"^(?P<cmd>\w+)\s+(?P<code>\S.*?)\s*$",
+    },
+    "travel": {
+        "help": "Find the shortest route to a map",
+        "usage": "Use `travel <map id>` to find a route.",
+        "pattern": r"^(?P<cmd>\w+)\s+(?P<map>[^\s]+)$",
     }
 }
 
@@ -71,12 +97,14 @@ COMMANDS = {
 CMD_ALIASES = {
     "a": "attack",
     "attack": "attack",
+    "close": "close",
     "c": "consume",
     "consume": "consume",
     "d": "drop",
     "drop": "drop",
     "ex": "examine",
     "examine": "examine",
+    "flee": "flee",
     "g": "go",
     "go": "go",
     "i": "inventory",
@@ -84,40 +112,110 @@ CMD_ALIASES = {
     "inventory": "inventory",
     "l": "look",
     "look": "look",
+    "open": "open",
     "q": "quit",
     "quit": "quit",
+    "s": "search",
+    "search": "search",
     "t": "take",
-    "take": "take"
+    "take": "take",
+    "travel": "travel"
 }
 
-def get_cmd_handler(cmd: str, game: OtherWorldGame) -> Callable:
-    """
-    Provide mapping of commands to their handlers.
+# A dictionary for command -> OtherWorldGame method mappings.
+# Commands missing here are not implemented yet, or they are handled by
+# the application (see `CommandDispatcher.register()`).
+CMD_HANDLERS = {
+    "attack": "handle_cmd_attack",
+    "consume": "handle_cmd_consume",
+    "drop": "handle_cmd_drop",
+    "examine": "handle_cmd_examine",
+    "flee": "handle_cmd_flee",
+    "go": "handle_cmd_go",
+    "inventory": "handle_cmd_inventory",
+    "look": "handle_cmd_look",
+    "quit": "handle_cmd_quit",
+    "search": "handle_cmd_search",
+    "take": "handle_cmd_take",
+    "travel": "handle_cmd_travel",
+}
 
-    Using the COMMANDS dictionary for the mapping lead to
-    circular dependencies in case of some commands, thus the function.
 
-    Args:
-        cmd (str): Commands name
-        game (OtherWorldGame): The game object - used to modify game state.
+def render_help() -> str:
+    """
+    Render the list of available commands.
 
     Returns:
-        Callable: A OtherWorldGame method designed to handle the command.
+        str: Rendered string
     """
-    match cmd:
-        case "consume":
-            return game.handle_cmd_consume
-        case "drop":
-            return game.handle_cmd_drop
-        case "examine":
-            return game.handle_cmd_examine
-        case "go":
-            return game.handle_cmd_go
-        case "inventory":
-            return game.handle_cmd_inventory
-        case "look":
-            return game.handle_cmd_look
-        case "quit":
-            return game.handle_cmd_quit
-        case "take":
-            return game.handle_cmd_take
+    lines = ["Available commands:"]
+    for k, v in COMMANDS.items():
+        lines.append(f"    {k:<{16}}{v['help']}")
+    return "\n".join(lines)
+
+
+class CommandDispatcher:
+    """
+    Translates user input into calls of command handlers.
+
+    The dispatch table is built once: patterns are compiled and handlers
+    are resolved for every alias up front. Handlers are stored as plain
+    OtherWorldGame functions, so a single dispatcher can serve any number
+    of games.
+    """
+    def __init__(self) -> None:
+        self.table: dict[str, tuple[re.Pattern, Optional[Callable], str, str]] = {}
+        for alias, cmd_name in CMD_ALIASES.items():
+            command = COMMANDS[cmd_name]
+            handler = None
+            if cmd_name in CMD_HANDLERS:
+                handler = getattr(OtherWorldGame, CMD_HANDLERS[cmd_name])
+            self.table[alias] = (re.compile(command["pattern"]), handler,
+                command["usage"], f"cmd.{cmd_name}")
+
+
+    def register(self, cmd_name: str, handler: Callable) -> None:
+        """
+        Set a handler of a command and its aliases, e.g. a command
+        of the application rather than of the game. Commands handled
+        this way needn't be listed in `CMD_ALIASES`.
+
+        Args:
+            cmd_name (str): Name of the command, see `COMMANDS`
+            handler (Callable): Function called with the game and
+                the parsed command
+        """
+        command = COMMANDS[cmd_name]
+        aliases = [k for k, v in CMD_ALIASES.items() if v == cmd_name] or [cmd_name]
+        for alias in aliases:
+            self.table[alias] = (re.compile(command["pattern"]), handler,
+                    command["usage"], f"cmd.{cmd_name}")
+
+
+    def dispatch(self, game: OtherWorldGame, cmd: str) -> CmdResult:
+        """
+        Handle a user command.
+
+        Args:
+            game (OtherWorldGame): The game the command is applied to
+            cmd (str): String command as entered by the user
+
+        Returns:
+            CmdResult: A tuple of command response (message) and
+                a flag indicating the game should finish.
+        """
+        entry = self.table.get(cmd.partition(" ")[0])
+        if entry is None:
+            return ("Error: Unknown command.", False)
+        pattern, handler, usage, stats_name = entry
+        if handler is None:
+            return ("Error: Not implemented yet.", False)
+        m = pattern.match(cmd)
+        if m is None:
+            return (f"Error: {usage}", False)
+        if STATS.enabled:
+            started = perf_counter_ns()
+            result = handler(game, m.groupdict())
+            STATS.record(stats_name, perf_counter_ns() - started)
+            return result
+        return handler(game, m.groupdict())
@@ -2,9 +2,23 @@ FILE_ENCODING = "utf8"
 
 MAP_START = "town_0001"
 
+# Number of rendered `look` / `inventory` outputs kept in the memory
+RENDER_CACHE_SIZE = 4096
+
+# Number of item stacks listed on a single page of an inventory
+INVENTORY_PAGE_SIZE = 26
+
+# Number of output lines buffered by the batch mode before writing them
+BATCH_FLUSH_LINES = 4096
+
+# Minimal number of seconds between two checks of changed world files (`--watch`)
+WATCH_INTERVAL = 1.0
+
+PATH_CACHE = "./.cache/world.bin"
 PATH_HELP = "./resources/help.txt"
 PATH_ITEMS = "./resources/items"
 PATH_MAPS = "./resources/maps"
+PATH_NPCS = "./resources/npcs"
 
 FLAG_COLLECTABLE = "collectable"
 FLAG_CONSUMABLE = "consumable"
@@ -0,0 +1,232 @@
+import os
+
+from pathlib import Path
+from time import perf_counter
+from typing import Optional
+
+from yaml import YAMLError
+
+from game import OtherWorldGame
+from item import OtherWorldItem
+
+
+# Errors of malformed or inconsistent world files
+RELOAD_ERRORS = (OSError, YAMLError, KeyError, ValueError, TypeError)
+
+
+class ContentWatcher:
+    """
+    Finds changed, added and removed world files and patches them into
+    a running game.
+
+    Files are compared by their modification time and size, only the changed
+    ones are parsed. Loaded items and maps are patched in place, so
+    inventories, players and other sessions referring to them see the new
+    content. Inventories of maps the players have changed are kept, other
+    map inventories are replaced by the ones from the files.
+    """
+    def __init__(self, game: OtherWorldGame, items_path: str, maps_path: str) -> None:
+        """
+        Args:
+            game (OtherWorldGame): The game with a loaded world
+            items_path (str): Directory the items have been loaded from
+            maps_path (str): Directory the maps have been loaded from
+        """
+        self.game = game
+        self.items_path = items_path
+        self.maps_path = maps_path
+        self._items = self._scan(items_path)
+        self._maps = self._scan(maps_path)
+        self.errors: list[str] = []
+
+
+    def poll(self) -> Optional[str]:
+        """
+        Reload changed files.
+
+        Returns:
+            Optional[str]: Description of the changes, None if no file
+                has changed.
+        """
+        started = perf_counter()
+        self.errors = []
+        items = self._scan(self.items_path)
+        maps = self._scan(self.maps_path)
+        item_changes = self._diff(self._items, items)
+        map_changes = self._diff(self._maps, maps)
+        if not any(item_changes + map_changes):
+            return None
+
+        # Items first, maps refer to them
+        changed, added, removed = item_changes
+        weight_changed = False
+        for file in changed + added:
+            weight_changed |= self._reload_item(file)
+        for file in removed:
+            self._remove_item(file)
+        if weight_changed:
+            self._update_totals()
+
+        changed, added, removed = map_changes
+        for file in changed + added:
+            self._reload_map(file)
+        for file in removed:
+            self._remove_map(file)
+
+        self._items, self._maps = items, maps
+        self.game.render_cache.clear()
+
+        parts = []
+        for name, changes in (("items", item_changes), ("maps", map_changes)):
+            counts = ", ".join(f"{len(x)} {what}"
+                for x, what in zip(changes, ("changed", "added", "removed")) if x)
+            if counts:
+                parts.append(f"{name} ({counts})")
+        lines = [f"Reloaded {' and '.join(parts)} in {perf_counter() - started:.3f} s."]
+        lines.extend(self.errors)
+        return "\n".join(lines)
+
+
+    def _reload_item(self, file: Path) -> bool:
+        """
+        Load an item file and patch the item into the game.
+
+        Returns:
+            bool: If weight of an already loaded item has changed
+        """
+        game = self.game
+        try:
+            new = game._load_item_file(file)
+        except RELOAD_ERRORS as e:
+            self._error(file, e)
+            return False
+
+        old_id = game.sources.get(file)
+        if old_id is not None and old_id != new.id:
+            self._remove_item(file)
+        game.text_index.add("item", new.id, new.title, new.description)
+        old = game.items.get(new.id)
+        if old is None:
+            game.removed_items.pop(new.id, None)
+            game.items[new.id] = new
+            game.item_names.add(new.name, new.id)
+            game.sources[file] = new.id
+            return False
+
+        game.item_names.remove(old.name, old.id)
+        weight_changed = old.weight != new.weight
+        for attr in OtherWorldItem.__slots__:
+            setattr(old, attr, getattr(new, attr))
+        game.item_names.add(old.name, old.id)
+        game.sources[file] = old.id
+        return weight_changed
+
+
+    def _remove_item(self, file: Path) -> None:
+        # Inventories keep their stacks of the item, it only can't appear anew.
+        # Maps loaded later drop it, see `OtherWorldGame._relink_inventory()`.
+        game = self.game
+        item = game.items.pop(game.sources.pop(file, None), None)
+        if item is not None:
+            game.removed_items[item.id] = item
+            game.item_names.remove(item.name, item.id)
+            game.text_index.remove("item", item.id)
+
+
+    def _reload_map(self, file: Path) -> None:
+        game = self.game
+        try:
+            new = game._load_map_file(file)
+        except RELOAD_ERRORS as e:
+            self._error(file, e)
+            return
+
+        old_id = game.sources.get(file)
+        if old_id is not None and old_id != new.id:
+            self._remove_map(file)
+        game.text_index.add("map", new.id, new.title, new.description)
+        store = game.maps
+        if new.id in store.resident or new.id in store.spilled:
+            map = store[new.id]
+            map.title = new.title
+            map.description = new.description
+            if map.exits != new.exits:
+                store.graph = None
+            map.exits = new.exits
+            map.effects = new.effects
+            map.version += 1
+            if new.id not in game.dirty_maps:
+                map.inventory.load_slots(new.inventory.dump_slots(), game.items)
+            if new.id in store.index:
+                store.set_source(new.id, file, new.exits)
+        elif store.max_resident is not None:
+            # Indexed again with the new content when loaded
+            game.item_locations.forget_map(new.id)
+            store.set_source(new.id, file, new.exits)
+        else:
+            store.add(new)
+        game.sources[file] = new.id
+
+
+    def _remove_map(self, file: Path) -> None:
+        game = self.game
+        map_id = game.sources.get(file)
+        if map_id == game.current_map_id:
+            self.errors.append(f"Error: {map_id} is the current map, it's kept.")
+            return
+        game.sources.pop(file, None)
+        if map_id is not None:
+            game.maps.remove(map_id)
+            game.item_locations.forget_map(map_id)
+            game.text_index.remove("map", map_id)
+
+
+    def _error(self, file: Path, e: Exception) -> None:
+        text = " ".join(str(e).split())
+        self.errors.append(f"Error: Cannot load {file}: {type(e).__name__}: {text}")
+
+
+    def _update_totals(self) -> None:
+        # Maps which aren't resident get their totals when they are loaded
+        game = self.game
+        inventories = [game.player.inventory]
+        inventories.extend(x.inventory for x in game.maps.resident.values())
+        if game.overlay is not None:
+            inventories.extend(game.overlay.inventories.values())
+        for each in inventories:
+            each.update_totals()
+
+
+    @staticmethod
+    def _scan(path: str) -> dict[str, tuple[int, int]]:
+        """
+        Get modification time and size of the YAML files in a directory.
+        Paths are kept as strings, building Path objects would double the time.
+        """
+        result = {}
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.name.endswith(".yaml"):
+                    stat = entry.stat()
+                    result[entry.path] = (stat.st_mtime_ns, stat.st_size)
+        return result
+
+
+    @staticmethod
+    def _diff(old: dict[str, tuple[int, int]],
+        new: dict[str, tuple[int, int]]) -> tuple[list[Path], list[Path], list[Path]]:
+        """
+        Compare two scans.
+
+        Returns:
+            tuple[list[Path], list[Path], list[Path]]: Changed, added and
+                removed files, each sorted by name
+        """
+        if old.keys() == new.keys():
+            changed = [x for x, stat in new.items() if old[x] != stat]
+            added, removed = [], []
+        else:
+            changed = [x for x, stat in new.items() if old.get(x, stat) != stat]
+            added = [x for x in new if x not in old]
+            removed = [x for x in old if x not in new]
+        return tuple(sorted(Path(x) for x in files) for files in (changed, added, removed))
@@ -1,7 +1,13 @@
+from dataclasses import fields
+from typing import NamedTuple
+
 from charproperties import CharacterStats
 
 
-class Effect:
+STAT_NAMES = frozenset(x.name for x in fields(CharacterStats))
+
+
+class Effect(NamedTuple):
     """
     Effect is an influence on the player's character.
 
@@ -14,17 +20,38 @@ class Effect:
 
     There can be several effects affecting the player at the same
     time.
+
+    Effects are immutable templates shared by all the items, maps and
+    players using them, see `intern_effect()`. State of an active effect
+    (its remaining duration) is kept by the affected character.
     """
-    def __init__(self, name: str, stat: str, effect: int, duration: int) -> None:
-        self.name: str = name
-        self.description: str
-        self.stat_affected: str = stat
-        self.stat_effect: int = effect
-        self.duration: int = duration
+    name: str
+    stat_affected: str
+    stat_effect: int
+    duration: int
 
 
     def modify_stats(self, stats: CharacterStats) -> CharacterStats:
-        match self.stat_affected:
-            case "hp":
-                stats.hp += self.stat_effect
-        return stats
\ No newline at end of file
+        # Effects on stats the character doesn't have (e.g. saturation)
+        # have no impact.
+        if self.stat_affected in STAT_NAMES:
+            value = getattr(stats, self.stat_affected)
+            setattr(stats, self.stat_affected, value + self.stat_effect)
+        return stats
+
+
+# Interned effect templates, the same effect is kept only once
+_TEMPLATES: dict[Effect, Effect] = {}
+
+
+def intern_effect(effect: Effect) -> Effect:
+    """
+    Get the shared instance of an effect.
+
+    Args:
+        effect (Effect): The effect
+
+    Returns:
+        Effect: The first instance of an equal effect
+    """
+    return _TEMPLATES.setdefault(effect, effect)
@@ -0,0 +1,247 @@
+from dataclasses import fields
+from typing import Optional, Sequence
+
+import numpy as np
+
+from charproperties import CharacterStats
+from effect import Effect, intern_effect
+
+
+# Stats an effect can modify, i.e. all CharacterStats fields
+STATS = tuple(x.name for x in fields(CharacterStats))
+
+
+class EffectEngine:
+    """
+    Applies effects of many entities (players, NPCs) at once.
+
+    Stats of the registered entities are kept in an entity x stat matrix.
+    Active effects are kept as a struct of arrays - entity, stat, change,
+    remaining duration and name - so a whole tick takes a few vectorized
+    operations regardless of the number of effects.
+
+    Messages describing a tick are not built during the tick. Call
+    `messages()` for the entities whose output is actually displayed.
+
+    Entities sharing an engine (e.g. the players of a world) are advanced
+    together, a single `tick()` per turn of the world applies the effects
+    of all of them.
+    """
+    def __init__(self, capacity: int = 64) -> None:
+        self.turn = 0   # Number of ticks so far
+        self.stats = np.zeros((capacity, len(STATS)), dtype=np.int64)
+        self.entity_count = 0
+        self._free_entities: list[int] = []
+
+        self.effect_count = 0
+        self.eff_entity = np.zeros(capacity, dtype=np.int32)
+        self.eff_stat = np.zeros(capacity, dtype=np.int32)
+        self.eff_change = np.zeros(capacity, dtype=np.int64)
+        self.eff_remaining = np.zeros(capacity, dtype=np.int32)
+        self.eff_name = np.zeros(capacity, dtype=np.int32)
+
+        # Stat names beyond STATS are tracked (for messages) but not applied
+        self._stat_names: list[str] = list(STATS)
+        self._stat_idx: dict[str, int] = {x: idx for idx, x in enumerate(STATS)}
+        self._names: list[str] = []
+        self._name_idx: dict[str, int] = {}
+
+        # Effects applied in the last tick: entity, stat, change, name,
+        # sorted by entity
+        self._last: tuple[np.ndarray, ...] = tuple(
+            np.zeros(0, dtype=np.int64) for _ in range(4))
+
+
+    def register(self, stats: CharacterStats) -> int:
+        """
+        Register an entity.
+
+        Args:
+            stats (CharacterStats): Initial stats of the entity
+
+        Returns:
+            int: Handle of the entity used by the other methods
+        """
+        if self._free_entities:
+            handle = self._free_entities.pop()
+        else:
+            handle = self.entity_count
+            self.entity_count += 1
+            if handle >= len(self.stats):
+                self.stats = np.resize(self.stats, (2 * len(self.stats), len(STATS)))
+        self.write_stats(handle, stats)
+        return handle
+
+
+    def unregister(self, handle: int) -> None:
+        """
+        Remove an entity and its effects.
+
+        Args:
+            handle (int): Handle of the entity
+        """
+        self._compact(self.eff_entity[:self.effect_count] != handle)
+        self.stats[handle] = 0
+        self._free_entities.append(handle)
+
+
+    def write_stats(self, handle: int, stats: CharacterStats) -> None:
+        self.stats[handle] = [getattr(stats, x) for x in STATS]
+
+
+    def change_stat(self, handle: int, stat: str, change: int) -> None:
+        """
+        Change a stat of an entity outside of the effects, e.g. damage.
+        """
+        self.stats[handle, STATS.index(stat)] += change
+
+
+    def read_stats(self, handle: int, stats: CharacterStats) -> CharacterStats:
+        """
+        Copy stats of an entity to a CharacterStats object.
+
+        Args:
+            handle (int): Handle of the entity
+            stats (CharacterStats): The object to update
+
+        Returns:
+            CharacterStats: The updated object
+        """
+        for name, value in zip(STATS, self.stats[handle].tolist()):
+            setattr(stats, name, value)
+        return stats
+
+
+    def add_effect(self, handle: int, effect: Effect,
+        duration: Optional[int] = None) -> None:
+        """
+        Start an effect on an entity.
+
+        Args:
+            handle (int): Handle of the entity
+            effect (Effect): The effect, it's not modified
+            duration (Optional[int], optional): Remaining duration.
+                Defaults to the duration of the effect.
+        """
+        if self.effect_count == len(self.eff_entity):
+            self._grow_effects()
+        idx = self.effect_count
+        self.eff_entity[idx] = handle
+        self.eff_stat[idx] = self._intern(effect.stat_affected,
+            self._stat_names, self._stat_idx)
+        self.eff_change[idx] = effect.stat_effect
+        self.eff_remaining[idx] = effect.duration if duration is None else duration
+        self.eff_name[idx] = self._intern(effect.name, self._names, self._name_idx)
+        self.effect_count += 1
+
+
+    def effects_of(self, handle: int) -> list[tuple[Effect, int]]:
+        """
+        Get the active effects of an entity and their remaining duration.
+        Durations of the returned effects are their remaining durations too.
+
+        Args:
+            handle (int): Handle of the entity
+
+        Returns:
+            list[tuple[Effect, int]]: Pairs of effect and the number
+                of turns it will be applied in
+        """
+        idx = np.flatnonzero(self.eff_entity[:self.effect_count] == handle)
+        effects = []
+        for x in idx.tolist():
+            remaining = int(self.eff_remaining[x])
+            effects.append((intern_effect(Effect(self._names[self.eff_name[x]],
+                self._stat_names[self.eff_stat[x]], int(self.eff_change[x]),
+                remaining)), remaining))
+        return effects
+
+
+    def active_effects(self, handle: int) -> int:
+        """
+        Get the number of active effects on an entity.
+        """
+        return int(np.count_nonzero(self.eff_entity[:self.effect_count] == handle))
+
+
+    def tick(self, handles: Optional[Sequence[int]] = None) -> np.ndarray:
+        """
+        Apply one turn of all the active effects and remove the exhausted ones.
+
+        Args:
+            handles (Optional[Sequence[int]], optional): Apply only effects
+                of these entities. Defaults to None (all entities).
+
+        Returns:
+            np.ndarray: Handles of affected entities with HP <= 0
+        """
+        self.turn += 1
+        n = self.effect_count
+        entity = self.eff_entity[:n]
+        selected = np.ones(n, dtype=bool)
+        if handles is not None:
+            mask = np.zeros(self.entity_count, dtype=bool)
+            mask[np.asarray(handles, dtype=np.int64)] = True
+            selected = mask[entity]
+
+        stat = self.eff_stat[:n]
+        change = self.eff_change[:n]
+        applied = selected & (stat < len(STATS))
+        np.add.at(self.stats, (entity[applied], stat[applied]), change[applied])
+
+        # Grouped by entity for `messages()`, in the order of starting
+        order = np.argsort(entity[selected], kind="stable")
+        self._last = (entity[selected][order], stat[selected][order],
+            change[selected][order], self.eff_name[:n][selected][order])
+
+        self.eff_remaining[:n][selected] -= 1
+        # Effects with zero duration are applied once as well. Effects
+        # of the other entities haven't been applied, they are kept.
+        self._compact(~selected | (self.eff_remaining[:n] > 0))
+
+        affected = np.unique(self._last[0])
+        return affected[self.stats[affected, STATS.index("hp")] <= 0]
+
+
+    def messages(self, handle: int) -> list[str]:
+        """
+        Describe effects applied to an entity in the last tick.
+
+        Args:
+            handle (int): Handle of the entity
+
+        Returns:
+            list[str]: Messages in the order the effects were started
+        """
+        entity, stat, change, name = self._last
+        lo, hi = np.searchsorted(entity, (handle, handle + 1)).tolist()
+        return [f"You're under effect of {self._names[name[x]]}. "
+            f"Your {self._stat_names[stat[x]]} has changed by {change[x]}."
+            for x in range(lo, hi)]
+
+
+    def _compact(self, keep: np.ndarray) -> None:
+        n = int(np.count_nonzero(keep))
+        for arr in (self.eff_entity, self.eff_stat, self.eff_change,
+            self.eff_remaining, self.eff_name):
+            arr[:n] = arr[:self.effect_count][keep]
+        self.effect_count = n
+
+
+    def _grow_effects(self) -> None:
+        size = 2 * len(self.eff_entity)
+        self.eff_entity = np.resize(self.eff_entity, size)
+        self.eff_stat = np.resize(self.eff_stat, size)
+        self.eff_change = np.resize(self.eff_change, size)
+        self.eff_remaining = np.resize(self.eff_remaining, size)
+        self.eff_name = np.resize(self.eff_name, size)
+
+
+    @staticmethod
+    def _intern(value: str, values: list[str], index: dict[str, int]) -> int:
+        idx = index.get(value)
+        if idx is None:
+            idx = len(values)
+            values.append(value)
+            index[value] = idx
+        return idx
@@ -1,20 +1,38 @@
-from pathlib import Path
-from typing import Callable, Generator, Optional, TextIO, TypeVar
-
-from yaml import safe_load
+import sys
 
-from map import OtherWorldMap
-from item import OtherWorldItem, ItemError
+from pathlib import Path
+from time import perf_counter_ns
+from typing import Any, Callable, Generator, Optional, TextIO, TypeVar, Union
+
+from map import MapExits, OtherWorldMap
+from mapstore import MapStore
+from nameindex import NameIndex
+from npc import OtherWorldNpc
+from npcengine import NpcEngine, NpcOverlay
+from overlay import WorldOverlay
+from rendercache import RenderCache
+from item import OtherWorldItem, ItemError, intern_flags
 from baseclasses import YAMLSourced
-from inventory import InventoryError, OtherWorldInventory
+from charproperties import CharacterStats
+from itemlocations import ItemLocations
+from inventory import InventoryError, OtherWorldInventory, code_to_index, \
+    index_to_code
 from player import Player
-from effect import Effect
+from scheduler import Scheduler
+from textindex import TextIndex
+from effect import Effect, intern_effect
 from customtypes import CmdResult
+from effectengine import EffectEngine
+from instrumentation import STATS
+from worldcache import WorldCache
+from worldgraph import WorldGraph
+from yamlio import load_yaml, load_yaml_file, load_yaml_files
 from constants import (
-    FILE_ENCODING,
     FLAG_COLLECTABLE,
     FLAG_CONSUMABLE,
+    INVENTORY_PAGE_SIZE,
     MAP_START,
+    RENDER_CACHE_SIZE,
 )
 
 
@@ -22,11 +40,193 @@ YS = TypeVar('YS', bound=YAMLSourced)
 
 
 class OtherWorldGame:
-    def __init__(self):
-        self.player = Player("Adventurer")
+    def __init__(self, cache: Optional[WorldCache] = None,
+        max_resident_maps: Optional[int] = None):
+        """
+        Args:
+            cache (Optional[WorldCache], optional): World cache used when loading
+                YAML files. Defaults to None.
+            max_resident_maps (Optional[int], optional): If set, maps are loaded
+                on demand and at most this number of them is kept in the memory.
+                Defaults to None (all maps are loaded up front).
+        """
+        self.cache = cache
+        self.scheduler = Scheduler()    # Advanced once per player's turn
+        self.player = Player("Adventurer", self.scheduler)
         self.items: dict[str, OtherWorldItem] = {}
-        self.maps: dict[str, OtherWorldMap] = {}
-        self.current_map: OtherWorldMap
+        # Items deleted while the game is running, see `ContentWatcher`
+        self.removed_items: dict[str, OtherWorldItem] = {}
+        self.item_names = NameIndex()
+        self.render_cache = RenderCache(RENDER_CACHE_SIZE)
+        self.maps = MapStore(self._load_map_file, self._relink_map,
+            max_resident_maps)
+        self.current_map_id: str = MAP_START
+        self.overlay: Optional[WorldOverlay] = None
+        self.dirty_maps: set[str] = set()   # Maps with changed inventories
+        self.sources: dict[Path, str] = {}  # Source file -> item / map ID
+        self.npc_kinds: dict[str, OtherWorldNpc] = {}
+        self.npcs: Optional[Union[NpcEngine, NpcOverlay]] = None   # See `new_session()`
+        # Applies effects of the players of sessions, see `new_session()`
+        self.effects: Optional[EffectEngine] = None
+        self.item_locations = ItemLocations()
+        self.text_index = TextIndex()
+        self.track_player()
+
+
+    def new_session(self, player_name: str, isolated: bool = False,
+        stats: Optional[CharacterStats] = None) -> "OtherWorldGame":
+        """
+        Create a game for another player in the world loaded by this game.
+
+        The new game shares items and maps with this one. It has its own
+        player starting on the start map.
+        By default, map inventories and NPCs are shared too, so players see
+        each other's changes. An isolated game keeps its changes of map
+        inventories in its own overlay instead (see `WorldOverlay`)
+        and has its own copy of the NPCs.
+        Effects on the players of all the sessions are applied together
+        by an `EffectEngine`.
+
+        Args:
+            player_name (str): Name of the new player
+            isolated (bool, optional): If the game should have its own
+                copy-on-write world state. Defaults to False.
+            stats (Optional[CharacterStats], optional): Stats of the new player.
+                Defaults to None (rolled).
+
+        Returns:
+            OtherWorldGame: The new game
+        """
+        session = OtherWorldGame(self.cache)
+        session.item_locations = self.item_locations
+        session.player = Player(player_name, session.scheduler, stats)
+        session.track_player()
+        session.items = self.items
+        session.removed_items = self.removed_items
+        session.item_names = self.item_names
+        session.text_index = self.text_index
+        session.render_cache = self.render_cache
+        session.maps = self.maps
+        session.dirty_maps = self.dirty_maps
+        session.sources = self.sources
+        session.npc_kinds = self.npc_kinds
+        session.npcs = self.npcs
+        if self.effects is None:
+            self.effects = EffectEngine()
+        session.effects = self.effects
+        session.player.attach_engine(self.effects)
+        if isolated:
+            session.overlay = WorldOverlay(self.maps)
+            if self.npcs is not None:
+                session.npcs = NpcOverlay(self.npcs)
+        return session
+
+
+    def track_player(self) -> None:
+        """
+        Index the player's inventory in `item_locations` under the player's
+        name. Call it again when the player is renamed.
+        """
+        self.item_locations.untrack(self.player.inventory)
+        self.item_locations.track(self.player.inventory, f"player:{self.player.name}")
+
+
+    def end_session(self) -> None:
+        """
+        Remove the player from the state shared with other games,
+        e.g. when the player leaves a multiplayer game.
+        """
+        self.item_locations.untrack(self.player.inventory)
+        self.player.detach_engine()
+
+
+    def locate_item(self, item_id: str) -> dict[str, int]:
+        """
+        Find all the pieces of an item - on the maps and in the inventories
+        of the players. Takes time proportional to the number of locations
+        found. If maps are loaded on demand, the first call loads all
+        of them once to index them.
+        Changes made by isolated games to their copies of map inventories
+        are not included.
+
+        Args:
+            item_id (str): Item ID
+
+        Returns:
+            dict[str, int]: Location (map ID or `player:<name>`) -> number
+                of pieces there
+        """
+        if self.maps.max_resident is not None and not self.item_locations.complete:
+            for map in self.maps.scan():
+                pass    # Loading a map indexes it
+            self.item_locations.complete = True
+        return self.item_locations.where(item_id)
+
+
+    def search(self, query: str, limit: int = 10,
+        kind: Optional[str] = None) -> list[tuple[str, str, str, float]]:
+        """
+        Find maps and items by words in their titles and descriptions,
+        see `TextIndex.search()`. If maps are loaded on demand, the first
+        call loads all of them once to index them.
+
+        Args:
+            query (str): Words to search for
+            limit (int, optional): Maximum number of results. Defaults to 10.
+            kind (Optional[str], optional): "map" or "item" to search only
+                maps or items. Defaults to None (both).
+
+        Returns:
+            list[tuple[str, str, str, float]]: Kind, ID, title and score
+                of the best matches, best first
+        """
+        if self.maps.max_resident is not None and not self.text_index.complete:
+            for map in self.maps.scan():
+                pass    # Loading a map indexes it
+            self.text_index.complete = True
+        return self.text_index.search(query, limit, kind)
+
+
+    @property
+    def current_map(self) -> OtherWorldMap:
+        # Looked up on every access, the map may have been evicted meanwhile
+        return self.maps[self.current_map_id]
+
+
+    @current_map.setter
+    def current_map(self, map: OtherWorldMap) -> None:
+        self.current_map_id = map.id
+
+
+    def map_inventory(self, map_id: Optional[str] = None,
+        writable: bool = False) -> OtherWorldInventory:
+        """
+        Get a map inventory as seen by this game.
+        Always use this method for map inventories - isolated games
+        must not change the shared maps.
+
+        Args:
+            map_id (Optional[str], optional): Map ID. Defaults to the current map.
+            writable (bool, optional): If the inventory is going to be changed.
+                Defaults to False.
+
+        Returns:
+            OtherWorldInventory: The map inventory
+        """
+        map_id = map_id or self.current_map_id
+        if self.overlay is None:
+            if writable:
+                self.dirty_maps.add(map_id)
+            return self.maps[map_id].inventory
+        if not writable:
+            return self.overlay.inventory(map_id)
+
+        template = self.overlay.inventory(map_id)
+        inventory = self.overlay.writable_inventory(map_id)
+        if self.player.current_inventory is template:
+            # Keep the `examine` command pointing to the live copy
+            self.player.current_inventory = inventory
+        return inventory
 
 
     def load_items(self, path: str) -> None:
@@ -40,8 +240,12 @@ class OtherWorldGame:
         Args:
             path (str): Path to a directory / folder.
         """
-        for item in self._load_yaml_from_folder(path, self.load_item_from_yaml):
+        for file, item in self._load_yaml_from_folder(path, self.item_from_data):
+            self._intern_item(item)
             self.items[item.id] = item
+            self.sources[file] = item.id
+            self.text_index.add("item", item.id, item.title, item.description)
+        self.item_names = NameIndex((x.name, x.id) for x in self.items.values())
 
 
     def load_item_from_yaml(self, fd: TextIO) -> OtherWorldItem:
@@ -54,20 +258,24 @@ class OtherWorldGame:
         Returns:
             OtherWorldItem: Item loaded from the file
         """
-        data = safe_load(fd)
+        return self.item_from_data(load_yaml(fd))
+
+
+    def item_from_data(self, data: dict[str, Any]) -> OtherWorldItem:
+        """
+        Build an item from parsed YAML data
+
+        Args:
+            data (dict[str, Any]): Item specification
+
+        Returns:
+            OtherWorldItem: Item built from the data
+        """
         item = OtherWorldItem(
             data["id"], data["name"], data["title"], data["description"],
             data["weight"])
-        item.flags = data["flags"]
-
-        if "effects" in data:
-            for each in data["effects"]:
-                try:
-                    eff = Effect(each["name"], each["stat"], each["effect"], each["duration"])
-                    item.effects.append(eff)
-                except KeyError:
-                    # Skip invalid records
-                    pass
+        item.flags = tuple(data["flags"])
+        item.effects = self._effects_from_data(data.get("effects", []))
         return item
 
 
@@ -81,31 +289,81 @@ class OtherWorldGame:
         Returns:
             OtherWorldMap: Map loaded from the file
         """
-        data = safe_load(fd)
+        return self.map_from_data(load_yaml(fd))
+
+
+    def map_from_data(self, data: dict[str, Any]) -> OtherWorldMap:
+        """
+        Build a map from parsed YAML data.
+        Items referenced by the map have to be loaded already.
+
+        Args:
+            data (dict[str, Any]): Map specification
+
+        Returns:
+            OtherWorldMap: Map built from the data
+        """
         map = OtherWorldMap(data["id"], data["title"], data["description"])
 
         if "exits" in data:
+            exits = {}
             for each in data["exits"]:
                 for key, val in each.items():
-                    map.exits[key] = val
+                    exits[key] = val
+            map.exits = MapExits(exits)
 
         if "items" in data:
             for each in data["items"]:
                 id, count = each
-                item = self.items[id]
+                # Stacks of removed items are dropped by `_relink_inventory()`,
+                # after the map is put into the world cache
+                item = self.removed_items.get(id) or self.items[id]
                 map.inventory.add_item(item, count)
 
-        if "effects" in data:
-            for each in data["effects"]:
-                try:
-                    eff = Effect(each["name"], each["stat"], each["effect"], each["duration"])
-                    map.effects.append(eff)
-                except KeyError:
-                    # Skip invalid records
-                    pass
+        map.effects = self._effects_from_data(data.get("effects", []))
         return map
 
 
+    def _effects_from_data(self, data: list[dict[str, Any]]) -> tuple[Effect, ...]:
+        effects = []
+        for each in data:
+            try:
+                effects.append(Effect(each["name"], each["stat"], each["effect"],
+                    each["duration"]))
+            except KeyError:
+                # Skip invalid records
+                pass
+        return tuple(effects)
+
+
+    def _intern_item(self, item: OtherWorldItem) -> None:
+        """
+        Share equal values among items: IDs, flags, effects.
+        Parsed items and items restored from the world cache have their own
+        copies of them.
+
+        Args:
+            item (OtherWorldItem): The item
+        """
+        item.id = sys.intern(item.id)
+        item.flags = intern_flags(item.flags)
+        item.effects = tuple(intern_effect(x) for x in item.effects)
+
+
+    def _intern_map(self, map: OtherWorldMap) -> None:
+        """
+        Share equal values among maps: IDs, exits, effects.
+        Parsed maps and maps restored from the world cache have their own
+        copies of them.
+
+        Args:
+            map (OtherWorldMap): The map
+        """
+        map.id = sys.intern(map.id)
+        map.exits = MapExits(map.exits)
+        map.effects = tuple(intern_effect(x) for x in map.effects)
+
+
     def load_maps(self, path: str) -> None:
         """
         Load maps from a directory.
@@ -113,35 +371,198 @@ class OtherWorldGame:
         This method expects all YAML files in the directory contain
         a valid map specification. In case of error, exceptions
         are raised.
+        Items have to be loaded first, see `load_items()`.
+
+        If the number of resident maps is limited, the maps are only
+        indexed here and loaded when the player enters them.
 
         Args:
             path (str): Path to a directory / folder.
         """
-        for item in self._load_yaml_from_folder(path, self.load_map_from_yaml):
-            self.maps[item.id] = item
+        if self.maps.max_resident is not None:
+            self.maps.index_folder(path)
+            self.sources.update((v, k) for k, v in self.maps.index.items())
+        else:
+            for file, item in self._load_yaml_from_folder(path, self.map_from_data):
+                self._relink_map(item)
+                self.maps.add(item)
+                self.sources[file] = item.id
 
         self.current_map = self.maps[MAP_START]
 
 
-    def _load_yaml_from_folder(self, path: str, fn: Callable) -> Generator[YS, None, None]:
+    def load_npcs(self, path: str, seed: Optional[int] = None) -> None:
+        """
+        Load kinds of NPCs from a directory and spawn the NPCs.
+        A world without the directory has no NPCs.
+        Maps have to be loaded first, see `load_maps()`.
+
+        Args:
+            path (str): Path to a directory / folder.
+            seed (Optional[int], optional): Seed of the NPCs' random
+                decisions. Defaults to None (unpredictable).
+        """
+        if not Path(path).is_dir():
+            return
+        for file, kind in self._load_yaml_from_folder(path, self.npc_from_data):
+            self.npc_kinds[kind.id] = kind
+        if self.npc_kinds:
+            self.npcs = NpcEngine(self.world_graph(), seed)
+            for kind in self.npc_kinds.values():
+                for map_id, count in kind.spawns:
+                    self.npcs.spawn(kind, map_id, count)
+
+
+    def npc_from_data(self, data: dict[str, Any]) -> OtherWorldNpc:
+        """
+        Build a kind of NPCs from parsed YAML data
+
+        Args:
+            data (dict[str, Any]): NPC specification
+
+        Returns:
+            OtherWorldNpc: Kind of NPCs built from the data
+        """
+        kind = OtherWorldNpc(
+            data["id"], data["name"], data["title"], data["description"],
+            CharacterStats(**data["stats"]))
+        kind.aggressive = bool(data.get("aggressive", False))
+        kind.wander = float(data.get("wander", 0.0))
+        kind.flee = float(data.get("flee", 0.0))
+        kind.respawn = int(data.get("respawn", 0))
+        kind.spawns = tuple((x[0], int(x[1])) for x in data.get("spawns", []))
+        return kind
+
+
+    def world_graph(self) -> WorldGraph:
+        """
+        Get the exit graph of the world, compile it if needed.
+        The graph is shared by all games of the world.
+
+        Returns:
+            WorldGraph: The graph
+        """
+        if self.maps.graph is None:
+            self.maps.graph = WorldGraph.compile(self.maps.iter_exits(), MAP_START)
+        return self.maps.graph
+
+
+    def _load_yaml_from_folder(self, path: str,
+        fn: Callable[[dict[str, Any]], YS]) -> Generator[tuple[Path, YS], None, None]:
         """
         Load game object from YAML files in a directory.
 
-        The (private) method iterates over all YAML file in the directory
-        specified by `path` and calls `load_yaml_file()` method of
-        the class passed in `cls`.
+        The (private) method parses all YAML files in the directory
+        specified by `path` - in a process pool if there are many of them -
+        and builds the game objects from the parsed data using `fn`.
+        The objects are built in this process, so `fn` may refer to
+        the objects loaded earlier.
+        Objects of unchanged files are taken from the world cache if
+        the game has one.
 
         Args:
             path (str): Directory / folder path
-            cls (type[YS]): Class name which instances should be loaded from the files
+            fn (Callable[[dict[str, Any]], YS]): Function building a game object
+                from parsed YAML data
 
         Yields:
-            Generator[YS, None, None]: Instance of the specified class
+            Generator[tuple[Path, YS], None, None]: Pairs of source file and
+                game object in the order of file names
+        """
+        started = perf_counter_ns()
+        files = sorted(Path(path).glob("*.yaml"))
+        objs: list[Optional[YS]] = [None] * len(files)
+        if self.cache is not None:
+            objs = [self.cache.get(each) for each in files]
+
+        pending = [idx for idx, obj in enumerate(objs) if obj is None]
+        parsed = load_yaml_files([files[idx] for idx in pending])
+        for idx, data in zip(pending, parsed):
+            objs[idx] = fn(data)
+            if self.cache is not None:
+                self.cache.put(files[idx], objs[idx])
+
+        if STATS.enabled:
+            STATS.record("load.folder", perf_counter_ns() - started)
+            STATS.count("load.files_parsed", len(pending))
+            STATS.count("load.files_cached", len(files) - len(pending))
+        yield from zip(files, objs)
+
+
+    def _load_item_file(self, file: Path) -> OtherWorldItem:
         """
-        p = Path(path)
-        for each in p.glob("*.yaml"):
-            obj = fn(each.open(encoding=FILE_ENCODING))
-            yield obj
+        Load a single item file, using the world cache if possible.
+
+        Args:
+            file (Path): Path to the item file
+
+        Returns:
+            OtherWorldItem: Item loaded from the file
+        """
+        item = self.cache.get(file) if self.cache is not None else None
+        if item is None:
+            item = self.item_from_data(load_yaml_file(file))
+            if self.cache is not None:
+                self.cache.put(file, item)
+        self._intern_item(item)
+        return item
+
+
+    def _load_map_file(self, file: Path) -> OtherWorldMap:
+        """
+        Load a single map file, using the world cache if possible.
+
+        Args:
+            file (Path): Path to the map file
+
+        Returns:
+            OtherWorldMap: Map loaded from the file
+        """
+        started = perf_counter_ns()
+        map = self.cache.get(file) if self.cache is not None else None
+        cached = map is not None
+        if map is None:
+            map = self.map_from_data(load_yaml_file(file))
+            if self.cache is not None:
+                self.cache.put(file, map)
+        self._relink_map(map)
+        if STATS.enabled:
+            STATS.record("load.map_file", perf_counter_ns() - started)
+            STATS.count("load.files_cached" if cached else "load.files_parsed")
+        return map
+
+
+    def _relink_map(self, map: OtherWorldMap) -> None:
+        self._intern_map(map)
+        self._relink_inventory(map.inventory)
+        self.item_locations.attach_map(map.inventory, map.id)
+        if not self.text_index.has("map", map.id):
+            self.text_index.add("map", map.id, map.title, map.description)
+
+
+    def _relink_inventory(self, inventory: OtherWorldInventory) -> None:
+        """
+        Point inventory records to the loaded items.
+
+        Maps restored from the world cache carry their own copies
+        of the items. Replace them with the shared instances from `self.items`.
+        Totals are computed again, weights of the items may have changed
+        since the inventory was cached or spilled (see `ContentWatcher`).
+        Stacks of items removed from the running game are dropped.
+
+        Args:
+            inventory (OtherWorldInventory): The inventory to relink.
+
+        Raises:
+            KeyError: If the inventory refers to an unknown item.
+        """
+        if self.removed_items:
+            for each in [x for x in inventory if x.item.id in self.removed_items]:
+                for _ in range(each.count):
+                    inventory.remove_item(each.item)
+        for each in inventory:
+            each.item = self.items[each.item.id]
+        inventory.update_totals()
 
 
     def item_name_to_id(self, item_name: str) -> Optional[str]:
@@ -154,62 +575,127 @@ class OtherWorldGame:
         Returns:
             Optional[str]: Item ID if found, None otherwise.
         """
-        result = None
-        for k, v in self.items.items():
-            if v.name.lower() == item_name.lower():
-                result = k
-                break
-        return result
+        return self.item_names.find(item_name)
 
 
-    def render_inventory(self, inventory: OtherWorldInventory, detailed = False) -> str:
+    def resolve_item_code(self, inventory: OtherWorldInventory, text: str) -> str:
+        """
+        Translate a user's reference to an item in an inventory to the item code.
+        The user can use either the code, or the name of the item
+        or its unique abbreviation (e.g. `mush` for a green mushroom).
+        Longer codes (e.g. `ab`) take precedence over names only if
+        the inventory has a stack with such a code. Abbreviations are matched
+        against the stacks of the inventory, not the whole item catalogue.
+
+        Args:
+            inventory (OtherWorldInventory): Inventory containing the item
+            text (str): Item code or name
+
+        Returns:
+            str: Item code. Unresolved text is returned unchanged.
+        """
+        if (len(text) == 1 and code_to_index(text) is not None) or inventory.has_code(text):
+            return text
+        id = self.item_names.find(text)
+        if id is None or inventory.get_item_by_id(id) is None:
+            ids = []
+            for each in inventory:
+                if NameIndex.matches_prefix(each.item.name, text):
+                    ids.append(each.item.id)
+                    if len(ids) > 1:
+                        break   # Ambiguous
+            id = ids[0] if len(ids) == 1 else None
+        code = inventory.code_of(id) if id is not None else None
+        return text if code is None else code
+
+
+    def render_inventory(self, inventory: OtherWorldInventory, detailed = False,
+        page: int = 1) -> str:
         """
         Render inventory string.
         There are two possible outputs - a simple one and a detailed one.
         The latter if `detailed` is True. The detailed one contains weight.
+        Large inventories are rendered by pages of INVENTORY_PAGE_SIZE codes.
+        Rendered strings are cached until the inventory changes.
 
         Args:
             inventory (OtherWorldInventory): The inventory to render.
             detailed (bool, optional): If the detailed output should be rendered. Defaults to False.
+            page (int, optional): Page to render, see `page_count()`. Defaults to 1.
 
         Returns:
             str: Rendered string (a fixed-width table)
         """
+        key = ("inventory", id(inventory), inventory.version, detailed, page)
+        return self.render_cache.get(key, (inventory,),
+            lambda: self._render_inventory(inventory, detailed, page))
+
+
+    def page_count(self, inventory: OtherWorldInventory) -> int:
+        """
+        Get the number of pages of a rendered inventory.
+
+        Args:
+            inventory (OtherWorldInventory): The inventory
+
+        Returns:
+            int: Number of pages, at least 1
+        """
+        return max(1, -(-inventory.slot_count // INVENTORY_PAGE_SIZE))
+
+
+    def _render_inventory(self, inventory: OtherWorldInventory, detailed: bool,
+        page: int) -> str:
         lines = []
-        total_weight = 0.0
         if detailed:
             lines.append("      Id  Item name                                         Count  Weight")
-        for idx, each in enumerate(inventory.items):
+        start = (page - 1) * INVENTORY_PAGE_SIZE
+        for item_code, each in inventory.iter_codes(start, start + INVENTORY_PAGE_SIZE):
             item = each.item
-            item_code = OtherWorldInventory.CODE_SET[idx]
             line = f"      {item_code:>{2}}. "
             if detailed:
                 weight = each.count * item.weight
-                total_weight += weight
                 line += f"{item.title:<{48}}  {each.count:>{4}}  {weight:>{6}}"
             else:
                 line += f"{item.title} ({each.count})"
             lines.append(line)
+        pages = self.page_count(inventory)
+        if pages > 1:
+            lines.append(f"      Page {page} of {pages}, {len(inventory)} stacks")
         if detailed:
-            lines.append(f"Total item weight: {total_weight:.1f}")
+            lines.append(f"Total item weight: {inventory.total_weight:.1f}")
         result = "\n".join(lines)
         return result
     
 
-    def render_map(self, map: str) -> str:
+    def render_map(self, map: OtherWorldMap,
+        inventory: Optional[OtherWorldInventory] = None, page: int = 1) -> str:
         """
         Render text map description. It's being displayed when the user
         enters the `look` command.
+        Rendered strings are cached until the map or the inventory changes.
 
         Args:
-            map_id (str): ID of the map to render.
+            map (OtherWorldMap): The map to render.
+            inventory (Optional[OtherWorldInventory], optional): Items on the map.
+                Defaults to the map's own inventory.
+            page (int, optional): Page of the items. Defaults to 1.
 
         Returns:
             str: Rendered string
         """
+        if inventory is None:
+            inventory = map.inventory
+        key = ("map", id(map), map.version, id(inventory), inventory.version, page)
+        return self.render_cache.get(key, (map, inventory),
+            lambda: self._render_map(map, inventory, page))
+
+
+    def _render_map(self, map: OtherWorldMap, inventory: OtherWorldInventory,
+        page: int = 1) -> str:
         result = ""
         items_table = ""
-        items_str = self.render_inventory(map.inventory, detailed=False)
+        items_str = self.render_inventory(inventory, detailed=False, page=page)
         if len(items_str) > 0:
             items_table = f"  - Items:\n{items_str}\n"
 
@@ -222,6 +708,94 @@ class OtherWorldGame:
         return result
 
 
+    def render_npcs(self, map_id: Optional[str] = None) -> str:
+        """
+        Render the list of NPCs on a map. Unlike maps, the lists are not
+        cached, NPCs move every turn.
+
+        Args:
+            map_id (Optional[str], optional): Map ID. Defaults to the current map.
+
+        Returns:
+            str: Rendered string, empty if there are no NPCs
+        """
+        if self.npcs is None:
+            return ""
+        handles = self.npcs.on_map(map_id or self.current_map_id).tolist()
+        if not handles:
+            return ""
+        lines = ["  - NPCs:"]
+        for idx, handle in enumerate(handles):
+            state = " (hostile)" if self.npcs.is_hostile(handle) else ""
+            lines.append(f"       {index_to_code(idx)}. {self.npcs.kind_of(handle).title}{state}")
+        return "\n".join(lines)
+
+
+    def resolve_npc(self, text: str) -> int:
+        """
+        Find an NPC on the current map by its code (as listed by `look`)
+        or by its name.
+
+        Args:
+            text (str): Code or name
+
+        Returns:
+            int: Handle of the NPC
+
+        Raises:
+            IndexError: If there's no such NPC
+        """
+        if self.npcs is None:
+            raise IndexError(text)
+        handles = self.npcs.on_map(self.current_map_id).tolist()
+        idx = code_to_index(text)
+        if idx is not None and idx < len(handles):
+            return handles[idx]
+        for handle in handles:
+            if self.npcs.kind_of(handle).name == text:
+                return handle
+        raise IndexError(text)
+
+
+    def end_turn(self) -> tuple[str, bool]:
+        """
+        Finish the player's turn - NPCs act and the active effects are
+        applied on the player.
+
+        Returns:
+            tuple[str, bool]: A tuple of message displayed to the user and
+                a flag indicating the player has died.
+        """
+        msgs = []
+        if self.npcs is not None:
+            msgs.extend(self._npc_turn())
+        engine = self.player.engine
+        # Games sharing the engine advance it once per turn of the game
+        # ahead of the others
+        if engine is not None and self.scheduler.turn >= engine.turn:
+            engine.tick()
+        msg_effects, death = self.player.apply_effects()
+        if msg_effects:
+            msgs.append(msg_effects)
+        return ("\n".join(msgs), death)
+
+
+    def _npc_turn(self) -> list[str]:
+        npcs = self.npcs
+        if npcs.graph is not self.maps.graph:
+            npcs.set_graph(self.world_graph())
+        # Games sharing the NPCs advance them once per turn of the game
+        # ahead of the others
+        if self.scheduler.turn >= npcs.turn:
+            npcs.tick()
+
+        msgs = []
+        for handle, damage in npcs.strike(self.current_map_id, self.player.stats.con):
+            self.player.change_stat("hp", -damage)
+            msgs.append(f"The {npcs.kind_of(handle).name} attacks you. You lose {damage} HP.")
+        return msgs
+
+
     def move_item_inv2inv(self, item_code: str, 
         source_inv: OtherWorldInventory, 
         target_inv: Optional[OtherWorldInventory] = None,
@@ -244,7 +818,7 @@ class OtherWorldGame:
             InventoryError: Item cannot be moved, target inventory is full
         """
         inv_item = source_inv.get_item_by_code(item_code)
-        if flag not in inv_item.item.flags:
+        if flag is not None and flag not in inv_item.item.flags:
             raise ItemError("Flag doesn't match.")
         
         try:
@@ -255,17 +829,30 @@ class OtherWorldGame:
             raise InventoryError("Item cannot be moved out of the source inventory.")
 
 
+    def handle_cmd_attack(self, cmd_dict: dict[str, str]) -> CmdResult:
+        try:
+            handle = self.resolve_npc(cmd_dict["code"])
+        except IndexError:
+            return ("There's no such NPC here.", False)
+        name = self.npcs.kind_of(handle).name
+        damage, killed = self.npcs.hit(handle, self.player.stats.str)
+        msg = f"You hit the {name}. It loses {damage} HP."
+        if killed:
+            msg = f"{msg}\nYou've killed the {name}."
+        return (msg, False)
+
+
     def handle_cmd_consume(self, cmd_dict: dict[str, str]) -> CmdResult:
         msg = "This item cannot be consumed."
         try:
-            code = cmd_dict["code"]
             inventory = self.player.inventory
+            code = self.resolve_item_code(inventory, cmd_dict["code"])
             item = inventory.get_item_by_code(code).item
             self.move_item_inv2inv(code, self.player.inventory, flag=FLAG_CONSUMABLE)
             msg = f"You've consumed {item.name}."
             # Apply effects if any present on the item
             for each in item.effects:
-                self.player.effects.append(each)
+                self.player.add_effect(each)
         except IndexError:
             # If not found, report an error.
             msg = "Cannot consume an item. No such item available."
@@ -279,10 +866,12 @@ class OtherWorldGame:
     def handle_cmd_drop(self, cmd_dict: dict[str, str]) -> CmdResult:
         try:
             self.move_item_inv2inv(
-                cmd_dict["code"], 
+                self.resolve_item_code(self.player.inventory, cmd_dict["code"]), 
                 self.player.inventory, 
-                self.current_map.inventory)
+                self.map_inventory(writable=True))
             msg = f"The item has been dropped from your inventory."
+        except IndexError:
+            msg = "Cannot drop an item. No such item available."
         except InventoryError as e:
             msg = f"{e}"
         return (msg, False)
@@ -291,13 +880,30 @@ class OtherWorldGame:
     def handle_cmd_examine(self, cmd_dict: dict[str, str]) -> CmdResult:
         try:
             inventory = self.player.current_inventory
-            item = inventory.get_item_by_code(cmd_dict["code"]).item
+            code = self.resolve_item_code(inventory, cmd_dict["code"])
+            item = inventory.get_item_by_code(code).item
             msg = item.description
         except IndexError:
             msg = "No such item."
         return (msg, False)
 
 
+    def handle_cmd_flee(self, cmd_dict: dict[str, str]) -> CmdResult:
+        if self.npcs is None or not any(self.npcs.is_hostile(x)
+            for x in self.npcs.on_map(self.current_map_id).tolist()):
+            return ("There's nothing to flee from.", False)
+        exits = list(self.current_map.exits)
+        if not exits:
+            return ("There's no way out.", False)
+        # Wiser characters get away more likely
+        chance = min(0.4 + self.player.stats.wis / 40, 0.9)
+        if self.npcs.rng.random() >= chance:
+            return ("You've failed to flee.", False)
+        exit_name = exits[int(self.npcs.rng.integers(len(exits)))]
+        msg, finished = self.handle_cmd_go({"exit": exit_name})
+        return (f"You've fled {exit_name}.\n{msg}", finished)
+
+
     def handle_cmd_go(self, cmd_dict: dict[str, str]) -> CmdResult:
         msg = "Error: Unknown exit"
         exit_name = cmd_dict["exit"]
@@ -308,7 +914,7 @@ class OtherWorldGame:
 
                 # Apply map effects on the player
                 for each in self.current_map.effects:
-                    self.player.effects.append(each)
+                    self.player.add_effect(each)
                 msg = f"You are here: {self.current_map.title}"
             else:
                 msg = "Error: Map not available."
@@ -320,8 +926,12 @@ class OtherWorldGame:
 
     def handle_cmd_inventory(self, cmd_dict: dict[str, str]) -> CmdResult:
         msg = "Your inventory is empty."
-        if len(self.player.inventory.items) > 0:
-            inv_str = self.render_inventory(self.player.inventory, detailed=True)
+        page = int(cmd_dict.get("page") or 1)
+        if not 1 <= page <= self.page_count(self.player.inventory):
+            msg = "Error: No such page."
+        elif len(self.player.inventory) > 0:
+            inv_str = self.render_inventory(self.player.inventory, detailed=True,
+                page=page)
             msg = f"Your inventory contains these items:\n{inv_str}"
 
         # Set the current inventory to the player's one (for the `examine` command)
@@ -330,10 +940,29 @@ class OtherWorldGame:
 
 
     def handle_cmd_look(self, cmd_dict: dict[str, str]) -> CmdResult:
-        msg = self.render_map(self.current_map)
+        inventory = self.map_inventory()
+        page = int(cmd_dict.get("page") or 1)
+        if not 1 <= page <= self.page_count(inventory):
+            return ("Error: No such page.", False)
+        msg = self.render_map(self.current_map, inventory, page)
+        npcs_str = self.render_npcs()
+        if npcs_str:
+            msg = f"{msg}\n{npcs_str}"
 
         # Set the map's inventory as the current for the `examine` command
-        self.player.current_inventory = self.current_map.inventory
+        self.player.current_inventory = inventory
+        return (msg, False)
+
+
+    def handle_cmd_travel(self, cmd_dict: dict[str, str]) -> CmdResult:
+        target_id = cmd_dict["map"]
+        route = self.world_graph().route(self.current_map_id, target_id)
+        if route is None:
+            msg = f"There's no way to {target_id}."
+        elif not route:
+            msg = "You are already there."
+        else:
+            msg = f"Route to {target_id} ({len(route)} moves): {', '.join(route)}"
         return (msg, False)
 
 
@@ -341,12 +970,23 @@ class OtherWorldGame:
         return ("Exiting the game.", True)
     
 
+    def handle_cmd_search(self, cmd_dict: dict[str, str]) -> CmdResult:
+        results = self.search(cmd_dict["query"])
+        if not results:
+            return ("Nothing found.", False)
+        lines = ["Found:"]
+        for kind, id, title, score in results:
+            lines.append(f"    {id:<20}{title} ({kind})")
+        return ("\n".join(lines), False)
+
+
     def handle_cmd_take(self, cmd_dict: dict[str, str]) -> CmdResult:
         try:
-            code = cmd_dict["code"]
-            item = self.current_map.inventory.get_item_by_code(code).item
+            inventory = self.map_inventory()
+            code = self.resolve_item_code(inventory, cmd_dict["code"])
+            item = inventory.get_item_by_code(code).item
             self.move_item_inv2inv(code, 
-                self.current_map.inventory, self.player.inventory, 
+                self.map_inventory(writable=True), self.player.inventory, 
                 flag=FLAG_COLLECTABLE)
             msg = f"You've taken {item.name}."
         except ItemError:
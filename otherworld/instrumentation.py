@@ -0,0 +1,140 @@
+import json
+
+from pathlib import Path
+from typing import Any
+
+
+class LatencyHistogram:
+    """
+    Histogram of latencies with power of two buckets.
+
+    Bucket `i` counts latencies of `2 ** (i - 1)` to `2 ** i - 1` nanoseconds,
+    so recording is a few integer operations and percentiles are accurate
+    to a factor of two.
+    """
+    __slots__ = ("buckets", "count", "total", "max")
+
+    def __init__(self) -> None:
+        self.buckets = [0] * 64
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+
+    def record(self, ns: int) -> None:
+        self.buckets[min(ns.bit_length(), 63)] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+
+    def percentile(self, p: float) -> int:
+        """
+        Estimate a percentile.
+
+        Args:
+            p (float): Percentile, 0 - 100
+
+        Returns:
+            int: Upper bound of the bucket containing the percentile, in ns
+        """
+        rank = p / 100 * self.count
+        seen = 0
+        for idx, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                return min(2 ** idx - 1, self.max)
+        return self.max
+
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "total_ns": self.total,
+            "max_ns": self.max,
+            "p50_ns": self.percentile(50),
+            "p99_ns": self.percentile(99),
+            "buckets": {2 ** idx - 1: n for idx, n in enumerate(self.buckets) if n},
+        }
+
+
+class Instrumentation:
+    """
+    Counters and latency histograms of the game's operations.
+
+    Instrumented code checks `enabled` before taking any measurement,
+    so switched off instrumentation costs a single attribute lookup:
+
+        if STATS.enabled:
+            started = perf_counter_ns()
+            ...
+            STATS.record("name", perf_counter_ns() - started)
+    """
+    def __init__(self) -> None:
+        self.enabled = False
+        self.counters: dict[str, int] = {}
+        self.latencies: dict[str, LatencyHistogram] = {}
+
+
+    def reset(self) -> None:
+        self.counters.clear()
+        self.latencies.clear()
+
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+
+    def record(self, name: str, ns: int) -> None:
+        """
+        Record a latency of an operation.
+
+        Args:
+            name (str): Name of the operation
+            ns (int): Latency in nanoseconds
+        """
+        histogram = self.latencies.get(name)
+        if histogram is None:
+            histogram = self.latencies[name] = LatencyHistogram()
+        histogram.record(ns)
+
+
+    def render(self) -> str:
+        """
+        Render the collected data as a table.
+
+        Returns:
+            str: Rendered string
+        """
+        state = "on" if self.enabled else "off"
+        if not (self.latencies or self.counters):
+            return f"Instrumentation is {state}, nothing has been recorded."
+        lines = [f"Instrumentation is {state}.",
+            f"      {'Operation':<28}  {'Count':>8}  {'Mean us':>9}  {'p50 us':>9}  "
+            f"{'p99 us':>9}  {'Max us':>9}"]
+        for name, h in sorted(self.latencies.items()):
+            lines.append(f"      {name:<28}  {h.count:>8}  {h.total / h.count / 1000:>9.1f}  "
+                f"{h.percentile(50) / 1000:>9.1f}  {h.percentile(99) / 1000:>9.1f}  "
+                f"{h.max / 1000:>9.1f}")
+        for name, n in sorted(self.counters.items()):
+            lines.append(f"      {name:<28}  {n:>8}")
+        return "\n".join(lines)
+
+
+    def dump(self, path: str) -> None:
+        """
+        Write the collected data to a JSON file.
+
+        Args:
+            path (str): Path to the file
+        """
+        data = {
+            "counters": self.counters,
+            "latencies": {k: v.to_dict() for k, v in self.latencies.items()},
+        }
+        Path(path).write_text(json.dumps(data, indent=2, sort_keys=True) + "\n")
+
+
+# Shared by all the games of the process
+STATS = Instrumentation()
@@ -1,11 +1,63 @@
+from heapq import heapify, heappop, heappush
+from typing import Any, Generator, Iterator, Optional
+
 from item import OtherWorldItem
 
+
+# Capacity of inventories which don't specify their own (e.g. player's one)
+DEFAULT_MAX_ITEMS = 26
+
+_LETTERS = "abcdefghijklmnopqrstuvwxyz"
+_CODES: list[str] = list(_LETTERS)     # Codes of the slots generated so far
+
+
+def index_to_code(idx: int) -> str:
+    """
+    Translate a slot index to its code: a .. z, aa .. az, ba .. zz, aaa ..
+
+    Args:
+        idx (int): Slot index
+
+    Returns:
+        str: The code
+    """
+    while idx >= len(_CODES):
+        # Codes are generated in order, so the cache stays a plain list
+        n = len(_CODES) + 1
+        code = ""
+        while n > 0:
+            n, rem = divmod(n - 1, 26)
+            code = _LETTERS[rem] + code
+        _CODES.append(code)
+    return _CODES[idx]
+
+
+def code_to_index(code: str) -> Optional[int]:
+    """
+    Translate a code to a slot index, see `index_to_code()`.
+
+    Args:
+        code (str): The code
+
+    Returns:
+        Optional[int]: Slot index, None if the text isn't a valid code.
+    """
+    idx = 0
+    for char in code:
+        value = ord(char) - 96
+        if not 1 <= value <= 26:
+            return None
+        idx = idx * 26 + value
+    return idx - 1 if code else None
+
 class InventoryError(RuntimeError):
     def __init__(self, *args: object) -> None:
         super().__init__(*args)
 
 
 class InventoryItem:
+    __slots__ = ("item", "count")
+
     def __init__(self, item: OtherWorldItem, count: int = 1):
         self.item: OtherWorldItem = item
         self.count = count
@@ -21,16 +73,176 @@ class OtherWorldInventory:
     Used as player's inventory, player's equipment list,
     and list of items on a map.
 
-    The game should use character codes ('a' .. 'z') to ease the selection
-    of items from inventory. These codes are directly translatable to index
-    - a -> 0, b -> 1, etc.
+    The game should use character codes to ease the selection of items
+    from inventory. These codes are directly translatable to index
+    - a -> 0, b -> 1, ..., z -> 25, aa -> 26, ab -> 27, etc.
+    (see `index_to_code()`).
+
+    Item stacks are kept in slots indexed by the codes and an item ID -> slot
+    index, so all the operations take constant time. A code keeps pointing
+    to the same stack until the stack is emptied. Freed slots are reused,
+    lowest first.
+
+    Total weight and number of pieces are kept up to date by the changes,
+    so they are available without iterating over the stacks.
+
+    `version` is increased by every change of the content, so renderings
+    of the inventory can be cached.
+
+    An inventory attached to an `ItemLocations` index reports its changes
+    there. Copies and pickled inventories are detached.
     """
-    CODE_SET = [chr(ord('a') + x) for x in range(26)]
+    __slots__ = ("name", "max_items", "_slots", "_index", "_free", "version",
+        "total_weight", "total_count", "locations", "location", "__weakref__")
 
-    def __init__(self, name: str, max_items: int = len(CODE_SET)) -> None:
+    def __init__(self, name: str, max_items: Optional[int] = DEFAULT_MAX_ITEMS) -> None:
+        """
+        Args:
+            name (str): Name of the inventory
+            max_items (Optional[int], optional): Maximum number of item stacks,
+                None for no limit. Defaults to DEFAULT_MAX_ITEMS.
+        """
         self.name = name
         self.max_items = max_items
-        self.items: list[InventoryItem] = []
+        self._slots: list[Optional[InventoryItem]] = []
+        self._index: dict[str, int] = {}    # Item ID -> slot
+        self._free: list[int] = []          # Heap of empty slots
+        self.version = 0
+        self.total_weight = 0.0
+        self.total_count = 0    # Number of pieces of all the items
+        self.locations = None   # ItemLocations index, see `ItemLocations.track()`
+        self.location: Optional[str] = None
+
+
+    def __getstate__(self) -> tuple[None, dict[str, Any]]:
+        # Pickled without the index, e.g. when the map is spilled to the disk
+        state = {x: getattr(self, x) for x in self.__slots__ if x != "__weakref__"}
+        state["locations"] = None
+        return (None, state)
+
+
+    def __setstate__(self, state: tuple[None, dict[str, Any]]) -> None:
+        for k, v in state[1].items():
+            setattr(self, k, v)
+
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+
+    def __iter__(self) -> Iterator[InventoryItem]:
+        """
+        Iterate over item stacks ordered by their codes.
+        """
+        return (x for x in self._slots if x is not None)
+
+
+    @property
+    def items(self) -> list[InventoryItem]:
+        """
+        Item stacks ordered by their codes, a new list. Iterate over
+        the inventory instead where a list isn't needed.
+        """
+        return list(self)
+
+
+    @property
+    def slot_count(self) -> int:
+        """
+        Number of slots, including the empty ones between stacks. Codes of
+        all the stacks belong to the first `slot_count` codes and the last
+        slot is never empty.
+        """
+        return len(self._slots)
+
+
+    def iter_codes(self, start: int = 0,
+        stop: Optional[int] = None) -> Generator[tuple[str, InventoryItem], None, None]:
+        """
+        Iterate over item stacks and their codes.
+
+        Args:
+            start (int, optional): First slot. Defaults to 0.
+            stop (Optional[int], optional): Slot to stop at, e.g. to get
+                a single page. Defaults to None (all the slots).
+
+        Yields:
+            Generator[tuple[str, InventoryItem], None, None]: Pairs of item code
+                and item stack, ordered by the codes.
+        """
+        stop = len(self._slots) if stop is None else min(stop, len(self._slots))
+        for idx in range(start, stop):
+            each = self._slots[idx]
+            if each is not None:
+                yield (index_to_code(idx), each)
+
+
+    def copy(self) -> "OtherWorldInventory":
+        """
+        Copy the inventory. Stacks are copied, items are shared.
+
+        Returns:
+            OtherWorldInventory: The copy with the same item codes
+        """
+        result = type(self)(self.name, self.max_items)
+        result._slots = [None if x is None else InventoryItem(x.item, x.count)
+            for x in self._slots]
+        result._index = dict(self._index)
+        result._free = list(self._free)
+        result.version = self.version
+        result.total_weight = self.total_weight
+        result.total_count = self.total_count
+        return result
+
+
+    def dump_slots(self) -> list[Optional[tuple[str, int]]]:
+        """
+        Export the content of the inventory, e.g. to save it.
+
+        Returns:
+            list[Optional[tuple[str, int]]]: Item ID and count of each slot,
+                None for empty slots.
+        """
+        return [None if x is None else (x.item.id, x.count) for x in self._slots]
+
+
+    def load_slots(self, slots: list[Optional[tuple[str, int]]],
+        items: dict[str, OtherWorldItem]) -> None:
+        """
+        Replace the content of the inventory by slots from `dump_slots()`.
+
+        Args:
+            slots (list[Optional[tuple[str, int]]]): The slots
+            items (dict[str, OtherWorldItem]): Loaded items by their IDs
+        """
+        self.version += 1
+        if self.locations is not None:
+            for each in self:
+                self.locations.remove(each.item.id, self.location, each.count)
+        self._slots = []
+        self._index = {}
+        self._free = []     # Ascending order is a valid heap
+        for idx, each in enumerate(slots):
+            if each is None:
+                self._slots.append(None)
+                self._free.append(idx)
+            else:
+                id, count = each
+                self._slots.append(InventoryItem(items[id], count))
+                self._index[id] = idx
+                if self.locations is not None:
+                    self.locations.add(id, self.location, count)
+        self._trim()
+        self.update_totals()
+
+
+    def update_totals(self) -> None:
+        """
+        Compute the total weight and count from scratch, e.g. after weight
+        of an item has changed.
+        """
+        self.total_weight = sum(x.count * x.item.weight for x in self)
+        self.total_count = sum(x.count for x in self)
 
 
     def add_item(self, item: OtherWorldItem, count: int = 1) -> None:
@@ -38,18 +250,31 @@ class OtherWorldInventory:
         Add an item into the inventory.
 
         Args:
-            item_id (str): Item ID
+            item (OtherWorldItem): The item
+            count (int, optional): Number of pieces. Defaults to 1.
 
         Raises:
             InventoryError: In case of full inventory.
         """
-        idx = self.get_item_idx(item.id)
-        if idx >= 0:    # Item found
-            self.items[idx].count += count
-        elif len(self.items) < self.max_items:
-            self.items.append(InventoryItem(item, count))
+        idx = self._index.get(item.id)
+        if idx is not None:    # Item found
+            self._slots[idx].count += count
+        elif self.max_items is None or len(self._index) < self.max_items:
+            inv_item = InventoryItem(item, count)
+            if self._free:
+                idx = heappop(self._free)
+                self._slots[idx] = inv_item
+            else:
+                idx = len(self._slots)
+                self._slots.append(inv_item)
+            self._index[item.id] = idx
         else:
             raise InventoryError("Invetory full")
+        self.version += 1
+        self.total_weight += count * item.weight
+        self.total_count += count
+        if self.locations is not None:
+            self.locations.add(item.id, self.location, count)
 
 
     def get_item_idx(self, item_id: str) -> int:
@@ -62,12 +287,35 @@ class OtherWorldInventory:
         Returns:
             int: Index of the item in the inventory, or -1 if not found.
         """
-        result = -1
-        for idx, each in enumerate(self.items):
-            if each.item.id == item_id:
-                result = idx
-                break
-        return result
+        return self._index.get(item_id, -1)
+
+
+    def get_item_by_id(self, item_id: str) -> Optional[InventoryItem]:
+        """
+        Get an item stack by item ID.
+
+        Args:
+            item_id (str): Item ID
+
+        Returns:
+            Optional[InventoryItem]: The stack, or None if not found.
+        """
+        idx = self._index.get(item_id)
+        return None if idx is None else self._slots[idx]
+
+
+    def code_of(self, item_id: str) -> Optional[str]:
+        """
+        Get the code of an item stack.
+
+        Args:
+            item_id (str): Item ID
+
+        Returns:
+            Optional[str]: The code, or None if the item is not present.
+        """
+        idx = self._index.get(item_id)
+        return None if idx is None else index_to_code(idx)
 
 
     def remove_item(self, item: OtherWorldItem) -> None:
@@ -75,36 +323,91 @@ class OtherWorldInventory:
         Remove an item from the inventory.
 
         Args:
-            item_id (str): Item ID
+            item (OtherWorldItem): The item
 
         Raises:
             InventoryError: If the item is not present in the inventory.
         """
-        idx = self.get_item_idx(item.id)
-        if idx >= 0:    # Item found
-            inv_item = self.items[idx]
+        idx = self._index.get(item.id)
+        if idx is not None:    # Item found
+            self.version += 1
+            inv_item = self._slots[idx]
             inv_item.count += -1
+            self.total_count -= 1
+            self.total_weight -= item.weight
+            if self.locations is not None:
+                self.locations.remove(item.id, self.location, 1)
             if inv_item.count == 0: # Last piece of an item removed
-                self.items = self.items[:idx] + self.items[idx + 1:]       
+                self._slots[idx] = None
+                del self._index[item.id]
+                if idx == len(self._slots) - 1:
+                    self._trim()
+                else:
+                    heappush(self._free, idx)
+                if not self._index:
+                    self.total_weight = 0.0     # No rounding errors left behind
         else:
             raise InventoryError("Item not found")
         
 
+    def _trim(self) -> None:
+        # Drop empty slots at the end, they would make pages without stacks
+        slots = self._slots
+        while slots and slots[-1] is None:
+            slots.pop()
+        if len(self._free) > len(slots) - len(self._index):
+            self._free = [x for x in self._free if x < len(slots)]
+            heapify(self._free)
+
+
+    def has_code(self, code: str) -> bool:
+        """
+        Check if there is an item stack with a code.
+
+        Args:
+            code (str): Item code
+
+        Returns:
+            bool: True if the code is valid and its slot isn't empty
+        """
+        idx = code_to_index(code)
+        return idx is not None and idx < len(self._slots) and self._slots[idx] is not None
+
+
     def _get_item_idx_by_code(self, code: str) -> int:
         """
         Get item by so-called code which is typically a single letter.
-        Can be overridden in child classes to increase the maximum capacity
-        on inventories.
 
         Args:
             code (str): An item code
 
+        Raises:
+            IndexError: If the code is invalid.
+
         Returns:
             int: Index translated from the code
         """
-        idx = OtherWorldInventory.CODE_SET.index(code)
+        idx = code_to_index(code)
+        if idx is None:
+            raise IndexError(f"Invalid item code: {code}")
         return idx
 
 
-    def get_item_by_code(self, code: str) -> OtherWorldItem:
-        return self.items[self._get_item_idx_by_code(code)]
+    def get_item_by_code(self, code: str) -> InventoryItem:
+        """
+        Get an item stack by its code.
+
+        Args:
+            code (str): An item code
+
+        Raises:
+            IndexError: If there is no item with the code.
+
+        Returns:
+            InventoryItem: The stack
+        """
+        idx = self._get_item_idx_by_code(code)
+        inv_item = self._slots[idx] if idx < len(self._slots) else None
+        if inv_item is None:
+            raise IndexError(f"No item with code: {code}")
+        return inv_item
@@ -10,6 +10,14 @@ class ItemError(ValueError):
 
 
 class OtherWorldItem(YAMLSourced):
+    """
+    An item - anything the player can take, carry, consume, etc.
+
+    Items are shared by all inventories holding them. Attributes are kept
+    in slots, flags and effects in shared tuples.
+    """
+    __slots__ = ("id", "name", "title", "description", "weight", "flags", "effects")
+
     def __init__(self, id: str, name: str, title: str, description: str,
         weight: float) -> None:
         super().__init__()
@@ -18,6 +26,22 @@ class OtherWorldItem(YAMLSourced):
         self.title: str = title
         self.description: str = description
         self.weight: float = weight
-        self.flags: list[str] = []
-        self.effects: list[Effect] = []
+        self.flags: tuple[str, ...] = ()
+        self.effects: tuple[Effect, ...] = ()
+
+
+# Interned flag tuples, most items share one of a few combinations
+_FLAG_SETS: dict[tuple[str, ...], tuple[str, ...]] = {}
+
+
+def intern_flags(flags: tuple[str, ...]) -> tuple[str, ...]:
+    """
+    Get the shared instance of a tuple of flags.
+
+    Args:
+        flags (tuple[str, ...]): The flags
 
+    Returns:
+        tuple[str, ...]: The first instance of an equal tuple
+    """
+    return _FLAG_SETS.setdefault(flags, flags)
@@ -0,0 +1,122 @@
+from inventory import OtherWorldInventory
+
+
+class ItemLocations:
+    """
+    Reverse index of items - the locations of an item and the number
+    of its pieces there.
+
+    Locations are maps (their IDs) and players (`player:<name>`).
+    Inventories attached to the index (see `track()`) report every change
+    to it, so the index is kept up to date incrementally and queries take
+    time proportional to the result, not to the size of the world.
+    """
+    def __init__(self) -> None:
+        self._counts: dict[str, dict[str, int]] = {}    # Item ID -> location -> count
+        self._maps: set[str] = set()    # Maps indexed so far
+        self.complete = False   # If all the maps of the world have been indexed
+
+
+    def where(self, item_id: str) -> dict[str, int]:
+        """
+        Find an item.
+
+        Args:
+            item_id (str): Item ID
+
+        Returns:
+            dict[str, int]: Location -> number of pieces there
+        """
+        return dict(self._counts.get(item_id, {}))
+
+
+    def total(self, item_id: str) -> int:
+        """
+        Get the number of pieces of an item in the indexed locations.
+        """
+        return sum(self._counts.get(item_id, {}).values())
+
+
+    def add(self, item_id: str, location: str, count: int) -> None:
+        counts = self._counts.get(item_id)
+        if counts is None:
+            counts = self._counts[item_id] = {}
+        counts[location] = counts.get(location, 0) + count
+
+
+    def remove(self, item_id: str, location: str, count: int) -> None:
+        counts = self._counts[item_id]
+        left = counts[location] - count
+        if left > 0:
+            counts[location] = left
+        else:
+            del counts[location]
+            if not counts:
+                del self._counts[item_id]
+
+
+    def track(self, inventory: OtherWorldInventory, location: str) -> None:
+        """
+        Attach an inventory to the index and add its content.
+
+        Args:
+            inventory (OtherWorldInventory): The inventory
+            location (str): Location of the inventory
+        """
+        for each in inventory:
+            self.add(each.item.id, location, each.count)
+        inventory.locations = self
+        inventory.location = location
+
+
+    def untrack(self, inventory: OtherWorldInventory) -> None:
+        """
+        Detach an inventory and remove its content from the index,
+        e.g. when a player leaves the game.
+
+        Args:
+            inventory (OtherWorldInventory): The inventory
+        """
+        if inventory.locations is not self:
+            return
+        for each in inventory:
+            self.remove(each.item.id, inventory.location, each.count)
+        inventory.locations = None
+
+
+    def attach_map(self, inventory: OtherWorldInventory, map_id: str) -> None:
+        """
+        Attach an inventory of a map. Its content is added only the first
+        time, a map evicted from the memory and loaded again is indexed
+        already.
+
+        Args:
+            inventory (OtherWorldInventory): The inventory
+            map_id (str): Map ID
+        """
+        if map_id in self._maps:
+            inventory.locations = self
+            inventory.location = map_id
+        else:
+            self._maps.add(map_id)
+            self.track(inventory, map_id)
+
+
+    def forget_map(self, map_id: str) -> None:
+        """
+        Remove a map without its inventory at hand, e.g. a map not
+        in the memory whose file has changed. Takes time proportional to
+        the number of indexed items.
+
+        Args:
+            map_id (str): Map ID
+        """
+        if map_id not in self._maps:
+            return
+        self._maps.discard(map_id)
+        for item_id in [k for k, v in self._counts.items() if map_id in v]:
+            self.remove(item_id, map_id, self._counts[item_id][map_id])
+
+
+    def has_map(self, map_id: str) -> bool:
+        return map_id in self._maps
@@ -1,21 +1,69 @@
-from yaml import safe_load
+import sys
+
+from collections.abc import Mapping
+from typing import Iterator, TextIO
 
-from typing import TextIO
+from yaml import safe_load
 
 from inventory import OtherWorldInventory, InventoryItem
 from baseclasses import YAMLSourced
 from effect import Effect
 
 
+class MapExits(Mapping):
+    """
+    Read-only mapping of exit names to IDs of target maps.
+
+    Names and targets are kept in two tuples. Maps usually share a few
+    combinations of exit names, so the tuples of names are interned and
+    a map keeps only the tuple of its targets.
+    """
+    __slots__ = ("names", "targets")
+
+    # Interned tuples of exit names
+    _NAME_SETS: dict[tuple[str, ...], tuple[str, ...]] = {}
+
+    def __init__(self, exits: Mapping[str, str] = {}) -> None:
+        names = tuple(sys.intern(x) for x in exits)
+        self.names = MapExits._NAME_SETS.setdefault(names, names)
+        self.targets = tuple(sys.intern(x) for x in exits.values())
+
+
+    def __getitem__(self, name: str) -> str:
+        try:
+            return self.targets[self.names.index(name)]
+        except ValueError:
+            raise KeyError(name) from None
+
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.names
+
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names)
+
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
 class OtherWorldMap(YAMLSourced):
     """
     A map - class representing a single map in a world.
+
+    `version` has to be increased by every change of the map itself,
+    so renderings of the map can be cached. Changes of the inventory
+    are tracked by the inventory.
     """
+    __slots__ = ("id", "title", "description", "exits", "inventory", "effects",
+        "version", "__weakref__")
 
     def __init__(self, id: str, title: str, description: str) -> None:
         self.id = id
         self.title = title
         self.description = description
-        self.exits = {}
-        self.inventory = OtherWorldInventory("map_items")
-        self.effects: list[Effect] = []
+        self.exits = MapExits()
+        self.inventory = OtherWorldInventory("map_items", max_items=None)
+        self.effects: tuple[Effect, ...] = ()
+        self.version = 0
@@ -0,0 +1,275 @@
+import pickle
+import re
+import shutil
+import sys
+import tempfile
+import weakref
+
+from collections import OrderedDict
+from itertools import count
+from pathlib import Path
+from typing import Callable, Generator, Iterator, Optional
+
+from map import MapExits, OtherWorldMap
+from constants import FILE_ENCODING
+
+
+# Map ID as written in map files, e.g. `id: "town_0001"`
+RE_MAP_ID = re.compile(r"""^id:\s*["']?([^"'\n#]+?)["']?\s*$""", re.MULTILINE)
+
+# Block of exits as written in map files, one `- name: "target"` per line
+RE_EXITS_KEY = re.compile(r"^exits:", re.MULTILINE)
+RE_EXITS = re.compile(r"^exits:[ \t]*\n((?:[ \t]+-[^\n]*(?:\n|$))*)", re.MULTILINE)
+RE_EXIT = re.compile(r"""^[ \t]+-[ \t]*["']?([^"':\s]+)["']?:[ \t]*["']?([^"'\n#]+?)["']?[ \t]*$""")
+
+
+def read_exits(text: str) -> Optional[MapExits]:
+    """
+    Read exits of a map from the text of its file without parsing it.
+
+    Args:
+        text (str): Content of the map file
+
+    Returns:
+        Optional[MapExits]: The exits, None if they aren't written in
+            the usual block form
+    """
+    m = RE_EXITS.search(text)
+    if m is None:
+        return None if RE_EXITS_KEY.search(text) else MapExits()
+    if text[m.end():].lstrip("\n")[:1] in (" ", "\t"):
+        return None     # The block goes on after an empty line
+    exits = {}
+    for line in m.group(1).splitlines():
+        e = RE_EXIT.match(line)
+        if e is None:
+            return None
+        exits[e.group(1)] = e.group(2)
+    return MapExits(exits)
+
+
+class MapStore:
+    """
+    A collection of maps which are loaded on demand.
+
+    The store keeps a lightweight index of map IDs and their source files.
+    A map is loaded the first time it is accessed. If `max_resident` is set,
+    the least recently used maps are evicted once there are more maps
+    in the memory. Evicted maps whose inventory has changed are written
+    to a spill file and restored from it when they are accessed again.
+
+    Maps added directly (see `add()`) have no source file and are never evicted.
+
+    Exits of all the maps are kept aside, so the exit graph of the world
+    is compiled without loading the maps (see `iter_exits()`).
+    """
+    def __init__(self, loader: Callable[[Path], OtherWorldMap],
+        relink: Callable[[OtherWorldMap], None],
+        max_resident: Optional[int] = None) -> None:
+        """
+        Args:
+            loader (Callable[[Path], OtherWorldMap]): Function loading a map
+                from its source file.
+            relink (Callable[[OtherWorldMap], None]): Function relinking
+                a map restored from a spill file to the loaded items.
+            max_resident (Optional[int], optional): Maximum number of maps
+                kept in the memory. Defaults to None (unlimited).
+        """
+        self.loader = loader
+        self.relink = relink
+        self.max_resident = max_resident
+        self.index: dict[str, Path] = {}
+        self.resident: OrderedDict[str, OtherWorldMap] = OrderedDict()
+        self.spilled: dict[str, Path] = {}
+        self._pinned: set[str] = set()
+        self._loaded_state: dict[str, Optional[tuple]] = {}
+        self._spill_dir: Optional[Path] = None
+        self._spill_names = count()
+        self.exits: dict[str, MapExits] = {}    # Exits of maps, as of their last load
+        self.graph = None   # Compiled WorldGraph, reset when exits change
+
+
+    def __contains__(self, map_id: str) -> bool:
+        return map_id in self.index or map_id in self.resident
+
+
+    def __getitem__(self, map_id: str) -> OtherWorldMap:
+        map = self.resident.get(map_id)
+        if map is not None:
+            self.resident.move_to_end(map_id)
+            return map
+        if map_id not in self.index:
+            raise KeyError(map_id)
+
+        spill_file = self.spilled.pop(map_id, None)
+        if spill_file is not None:
+            with spill_file.open("rb") as fd:
+                map = pickle.load(fd)
+            spill_file.unlink()
+            self.relink(map)
+            # Differs from the source file, so it's spilled again when evicted
+            self._loaded_state[map_id] = None
+        else:
+            map = self.loader(self.index[map_id])
+            self._loaded_state[map_id] = self._inventory_state(map)
+            self.exits[map_id] = map.exits
+        self.resident[map_id] = map
+        self._evict()
+        return map
+
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.index
+        yield from (x for x in self.resident if x not in self.index)
+
+
+    def __len__(self) -> int:
+        return len(self.index) + len(self._pinned - self.index.keys())
+
+
+    def add(self, map: OtherWorldMap) -> None:
+        """
+        Add an already loaded map. Such maps stay in the memory.
+
+        Args:
+            map (OtherWorldMap): The map
+        """
+        self.index.pop(map.id, None)
+        self.spilled.pop(map.id, None)
+        self.resident[map.id] = map
+        self._pinned.add(map.id)
+        self.graph = None
+
+
+    def set_source(self, map_id: str, file: Path,
+        exits: Optional[MapExits] = None) -> None:
+        """
+        Register a source file of a map, e.g. a new or renamed file.
+        The map is loaded from it the next time it's not resident.
+
+        Args:
+            map_id (str): Map ID
+            file (Path): Path to the map file
+            exits (Optional[MapExits], optional): Exits of the map in the file.
+                Defaults to None (unknown, read when needed).
+        """
+        self.index[map_id] = file
+        if exits is None or self.exits.get(map_id) != exits:
+            self.graph = None
+        if exits is None:
+            self.exits.pop(map_id, None)
+        else:
+            self.exits[map_id] = exits
+
+
+    def remove(self, map_id: str) -> None:
+        """
+        Remove a map from the store.
+
+        Args:
+            map_id (str): Map ID
+        """
+        self.index.pop(map_id, None)
+        self.resident.pop(map_id, None)
+        self.spilled.pop(map_id, None)
+        self._pinned.discard(map_id)
+        self._loaded_state.pop(map_id, None)
+        self.exits.pop(map_id, None)
+        self.graph = None
+
+
+    def index_folder(self, path: str) -> None:
+        """
+        Register all map files in a directory without loading them.
+
+        Map IDs and exits are read from the `id:` line and the `exits:`
+        block of the files. Files written otherwise are parsed completely.
+
+        Args:
+            path (str): Path to a directory / folder.
+        """
+        for each in sorted(Path(path).glob("*.yaml")):
+            text = each.read_text(encoding=FILE_ENCODING)
+            m = RE_MAP_ID.search(text)
+            exits = read_exits(text)
+            if m is None or exits is None:
+                map = self.loader(each)
+                map_id, exits = map.id, map.exits
+            else:
+                map_id = sys.intern(m.group(1))
+            self.index[map_id] = each
+            self.exits[map_id] = exits
+        self.graph = None
+
+
+    def iter_exits(self) -> Generator[tuple[str, MapExits], None, None]:
+        """
+        Iterate over exits of all the maps. Maps are loaded only if their
+        exits are unknown.
+
+        Yields:
+            Generator[tuple[str, MapExits], None, None]: Pairs of map ID
+                and its exits
+        """
+        for map_id in list(self):
+            map = self.resident.get(map_id)
+            if map is not None:
+                yield (map_id, map.exits)
+                continue
+            exits = self.exits.get(map_id)
+            if exits is None:
+                exits = self.exits[map_id] = self.loader(self.index[map_id]).exits
+            yield (map_id, exits)
+
+
+    def scan(self) -> Generator[OtherWorldMap, None, None]:
+        """
+        Iterate over all maps without making them resident.
+        Intended for one-pass processing of the whole world.
+
+        Yields:
+            Generator[OtherWorldMap, None, None]: Maps of the store
+        """
+        for map_id in list(self):
+            if map_id in self.resident or map_id in self.spilled:
+                yield self[map_id]
+            else:
+                yield self.loader(self.index[map_id])
+
+
+    def close(self) -> None:
+        """
+        Remove spill files.
+        """
+        if self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+            self.spilled = {}
+
+
+    def _evict(self) -> None:
+        if self.max_resident is None:
+            return
+        # Pinned maps never leave, skip over them.
+        candidates = (x for x in self.resident if x not in self._pinned)
+        excess = len(self.resident) - max(self.max_resident, 1)
+        for map_id in [x for _, x in zip(range(excess), candidates)]:
+            map = self.resident.pop(map_id)
+            self.exits[map_id] = map.exits
+            if self._inventory_state(map) != self._loaded_state.pop(map_id):
+                self._spill(map)
+
+
+    def _spill(self, map: OtherWorldMap) -> None:
+        if self._spill_dir is None:
+            self._spill_dir = Path(tempfile.mkdtemp(prefix="otherworld-"))
+            weakref.finalize(self, shutil.rmtree, self._spill_dir, True)
+        spill_file = self._spill_dir / f"{next(self._spill_names)}.pickle"
+        with spill_file.open("wb") as fd:
+            pickle.dump(map, fd, protocol=pickle.HIGHEST_PROTOCOL)
+        self.spilled[map.id] = spill_file
+
+
+    @staticmethod
+    def _inventory_state(map: OtherWorldMap) -> tuple:
+        return tuple((x.item.id, x.count) for x in map.inventory)
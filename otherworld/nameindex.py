@@ -0,0 +1,143 @@
+from bisect import bisect_left, insort
+from typing import Iterable, Optional
+
+
+class NameIndex:
+    """
+    Case-folded index of names (e.g. item names) to IDs.
+
+    Every name is indexed under the whole name and under each of its
+    trailing word sequences, so "green mushroom" can be found by "green",
+    "gr", "mushroom", "mush", etc.
+    Lookups take logarithmic time plus the size of the result.
+    """
+    def __init__(self, entries: Iterable[tuple[str, str]] = ()) -> None:
+        """
+        Args:
+            entries (Iterable[tuple[str, str]], optional): Pairs of name and ID
+                to build the index from. Defaults to ().
+        """
+        self._ids: dict[str, list[str]] = {}    # Full name -> IDs
+        self._keys: list[tuple[str, str]] = []  # Sorted (key, ID) pairs
+        for name, id in entries:
+            self._ids.setdefault(name.casefold(), []).append(id)
+            self._keys.extend((key, id) for key in self._split(name))
+        self._keys.sort()
+
+
+    def __len__(self) -> int:
+        return sum(len(x) for x in self._ids.values())
+
+
+    def add(self, name: str, id: str) -> None:
+        """
+        Add a name to the index.
+
+        Args:
+            name (str): The name
+            id (str): ID the name belongs to
+        """
+        self._ids.setdefault(name.casefold(), []).append(id)
+        for key in self._split(name):
+            insort(self._keys, (key, id))
+
+
+    def remove(self, name: str, id: str) -> None:
+        """
+        Remove a name from the index. Unknown names are ignored.
+
+        Args:
+            name (str): The name
+            id (str): ID the name belongs to
+        """
+        ids = self._ids.get(name.casefold(), [])
+        if id not in ids:
+            return
+        ids.remove(id)
+        if not ids:
+            del self._ids[name.casefold()]
+        for key in self._split(name):
+            idx = bisect_left(self._keys, (key, id))
+            if idx < len(self._keys) and self._keys[idx] == (key, id):
+                del self._keys[idx]
+
+
+    def find(self, name: str) -> Optional[str]:
+        """
+        Find an ID by an exact (case-insensitive) name.
+
+        Args:
+            name (str): The name
+
+        Returns:
+            Optional[str]: ID of the first name added, None if not found.
+        """
+        ids = self._ids.get(name.casefold())
+        return ids[0] if ids else None
+
+
+    def find_prefix(self, prefix: str, limit: Optional[int] = None) -> list[str]:
+        """
+        Find IDs of names containing a word sequence starting with `prefix`.
+
+        Args:
+            prefix (str): Beginning of a name or of a word in a name
+            limit (Optional[int], optional): Stop after finding this number
+                of distinct IDs. Defaults to None (no limit).
+
+        Returns:
+            list[str]: Distinct IDs in the order of the matching keys
+        """
+        prefix = " ".join(prefix.casefold().split())
+        result: list[str] = []
+        if not prefix:
+            return result
+        idx = bisect_left(self._keys, (prefix, ""))
+        while idx < len(self._keys) and self._keys[idx][0].startswith(prefix):
+            id = self._keys[idx][1]
+            if id not in result:
+                result.append(id)
+                if limit is not None and len(result) >= limit:
+                    break
+            idx += 1
+        return result
+
+
+    def lookup(self, text: str) -> Optional[str]:
+        """
+        Find an ID by an exact name or its unique abbreviation.
+
+        Args:
+            text (str): A name or an abbreviation
+
+        Returns:
+            Optional[str]: The ID, or None if not found or ambiguous.
+        """
+        id = self.find(text)
+        if id is None:
+            ids = self.find_prefix(text, limit=2)
+            if len(ids) == 1:
+                id = ids[0]
+        return id
+
+
+    @classmethod
+    def matches_prefix(cls, name: str, prefix: str) -> bool:
+        """
+        Check if `find_prefix()` would find a name, without indexing it.
+
+        Args:
+            name (str): The name
+            prefix (str): Beginning of the name or of a word in the name
+
+        Returns:
+            bool: If the name matches
+        """
+        prefix = " ".join(prefix.casefold().split())
+        return bool(prefix) and any(x.startswith(prefix) for x in cls._split(name))
+
+
+    @staticmethod
+    def _split(name: str) -> list[str]:
+        words = name.casefold().split()
+        return [" ".join(words[idx:]) for idx in range(len(words))]
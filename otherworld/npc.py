@@ -0,0 +1,26 @@
+from baseclasses import YAMLSourced
+from charproperties import CharacterStats
+
+
+class OtherWorldNpc(YAMLSourced):
+    """
+    A kind of NPC - monsters, animals, townsfolk.
+
+    The kind is a template. NPCs are spawned from it on the maps listed
+    in `spawns` and their state (stats, position) is kept by `NpcEngine`.
+    """
+    __slots__ = ("id", "name", "title", "description", "stats", "aggressive",
+        "wander", "flee", "respawn", "spawns")
+
+    def __init__(self, id: str, name: str, title: str, description: str,
+        stats: CharacterStats) -> None:
+        self.id = id
+        self.name = name
+        self.title = title
+        self.description = description
+        self.stats = stats
+        self.aggressive = False     # Attacks players without being attacked
+        self.wander = 0.0           # Chance of moving to another map per turn
+        self.flee = 0.0             # Runs away below this fraction of its HP
+        self.respawn = 0            # Turns to reappear after death, 0 = never
+        self.spawns: tuple[tuple[str, int], ...] = ()   # Map ID, number of NPCs
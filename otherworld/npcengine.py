@@ -0,0 +1,449 @@
+import copy
+
+from typing import Callable, Optional
+
+import numpy as np
+
+from effectengine import STATS as STAT_COLUMNS
+from npc import OtherWorldNpc
+from worldgraph import WorldGraph
+
+
+HP, STR, CON = (STAT_COLUMNS.index(x) for x in ("hp", "str", "con"))
+
+
+class NpcEngine:
+    """
+    Keeps the NPCs of a world and advances all of them at once.
+
+    NPCs are kept as a struct of arrays - kind, position, home map, stats,
+    hostility, the turn of respawning, and the attributes of their kind
+    checked every turn. Positions are indices of maps in a `WorldGraph`,
+    whose CSR arrays provide the exits. A turn (`tick()`) respawns dead NPCs
+    and moves the fleeing and wandering ones in a few vectorized operations,
+    regardless of the number of NPCs.
+
+    Fights take place on the map of a player and are resolved in the player's
+    turn (`hit()`, `strike()`). Damage of a hit is a roll of 1 to
+    `str // 3 + 1` reduced by `con // 6` of the defender, at least 1.
+    """
+    _ARRAYS = ("kind", "pos", "home", "stats", "hostile", "respawn_at", "wander",
+        "flee_hp")
+
+    def __init__(self, graph: WorldGraph, seed: Optional[int] = None,
+        capacity: int = 64) -> None:
+        """
+        Args:
+            graph (WorldGraph): Exit graph of the world
+            seed (Optional[int], optional): Seed of the random decisions.
+                Defaults to None (unpredictable).
+            capacity (int, optional): Initial number of NPCs the arrays can
+                hold. Defaults to 64.
+        """
+        self.turn = 0
+        self.rng = np.random.default_rng(seed)
+        self.allowed: Optional[Callable[[str], bool]] = None
+        self._set_graph(graph)
+
+        self.kinds: list[OtherWorldNpc] = []
+        self._kind_idx: dict[str, int] = {}
+        self.k_stats = np.zeros((0, len(STAT_COLUMNS)), dtype=np.int64)
+        self.k_aggressive = np.zeros(0, dtype=bool)
+        self.k_respawn = np.zeros(0, dtype=np.int64)
+
+        self.count = 0
+        self.kind = np.zeros(capacity, dtype=np.int32)
+        self.pos = np.zeros(capacity, dtype=np.int64)     # -1 = dead
+        self.home = np.zeros(capacity, dtype=np.int64)
+        self.stats = np.zeros((capacity, len(STAT_COLUMNS)), dtype=np.int64)
+        self.hostile = np.zeros(capacity, dtype=bool)     # Has been attacked
+        self.respawn_at = np.zeros(capacity, dtype=np.int64)   # -1 = never
+        self.wander = np.zeros(capacity, dtype=np.float64)
+        self.flee_hp = np.zeros(capacity, dtype=np.float64)
+
+
+    def add_kind(self, kind: OtherWorldNpc) -> int:
+        """
+        Register a kind of NPCs.
+
+        Args:
+            kind (OtherWorldNpc): The kind
+
+        Returns:
+            int: Index of the kind
+        """
+        idx = self._kind_idx.get(kind.id)
+        if idx is None:
+            idx = self._kind_idx[kind.id] = len(self.kinds)
+            self.kinds.append(kind)
+            self.k_stats = np.vstack((self.k_stats,
+                [getattr(kind.stats, x) for x in STAT_COLUMNS]))
+            self.k_aggressive = np.append(self.k_aggressive, kind.aggressive)
+            self.k_respawn = np.append(self.k_respawn, kind.respawn)
+        return idx
+
+
+    def spawn(self, kind: OtherWorldNpc, map_id: str, count: int = 1) -> None:
+        """
+        Create NPCs of a kind on a map.
+
+        Args:
+            kind (OtherWorldNpc): Kind of the NPCs
+            map_id (str): ID of the map, which is their home too
+            count (int, optional): Number of the NPCs. Defaults to 1.
+
+        Raises:
+            KeyError: If the map doesn't exist
+        """
+        kind_idx = self.add_kind(kind)
+        map_idx = self.graph.index[map_id]
+        while self.count + count > len(self.kind):
+            self._grow()
+        idx = slice(self.count, self.count + count)
+        self.kind[idx] = kind_idx
+        self.pos[idx] = map_idx
+        self.home[idx] = map_idx
+        self.stats[idx] = self.k_stats[kind_idx]
+        self.hostile[idx] = False
+        self.respawn_at[idx] = -1
+        self.wander[idx] = kind.wander
+        self.flee_hp[idx] = kind.flee * kind.stats.hp
+        self.count += count
+
+
+    def tick(self) -> None:
+        """
+        Advance all the NPCs by one turn: respawn the dead ones which are due,
+        move the NPCs which flee or wander.
+        """
+        self.turn += 1
+        n = self.count
+        pos = self.pos[:n]
+        respawn_at = self.respawn_at[:n]
+
+        due = np.flatnonzero((pos < 0) & (respawn_at >= 0) & (respawn_at <= self.turn))
+        if due.size:
+            pos[due] = self.home[due]
+            self.stats[due] = self.k_stats[self.kind[due]]
+            self.hostile[due] = False
+            respawn_at[due] = -1
+
+        alive = pos >= 0
+        fleeing = alive & (self.stats[:n, HP] < self.flee_hp[:n])
+        wandering = (alive & ~fleeing & ~self.hostile[:n]
+            & (self.rng.random(n) < self.wander[:n]))
+        # Having run away, NPCs calm down
+        self.hostile[:n][fleeing] = False
+        moving = np.flatnonzero(fleeing | wandering)
+        if moving.size:
+            self._move(moving)
+
+
+    def on_map(self, map_id: str) -> np.ndarray:
+        """
+        Get the living NPCs on a map.
+
+        Args:
+            map_id (str): Map ID
+
+        Returns:
+            np.ndarray: Handles of the NPCs in the order of spawning
+        """
+        map_idx = self.graph.index.get(map_id)
+        if map_idx is None:
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(self.pos[:self.count] == map_idx)
+
+
+    def kind_of(self, handle: int) -> OtherWorldNpc:
+        return self.kinds[self.kind[handle]]
+
+
+    def is_hostile(self, handle: int) -> bool:
+        return bool(self.hostile[handle] or self.k_aggressive[self.kind[handle]])
+
+
+    def hit(self, handle: int, strength: int) -> tuple[int, bool]:
+        """
+        Hit an NPC. The NPC gets hostile.
+
+        Args:
+            handle (int): Handle of the NPC
+            strength (int): `str` of the attacker
+
+        Returns:
+            tuple[int, bool]: Damage dealt and a flag indicating the NPC
+                has been killed
+        """
+        damage = int(self._damage(np.array([strength]),
+            self.stats[handle, CON])[0])
+        self.stats[handle, HP] -= damage
+        self.hostile[handle] = True
+        killed = self.stats[handle, HP] <= 0
+        if killed:
+            respawn = self.k_respawn[self.kind[handle]]
+            self.pos[handle] = -1
+            self.respawn_at[handle] = self.turn + respawn if respawn > 0 else -1
+        return (damage, bool(killed))
+
+
+    def strike(self, map_id: str, con: int) -> list[tuple[int, int]]:
+        """
+        Let the hostile NPCs on a map attack a player there.
+
+        Args:
+            map_id (str): Map of the player
+            con (int): `con` of the player
+
+        Returns:
+            list[tuple[int, int]]: Pairs of NPC handle and damage dealt
+        """
+        handles = self.on_map(map_id)
+        if not handles.size:
+            return []
+        handles = handles[self.hostile[handles] | self.k_aggressive[self.kind[handles]]]
+        damage = self._damage(self.stats[handles, STR], con)
+        return list(zip(handles.tolist(), damage.tolist()))
+
+
+    def restrict(self, allowed: Callable[[str], bool]) -> None:
+        """
+        Keep the NPCs on some maps only, e.g. in the regions of a shard.
+        NPCs elsewhere are removed and the others don't leave the maps.
+
+        Args:
+            allowed (Callable[[str], bool]): Predicate of map IDs
+        """
+        self.allowed = allowed
+        self._set_graph(self.graph)
+        outside = ~self.walkable[self.home[:self.count]]
+        self.pos[:self.count][outside] = -1
+        self.respawn_at[:self.count][outside] = -1
+
+
+    def set_graph(self, graph: WorldGraph) -> None:
+        """
+        Switch to a newly compiled graph of the world (e.g. after a reload).
+        NPCs on removed maps die and don't respawn.
+
+        Args:
+            graph (WorldGraph): The graph
+        """
+        old_ids = self.graph.ids
+        self._set_graph(graph)
+        lookup = np.array([graph.index.get(x, -1) for x in old_ids] + [-1],
+            dtype=np.int64)
+        n = self.count
+        self.pos[:n] = lookup[self.pos[:n]]     # -1 stays -1
+        self.home[:n] = lookup[self.home[:n]]
+        self.respawn_at[:n][self.home[:n] < 0] = -1
+
+
+    def copy_empty(self, capacity: int = 4) -> "NpcEngine":
+        """
+        Create an engine without NPCs sharing the kinds and the graph
+        with this one. The random generator is copied.
+
+        Args:
+            capacity (int, optional): Initial number of NPCs the arrays can
+                hold. Defaults to 4.
+
+        Returns:
+            NpcEngine: The engine
+        """
+        engine = copy.copy(self)
+        engine.count = 0
+        for name in self._ARRAYS:
+            arr = getattr(self, name)
+            setattr(engine, name, np.zeros((capacity,) + arr.shape[1:], dtype=arr.dtype))
+        engine.rng = copy.deepcopy(self.rng)
+        return engine
+
+
+    def adopt(self, other: "NpcEngine", handle: int) -> int:
+        """
+        Copy an NPC of another engine with the same kinds and graph,
+        see `copy_empty()`.
+
+        Args:
+            other (NpcEngine): The other engine
+            handle (int): Handle of the NPC there
+
+        Returns:
+            int: Handle of the copy
+        """
+        if self.count == len(self.kind):
+            self._grow()
+        for name in self._ARRAYS:
+            getattr(self, name)[self.count] = getattr(other, name)[handle]
+        self.count += 1
+        return self.count - 1
+
+
+    def dump_state(self) -> dict:
+        """
+        Extract the state of the NPCs to be saved with a game, including
+        the state of the random generator. Positions are kept as map IDs,
+        so the state survives changes of the world.
+
+        Returns:
+            dict: The state made of plain Python values
+        """
+        n = self.count
+        ids = self.graph.ids
+        return {
+            "turn": self.turn,
+            "rng": self.rng.bit_generator.state,
+            "kinds": [self.kinds[x].id for x in self.kind[:n].tolist()],
+            "pos": [ids[x] if x >= 0 else None for x in self.pos[:n].tolist()],
+            "stats": self.stats[:n].tolist(),
+            "hostile": self.hostile[:n].tolist(),
+            "respawn_at": self.respawn_at[:n].tolist(),
+        }
+
+
+    def load_state(self, state: dict) -> bool:
+        """
+        Restore a state extracted by `dump_state()`. NPCs on maps which
+        don't exist anymore are dead.
+
+        Args:
+            state (dict): The state
+
+        Returns:
+            bool: If the state has been restored. It isn't if the NPCs
+                spawned in the world differ from the saved ones.
+        """
+        n = self.count
+        if state["kinds"] != [self.kinds[x].id for x in self.kind[:n].tolist()]:
+            return False
+        index = self.graph.index
+        self.turn = state["turn"]
+        self.rng.bit_generator.state = state["rng"]
+        self.pos[:n] = [index.get(x, -1) if x is not None else -1 for x in state["pos"]]
+        self.stats[:n] = state["stats"]
+        self.hostile[:n] = state["hostile"]
+        self.respawn_at[:n] = state["respawn_at"]
+        return True
+
+
+    def _set_graph(self, graph: WorldGraph) -> None:
+        self.graph = graph
+        self.offsets = np.asarray(graph.offsets, dtype=np.int64)
+        self.targets = np.asarray(graph.targets, dtype=np.int64)
+        if self.allowed is None:
+            self.walkable = np.ones(len(graph.ids), dtype=bool)
+        else:
+            self.walkable = np.array([self.allowed(x) for x in graph.ids], dtype=bool)
+
+
+    def _move(self, handles: np.ndarray) -> None:
+        # Every NPC takes a random exit of its map, if there's any
+        pos = self.pos[handles]
+        first = self.offsets[pos]
+        degree = self.offsets[pos + 1] - first
+        has_exit = degree > 0
+        handles, first, degree = handles[has_exit], first[has_exit], degree[has_exit]
+        target = self.targets[first + (self.rng.random(handles.size) * degree).astype(np.int64)]
+        ok = self.walkable[target]
+        self.pos[handles[ok]] = target[ok]
+
+
+    def _damage(self, strength: np.ndarray, con) -> np.ndarray:
+        roll = self.rng.integers(1, np.asarray(strength) // 3 + 2)
+        return np.maximum(roll - np.asarray(con) // 6, 1)
+
+
+    def _grow(self) -> None:
+        size = 2 * len(self.kind)
+        for name in self._ARRAYS:
+            arr = getattr(self, name)
+            setattr(self, name, np.resize(arr, (size,) + arr.shape[1:]))
+
+
+class NpcOverlay:
+    """
+    NPCs of a single game over the NPCs shared with other games.
+
+    The shared NPCs keep wandering for all the games. An NPC is copied into
+    the overlay the first time the player hits it and the game works with
+    the copy since then, so only this game sees the NPC hurt, hostile or dead.
+    The overlay thus holds only the NPCs the player has actually fought.
+    Handles are those of the shared engine.
+    """
+    def __init__(self, shared: NpcEngine) -> None:
+        self.shared = shared
+        self.touched = shared.copy_empty()      # Copies of the fought NPCs
+        self.handles: list[int] = []            # Copy -> shared handle
+        self.copies: dict[int, int] = {}        # Shared handle -> copy
+
+
+    @property
+    def turn(self) -> int:
+        return self.touched.turn
+
+
+    @property
+    def graph(self) -> WorldGraph:
+        return self.touched.graph
+
+
+    @property
+    def rng(self) -> np.random.Generator:
+        return self.touched.rng
+
+
+    def tick(self) -> None:
+        """
+        Advance the NPCs by one turn. The shared NPCs are advanced only
+        if no other game has done so for this turn yet.
+        """
+        if self.shared.turn <= self.touched.turn:
+            self.shared.tick()
+        self.touched.tick()
+
+
+    def on_map(self, map_id: str) -> np.ndarray:
+        handles = self.shared.on_map(map_id)
+        if not self.handles:
+            return handles
+        handles = handles[~np.isin(handles, self.handles)]
+        copies = np.asarray(self.handles, dtype=np.int64)[self.touched.on_map(map_id)]
+        return np.sort(np.concatenate((handles, copies)))
+
+
+    def kind_of(self, handle: int) -> OtherWorldNpc:
+        return self.shared.kind_of(handle)
+
+
+    def is_hostile(self, handle: int) -> bool:
+        engine, handle = self._owner(handle)
+        return engine.is_hostile(handle)
+
+
+    def hit(self, handle: int, strength: int) -> tuple[int, bool]:
+        idx = self.copies.get(handle)
+        if idx is None:
+            idx = self.copies[handle] = self.touched.adopt(self.shared, handle)
+            self.handles.append(handle)
+        return self.touched.hit(idx, strength)
+
+
+    def strike(self, map_id: str, con: int) -> list[tuple[int, int]]:
+        handles = [x for x in self.on_map(map_id).tolist() if self.is_hostile(x)]
+        if not handles:
+            return []
+        strength = [engine.stats[x, STR] for engine, x in map(self._owner, handles)]
+        damage = self.touched._damage(np.array(strength), con)
+        return list(zip(handles, damage.tolist()))
+
+
+    def set_graph(self, graph: WorldGraph) -> None:
+        if self.shared.graph is not graph:
+            self.shared.set_graph(graph)
+        self.touched.set_graph(graph)
+
+
+    def _owner(self, handle: int) -> tuple[NpcEngine, int]:
+        idx = self.copies.get(handle)
+        return (self.shared, handle) if idx is None else (self.touched, idx)
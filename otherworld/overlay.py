@@ -0,0 +1,50 @@
+from inventory import OtherWorldInventory
+from mapstore import MapStore
+
+
+class WorldOverlay:
+    """
+    Changes a single game made to a world shared with other games.
+
+    The maps of the shared world serve as read-only templates. A map
+    inventory is copied into the overlay the first time the game changes it
+    and the game works with the copy since then. The overlay thus holds only
+    the maps the player has actually touched.
+    """
+    def __init__(self, maps: MapStore) -> None:
+        self.maps = maps
+        self.inventories: dict[str, OtherWorldInventory] = {}
+
+
+    def inventory(self, map_id: str) -> OtherWorldInventory:
+        """
+        Get a map inventory for reading.
+
+        Args:
+            map_id (str): Map ID
+
+        Returns:
+            OtherWorldInventory: The changed copy, or the template inventory
+                if the map has not been changed. Don't modify the latter.
+        """
+        inventory = self.inventories.get(map_id)
+        if inventory is None:
+            inventory = self.maps[map_id].inventory
+        return inventory
+
+
+    def writable_inventory(self, map_id: str) -> OtherWorldInventory:
+        """
+        Get a map inventory for modification, copying the template if needed.
+
+        Args:
+            map_id (str): Map ID
+
+        Returns:
+            OtherWorldInventory: Inventory owned by the overlay
+        """
+        inventory = self.inventories.get(map_id)
+        if inventory is None:
+            inventory = self.maps[map_id].inventory.copy()
+            self.inventories[map_id] = inventory
+        return inventory
@@ -0,0 +1,229 @@
+import os
+import pickle
+
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Optional, TextIO
+
+from effect import Effect
+from game import OtherWorldGame
+from constants import FILE_ENCODING
+
+
+# Bump whenever the snapshot layout changes
+SNAPSHOT_VERSION = 2
+
+SNAPSHOT_FILE = "snapshot.bin"
+JOURNAL_FILE = "journal.log"
+
+
+def dump_game(game: OtherWorldGame) -> dict[str, Any]:
+    """
+    Extract the state of a game which isn't part of the loaded world.
+
+    Only map inventories changed by the game are included. Scheduled events
+    other than effect expiry are not. NPCs are included with the state
+    of their random generator, so replaying commands gives the same results.
+
+    Args:
+        game (OtherWorldGame): The game
+
+    Returns:
+        dict[str, Any]: The state made of plain Python values
+    """
+    if game.overlay is not None:
+        inventories = game.overlay.inventories
+    else:
+        inventories = {x: game.maps[x].inventory for x in game.dirty_maps}
+    return {
+        "turn": game.scheduler.turn,
+        "map": game.current_map_id,
+        "player": dump_player(game),
+        "maps": {k: v.dump_slots() for k, v in inventories.items()},
+        "npcs": game.npcs.dump_state() if game.npcs is not None else None,
+    }
+
+
+def dump_player(game: OtherWorldGame) -> dict[str, Any]:
+    """
+    Extract the state of the player of a game.
+
+    Args:
+        game (OtherWorldGame): The game
+
+    Returns:
+        dict[str, Any]: The state made of plain Python values
+    """
+    player = game.player
+    return {
+        "name": player.name,
+        "stats": asdict(player.stats),
+        "inventory": player.inventory.dump_slots(),
+        "effects": [(x.name, x.stat_affected, x.stat_effect, x.duration, remaining)
+            for x, remaining in player.effect_state()],
+    }
+
+
+def load_game(game: OtherWorldGame, state: dict[str, Any]) -> None:
+    """
+    Restore a state extracted by `dump_game()` into a game with a loaded world.
+
+    Args:
+        game (OtherWorldGame): The game
+        state (dict[str, Any]): The state
+    """
+    game.scheduler.turn = state["turn"]
+    game.current_map_id = state["map"]
+    load_player(game, state["player"])
+    for map_id, slots in state["maps"].items():
+        game.map_inventory(map_id, writable=True).load_slots(slots, game.items)
+    if game.npcs is not None and state["npcs"] is not None:
+        game.npcs.load_state(state["npcs"])
+
+
+def load_player(game: OtherWorldGame, state: dict[str, Any]) -> None:
+    """
+    Restore a state extracted by `dump_player()` into the player of a game.
+
+    Args:
+        game (OtherWorldGame): The game
+        state (dict[str, Any]): The state
+    """
+    player = game.player
+    player.name = state["name"]
+    for k, v in state["stats"].items():
+        setattr(player.stats, k, v)
+    player.push_stats()
+    player.inventory.load_slots(state["inventory"], game.items)
+    for name, stat, effect, duration, remaining in state["effects"]:
+        player.add_effect(Effect(name, stat, effect, duration), remaining)
+    game.track_player()
+
+
+class GameJournal:
+    """
+    Saves a game as a snapshot plus a journal of commands entered since.
+
+    Every turn appends a single line to the journal. Once the journal has
+    `snapshot_every` lines, a new compact binary snapshot is written
+    and the journal starts over. Restoring loads the snapshot and replays
+    the journal tail.
+
+    Journal lines carry a sequence number, so lines already contained
+    in the snapshot (e.g. after a crash while starting over) are skipped.
+    A new game is snapshotted right away, its rolled stats and random
+    state are needed to replay the journal.
+    """
+    def __init__(self, path: str, snapshot_every: int = 1000) -> None:
+        self.path = Path(path)
+        self.snapshot_every = snapshot_every
+        self.seq = 0                # Number of commands played in the game
+        self.journal_lines = 0      # Number of commands in the journal
+        self._fd: Optional[TextIO] = None
+
+
+    def load(self, game: OtherWorldGame) -> list[str]:
+        """
+        Load the snapshot into a game and read the journal tail.
+
+        Args:
+            game (OtherWorldGame): The game with a loaded world
+
+        Returns:
+            list[str]: Commands to replay (handle and apply effects) to get
+                to the saved state.
+        """
+        snapshot_seq = 0
+        restored = False
+        try:
+            with (self.path / SNAPSHOT_FILE).open("rb") as fd:
+                version, snapshot_seq, state = pickle.load(fd)
+            if version == SNAPSHOT_VERSION:
+                load_game(game, state)
+                restored = True
+            else:
+                snapshot_seq = 0
+        except FileNotFoundError:
+            pass
+
+        cmds = []
+        try:
+            with (self.path / JOURNAL_FILE).open(encoding=FILE_ENCODING) as fd:
+                for line in fd:
+                    seq, _, cmd = line.rstrip("\n").partition(" ")
+                    if not line.endswith("\n"):
+                        break   # Incomplete last write
+                    if int(seq) > snapshot_seq:
+                        cmds.append(cmd)
+        except FileNotFoundError:
+            pass
+        self.seq = snapshot_seq + len(cmds)
+        self.journal_lines = len(cmds)
+        if not restored and not cmds:
+            self.snapshot(game)
+        return cmds
+
+
+    def record(self, cmd: str, game: OtherWorldGame) -> None:
+        """
+        Append a played command to the journal.
+
+        Args:
+            cmd (str): The command
+            game (OtherWorldGame): The game, state after the command
+        """
+        if self._fd is None:
+            self.path.mkdir(parents=True, exist_ok=True)
+            self._fd = (self.path / JOURNAL_FILE).open("a", encoding=FILE_ENCODING)
+        self.seq += 1
+        self.journal_lines += 1
+        self._fd.write(f"{self.seq} {cmd}\n")
+        self._fd.flush()
+        if self.journal_lines >= self.snapshot_every:
+            self.snapshot(game)
+
+
+    def snapshot(self, game: OtherWorldGame) -> None:
+        """
+        Write a snapshot of the game and start a new journal.
+
+        Args:
+            game (OtherWorldGame): The game
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path / f"{SNAPSHOT_FILE}.tmp"
+        with tmp_path.open("wb") as fd:
+            pickle.dump((SNAPSHOT_VERSION, self.seq, dump_game(game)), fd,
+                protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path / SNAPSHOT_FILE)
+
+        if self._fd is not None:
+            self._fd.close()
+        self._fd = (self.path / JOURNAL_FILE).open("w", encoding=FILE_ENCODING)
+        self.journal_lines = 0
+
+
+    def clear(self) -> None:
+        """
+        Delete the saved game.
+        """
+        if self._fd is not None:
+            self._fd.close()
+            self._fd = None
+        for each in (SNAPSHOT_FILE, JOURNAL_FILE):
+            (self.path / each).unlink(missing_ok=True)
+        self.seq = 0
+        self.journal_lines = 0
+
+
+    def close(self, game: OtherWorldGame) -> None:
+        """
+        Write the final snapshot, unless the game has been cleared.
+
+        Args:
+            game (OtherWorldGame): The game
+        """
+        if self._fd is not None:
+            self.snapshot(game)
+            self._fd.close()
+            self._fd = None
@@ -1,6 +1,12 @@
+from itertools import count
+from time import perf_counter_ns
+from typing import Optional
+
 from charproperties import CharacterStats
 from inventory import OtherWorldInventory
 from effect import Effect
+from instrumentation import STATS
+from scheduler import Event, Scheduler
 
 
 class Player:
@@ -10,33 +16,163 @@ class Player:
     and an inventory of items.
     """
 
-    def __init__(self, name: str):
+    def __init__(self, name: str, scheduler: Optional[Scheduler] = None,
+        stats: Optional[CharacterStats] = None):
+        """
+        Args:
+            name (str): Name of the player
+            scheduler (Optional[Scheduler], optional): Scheduler of the game
+                the player is in. It's advanced by `apply_effects()`, once
+                per player's turn. Defaults to a new scheduler.
+            stats (Optional[CharacterStats], optional): Initial stats.
+                Defaults to None (rolled).
+        """
         self.name = name
         self.title = ""
-        self.stats = CharacterStats()
+        self.stats = stats if stats is not None else CharacterStats()
         self.inventory = OtherWorldInventory("player's inventory")
-        self.effects: list[Effect] = [
-            #Effect(name="poison", stat="hp", effect=-3, duration=5)
-        ]   # Intended for spells, poisons, etc.
+        self.scheduler = scheduler if scheduler is not None else Scheduler()
+        self.effects: dict[int, Effect] = {
+            #0: Effect(name="poison", stat="hp", effect=-3, duration=5)
+        }   # Intended for spells, poisons, etc.
+        self._expiry: dict[int, Event] = {}  # Effect key -> its expiry event
+        self._effect_keys = count()
         self.current_inventory = self.inventory # Used by `examine` command
+        self.engine = None  # Optional EffectEngine applying the effects
+        self.engine_handle: Optional[int] = None
+        self._engine_turn = 0   # Tick of the engine seen by the player
+
+
+    def attach_engine(self, engine) -> None:
+        """
+        Let an `EffectEngine` keep and apply the player's effects.
+        Active effects are moved to the engine.
+        The engine is advanced by the game, see `OtherWorldGame.end_turn()`.
+        Changes of the stats made outside the effects have to be passed on,
+        see `change_stat()` and `push_stats()`.
+
+        Args:
+            engine (EffectEngine): The engine
+        """
+        self.engine = engine
+        self.engine_handle = engine.register(self.stats)
+        self._engine_turn = engine.turn
+        for key, each in self.effects.items():
+            event = self._expiry.pop(key)
+            self.scheduler.cancel(event)
+            engine.add_effect(self.engine_handle, each,
+                event.due - self.scheduler.turn)
+        self.effects = {}
+
+
+    def detach_engine(self) -> None:
+        """
+        Take the player's effects and stats back from the engine,
+        e.g. when the player leaves the world.
+        """
+        if self.engine is None:
+            return
+        engine, handle = self.engine, self.engine_handle
+        engine.read_stats(handle, self.stats)
+        effects = engine.effects_of(handle)
+        engine.unregister(handle)
+        self.engine = None
+        self.engine_handle = None
+        for effect, remaining in effects:
+            self.add_effect(effect, remaining)
+
+
+    def change_stat(self, stat: str, change: int) -> None:
+        """
+        Change a stat outside of the effects, e.g. by damage.
+
+        Args:
+            stat (str): Name of the stat
+            change (int): Change of the value
+        """
+        setattr(self.stats, stat, getattr(self.stats, stat) + change)
+        if self.engine is not None:
+            self.engine.change_stat(self.engine_handle, stat, change)
+
+
+    def push_stats(self) -> None:
+        """
+        Pass the stats set directly (e.g. by restoring a saved game)
+        to the engine.
+        """
+        if self.engine is not None:
+            self.engine.write_stats(self.engine_handle, self.stats)
+
+
+    def add_effect(self, effect: Effect, duration: Optional[int] = None) -> None:
+        """
+        Start an effect on the player.
+
+        Args:
+            effect (Effect): The effect
+            duration (Optional[int], optional): Remaining duration.
+                Defaults to the duration of the effect.
+        """
+        if duration is None:
+            duration = effect.duration
+        if self.engine is not None:
+            self.engine.add_effect(self.engine_handle, effect, duration)
+        else:
+            # An effect is applied `duration` times, at least once.
+            key = next(self._effect_keys)
+            self.effects[key] = effect
+            self._expiry[key] = self.scheduler.schedule(duration,
+                self._remove_effect, key)
+
+
+    def effect_state(self) -> list[tuple[Effect, int]]:
+        """
+        Get the active effects and their remaining duration.
+
+        Returns:
+            list[tuple[Effect, int]]: Pairs of effect and the number
+                of turns it will be applied in
+        """
+        if self.engine is not None:
+            return self.engine.effects_of(self.engine_handle)
+        turn = self.scheduler.turn
+        return [(x, self._expiry[key].due - turn) for key, x in self.effects.items()]
+
+
+    def _remove_effect(self, key: int) -> None:
+        del self.effects[key]
+        del self._expiry[key]
 
 
     def apply_effects(self) -> tuple[str, bool]:
         """
-        Apply all the active effects on the player.
+        Apply all the active effects on the player and advance
+        the scheduler to the next turn. Exhausted effects expire there.
+        Effects of a player attached to an `EffectEngine` have been applied
+        by the engine, only the results are read.
 
         Returns:
             str: A tuple of message displayed to the user and a boolean flag
                 indicating if the game should finish (True).
         """
+        if STATS.enabled:
+            started = perf_counter_ns()
+            result = self._apply_effects()
+            STATS.record("effects.tick", perf_counter_ns() - started)
+            return result
+        return self._apply_effects()
+
+
+    def _apply_effects(self) -> tuple[str, bool]:
+        if self.engine is not None:
+            return self._apply_engine_effects()
+
         msgs = []
-        for each in self.effects:
+        for each in self.effects.values():
             self.stats = each.modify_stats(self.stats)
             msgs.append(f"You're under effect of {each.name}. Your {each.stat_affected} has changed by {each.stat_effect}.")
-            each.duration += -1
 
-        # Remove effects with exhausted duration
-        self.effects = [x for x in self.effects if x.duration > 0]
+        msgs.extend(self.scheduler.advance())
 
         finished = self.stats.hp <= 0
         if finished:
@@ -45,4 +181,19 @@ class Player:
         return (msg, finished)
 
 
-    
\ No newline at end of file
+    def _apply_engine_effects(self) -> tuple[str, bool]:
+        # The engine has applied the effects already, possibly in the turn
+        # of another player. Messages of a tick are shown once.
+        engine = self.engine
+        engine.read_stats(self.engine_handle, self.stats)
+        msgs = []
+        if engine.turn != self._engine_turn:
+            self._engine_turn = engine.turn
+            msgs = engine.messages(self.engine_handle)
+        msgs.extend(self.scheduler.advance())
+
+        finished = self.stats.hp <= 0
+        if finished:
+            msgs.append("You've died. Be more careful next time.")
+        msg = "\n".join(msgs)
+        return (msg, finished)
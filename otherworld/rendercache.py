@@ -0,0 +1,56 @@
+import weakref
+
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+
+class RenderCache:
+    """
+    Bounded LRU cache of rendered strings.
+
+    Keys are expected to contain version counters of the rendered objects,
+    so a changed object simply stops hitting its old entries. The rendered
+    objects are weakly referenced by the entries and checked for identity,
+    so a reused `id()` of a new object never hits an old entry, and the cache
+    doesn't keep alive maps evicted from a `MapStore`.
+    """
+    def __init__(self, maxsize: int = 1024) -> None:
+        self.maxsize = maxsize
+        self.entries: OrderedDict[Hashable, tuple[tuple[weakref.ref, ...], str]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+
+    def get(self, key: Hashable, objs: tuple, render: Callable[[], str]) -> str:
+        """
+        Get a rendered string, rendering it if not cached.
+
+        Args:
+            key (Hashable): Key made of `id()` and version of the rendered
+                objects and of render options
+            objs (tuple): The rendered objects, they have to support weak
+                references
+            render (Callable[[], str]): Function rendering the string
+
+        Returns:
+            str: Rendered string
+        """
+        entry = self.entries.get(key)
+        if entry is not None and all(a() is b for a, b in zip(entry[0], objs)):
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        result = render()
+        self.entries[key] = (tuple(weakref.ref(x) for x in objs), result)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return result
+
+
+    def clear(self) -> None:
+        """
+        Drop all the entries, e.g. when items or maps change in place.
+        """
+        self.entries.clear()
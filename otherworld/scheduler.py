@@ -0,0 +1,88 @@
+from heapq import heappop, heappush
+from itertools import count
+from typing import Any, Callable
+
+
+class Event:
+    """
+    An event scheduled for a future turn.
+    """
+    __slots__ = ("due", "callback", "args", "cancelled")
+
+    def __init__(self, due: int, callback: Callable, args: tuple) -> None:
+        self.due = due
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+
+class Scheduler:
+    """
+    Runs events (effect expiry, respawns, delayed map effects, ...) at
+    the turn they are due.
+
+    Events due within `wheel_size` turns are kept in a timing wheel -
+    a ring of per-turn buckets. Events due later wait in a heap and move
+    to the wheel when they get close. Advancing a turn only visits
+    the bucket of that turn, so it costs time proportional to the number of
+    due events, not to the number of scheduled ones.
+    """
+    def __init__(self, wheel_size: int = 256) -> None:
+        self.turn = 0
+        self._wheel: list[list[Event]] = [[] for _ in range(wheel_size)]
+        self._later: list[tuple[int, int, Event]] = []
+        self._seq = count()     # Keeps heap entries comparable
+
+
+    def schedule(self, delay: int, callback: Callable, *args: Any) -> Event:
+        """
+        Schedule a callback.
+
+        Args:
+            delay (int): Number of turns from now, at least 1
+            callback (Callable): Function to call. If it returns a string,
+                the string is reported by `advance()`.
+            *args (Any): Arguments of the callback
+
+        Returns:
+            Event: The event, can be used to cancel it
+        """
+        event = Event(self.turn + max(delay, 1), callback, args)
+        self._add(event)
+        return event
+
+
+    def cancel(self, event: Event) -> None:
+        # Cancelled events stay in their bucket and are skipped when due.
+        event.cancelled = True
+
+
+    def advance(self) -> list[str]:
+        """
+        Move to the next turn and run events due in it.
+
+        Returns:
+            list[str]: Messages returned by the callbacks
+        """
+        self.turn += 1
+        horizon = self.turn + len(self._wheel)
+        while self._later and self._later[0][0] < horizon:
+            self._add(heappop(self._later)[2])
+
+        idx = self.turn % len(self._wheel)
+        bucket = self._wheel[idx]
+        self._wheel[idx] = []
+        msgs = []
+        for event in bucket:
+            if not event.cancelled:
+                msg = event.callback(*event.args)
+                if isinstance(msg, str):
+                    msgs.append(msg)
+        return msgs
+
+
+    def _add(self, event: Event) -> None:
+        if event.due - self.turn < len(self._wheel):
+            self._wheel[event.due % len(self._wheel)].append(event)
+        else:
+            heappush(self._later, (event.due, next(self._seq), event))
@@ -0,0 +1,136 @@
+import asyncio
+
+from typing import Optional
+
+from commands import CommandDispatcher, render_help
+from customtypes import CmdResult
+from game import OtherWorldGame
+
+
+ENCODING = "utf8"
+MAX_LINE_LENGTH = 1024
+
+
+class GameServer:
+    """
+    Hosts many players in a single world.
+
+    The world is loaded once (see `OtherWorldGame`). Every connection gets
+    its own session - a game with its own player and position sharing items
+    and maps with the others. Commands are handled by the same
+    `handle_cmd_*` methods as in the interactive game. They don't block,
+    so all the sessions are served by a single event loop.
+
+    Isolated sessions don't share map inventories - each of them plays
+    its own copy-on-write instance of the world.
+
+    Any line-based client (telnet, netcat) can be used to play.
+    """
+    def __init__(self, world: OtherWorldGame, isolated: bool = False) -> None:
+        self.world = world
+        self.isolated = isolated
+        self.dispatcher = CommandDispatcher()
+        self.sessions: dict[int, OtherWorldGame] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+
+    async def start_tcp(self, host: str, port: int) -> None:
+        self._server = await asyncio.start_server(self.handle_client, host, port,
+            limit=MAX_LINE_LENGTH)
+
+
+    async def start_unix(self, path: str) -> None:
+        self._server = await asyncio.start_unix_server(self.handle_client, path,
+            limit=MAX_LINE_LENGTH)
+
+
+    async def serve_forever(self) -> None:
+        async with self._server:
+            await self._server.serve_forever()
+
+
+    def handle_cmd(self, game: OtherWorldGame, cmd: str) -> CmdResult:
+        """
+        Handle a command of a single session.
+
+        Args:
+            game (OtherWorldGame): The session
+            cmd (str): String command as entered by the player
+
+        Returns:
+            CmdResult: A tuple of command response (message) and
+                a flag indicating the session should finish.
+        """
+        if cmd in "help,h,?".split(","):
+            return (render_help(), False)
+        try:
+            return self.dispatcher.dispatch(game, cmd)
+        except KeyError:
+            return ("Error: Unknown command.", False)
+
+
+    async def handle_client(self, reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter) -> None:
+        """
+        Session loop of a single connection. Mirrors `CliApp.run()`.
+        """
+        game: Optional[OtherWorldGame] = None
+        try:
+            writer.write(b"Welcome to OtherWorld!\r\nWhat's your name? ")
+            name = await self._read_line(reader)
+            if name is None:
+                return
+            game = self.world.new_session(name or "Adventurer", self.isolated)
+            self.sessions[id(game)] = game
+
+            msg = f"You are here:  {game.current_map.title}"
+            while True:
+                msg_effects, death = game.end_turn()
+                if msg_effects:
+                    msg = f"{msg}\n\n{msg_effects}" if msg else msg_effects
+                if msg:
+                    self._write(writer, f"\n{msg}\n")
+                if death:
+                    break
+
+                self._write(writer, f"\n[HP: {game.player.stats.hp}]  Your action: ")
+                await writer.drain()
+                cmd = await self._read_line(reader)
+                if cmd is None:
+                    break
+                msg, finished = self.handle_cmd(game, cmd.lower())
+                if finished:
+                    self._write(writer, f"\n{msg}\n")
+                    break
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if game is not None:
+                self.sessions.pop(id(game), None)
+                game.end_session()
+            writer.close()
+
+
+    @staticmethod
+    async def _read_line(reader: asyncio.StreamReader) -> Optional[str]:
+        """
+        Read a line sent by the client.
+
+        Returns:
+            Optional[str]: The line without whitespace, None if the client
+                has disconnected or sent a too long line.
+        """
+        try:
+            line = await reader.readline()
+        except (asyncio.LimitOverrunError, ValueError):
+            return None
+        if not line:
+            return None
+        return line.decode(ENCODING, errors="replace").strip()
+
+
+    @staticmethod
+    def _write(writer: asyncio.StreamWriter, text: str) -> None:
+        # Telnet clients expect CRLF line endings
+        writer.write(text.replace("\n", "\r\n").encode(ENCODING))
@@ -0,0 +1,398 @@
+import asyncio
+import multiprocessing
+import threading
+import zlib
+
+from collections import Counter
+from itertools import count
+from multiprocessing.connection import Connection
+from queue import SimpleQueue
+from typing import Any, Iterable, Optional
+
+from constants import PATH_CACHE
+from game import OtherWorldGame
+from instrumentation import STATS
+from npcengine import NpcOverlay
+from overlay import WorldOverlay
+from persistence import dump_player, load_player
+from server import GameServer
+from worldcache import WorldCache
+
+
+# Workers load the world themselves. Spawning them rather than forking
+# keeps the event loop and threads of the server out of the workers.
+MP_CONTEXT = multiprocessing.get_context("spawn")
+
+
+def region_of(map_id: str) -> str:
+    """
+    Get the region of a map - the prefix of its ID (`town_0001` -> `town`).
+
+    Args:
+        map_id (str): Map ID
+
+    Returns:
+        str: Region
+    """
+    return map_id.rpartition("_")[0] or map_id
+
+
+def assign_regions(map_ids: Iterable[str], shards: int) -> dict[str, int]:
+    """
+    Split regions among shards, so the shards own similar numbers of maps.
+    The largest regions are assigned first, each to the least loaded shard.
+
+    Args:
+        map_ids (Iterable[str]): IDs of all the maps of the world
+        shards (int): Number of shards
+
+    Returns:
+        dict[str, int]: Region -> shard
+    """
+    sizes = Counter(region_of(x) for x in map_ids)
+    loads = [0] * shards
+    owners = {}
+    for region, size in sorted(sizes.items(), key=lambda x: (-x[1], x[0])):
+        shard = loads.index(min(loads))
+        owners[region] = shard
+        loads[shard] += size
+    return owners
+
+
+def shard_of(owners: dict[str, int], shards: int, map_id: str) -> int:
+    """
+    Get the shard owning a map. Regions missing in `owners` are spread
+    by a hash of their name.
+    """
+    region = region_of(map_id)
+    shard = owners.get(region)
+    if shard is None:
+        shard = zlib.crc32(region.encode()) % shards
+    return shard
+
+
+class ShardWorker(GameServer):
+    """
+    Plays the sessions of the players in the regions owned by a shard.
+
+    The worker runs in its own process (see `run_worker()`) and talks to
+    `ShardedServer` by messages - tuples of plain values:
+
+        ("join", sid, name, state, msg)     Start a session, state of a player
+                                            handed off or None for a new one
+        ("cmd", sid, cmd)                   Play a command
+        ("leave", sid)                      Drop a session
+
+    Commands are answered by `("reply", sid, msg, hp, finished)`. A command
+    moving the player to a region of another shard is answered by
+    `("handoff", sid, shard, msg, state)` instead and the other shard
+    finishes the turn.
+
+    Overlays of isolated sessions (maps and NPCs) stay in the worker, so
+    a handoff carries only the player itself.
+    """
+    def __init__(self, world: OtherWorldGame, shard: int, owners: dict[str, int],
+        shards: int, isolated: bool = False) -> None:
+        """
+        Args:
+            world (OtherWorldGame): Game with the loaded world
+            shard (int): Index of this shard
+            owners (dict[str, int]): Region -> shard, see `assign_regions()`
+            shards (int): Number of shards
+            isolated (bool, optional): If the players have their own world
+                state. Defaults to False.
+        """
+        super().__init__(world, isolated)
+        self.shard = shard
+        self.owners = owners
+        self.shards = shards
+        self.overlays: dict[int, WorldOverlay] = {}
+        self.npc_overlays: dict[int, NpcOverlay] = {}
+
+
+    def handle(self, request: tuple) -> Optional[tuple]:
+        """
+        Handle a message of the server.
+
+        Args:
+            request (tuple): The message
+
+        Returns:
+            Optional[tuple]: The answer, if any
+        """
+        kind = request[0]
+        if kind == "cmd":
+            return self.command(request[1], request[2])
+        if kind == "join":
+            return self.join(*request[1:])
+        if kind == "leave":
+            self.leave(request[1])
+        return None
+
+
+    def join(self, sid: int, name: str, state: Optional[tuple],
+        msg: Optional[str]) -> tuple:
+        game = self.world.new_session(name, self.isolated)
+        if self.isolated:
+            game.overlay = self.overlays.setdefault(sid, game.overlay)
+            if game.npcs is not None:
+                game.npcs = self.npc_overlays.setdefault(sid, game.npcs)
+        if state is None:
+            msg = f"You are here:  {game.current_map.title}"
+        else:
+            game.current_map_id, game.scheduler.turn, player = state
+            load_player(game, player)
+        self.sessions[sid] = game
+        return self._end_turn(sid, game, msg)
+
+
+    def command(self, sid: int, cmd: str) -> tuple:
+        game = self.sessions[sid]
+        msg, finished = self.handle_cmd(game, cmd)
+        if finished:
+            self.leave(sid)
+            return ("reply", sid, msg, game.player.stats.hp, True)
+
+        shard = shard_of(self.owners, self.shards, game.current_map_id)
+        if shard != self.shard:
+            del self.sessions[sid]
+            game.end_session()
+            state = (game.current_map_id, game.scheduler.turn, dump_player(game))
+            return ("handoff", sid, shard, msg, state)
+        return self._end_turn(sid, game, msg)
+
+
+    def leave(self, sid: int) -> None:
+        game = self.sessions.pop(sid, None)
+        if game is not None:
+            game.end_session()
+        self.overlays.pop(sid, None)
+        self.npc_overlays.pop(sid, None)
+
+
+    def _end_turn(self, sid: int, game: OtherWorldGame, msg: str) -> tuple:
+        msg_effects, death = game.end_turn()
+        if msg_effects:
+            msg = f"{msg}\n\n{msg_effects}" if msg else msg_effects
+        if death:
+            self.leave(sid)
+        return ("reply", sid, msg, game.player.stats.hp, death)
+
+
+def run_worker(requests: Connection, replies: Connection, shard: int,
+    owners: dict[str, int], shards: int, items_path: str, maps_path: str,
+    npcs_path: str, max_resident_maps: Optional[int], isolated: bool) -> None:
+    """
+    Main loop of a worker process. Messages are sent in batches (lists),
+    `None` stops the worker.
+    """
+    try:
+        cache = WorldCache(PATH_CACHE)
+        cache.load()
+        world = OtherWorldGame(cache, max_resident_maps)
+        world.load_items(items_path)
+        world.load_maps(maps_path)
+        world.load_npcs(npcs_path)
+        if world.npcs is not None:
+            # NPCs live and wander in the regions of the shard only
+            world.npcs.restrict(lambda x: shard_of(owners, shards, x) == shard)
+        worker = ShardWorker(world, shard, owners, shards, isolated)
+
+        while (batch := requests.recv()) is not None:
+            answers = [x for x in map(worker.handle, batch) if x is not None]
+            if answers:
+                replies.send(answers)
+        world.maps.close()
+    except (KeyboardInterrupt, EOFError):
+        pass
+
+
+class ShardedServer(GameServer):
+    """
+    Hosts many players in a world split by regions across worker processes.
+
+    Map IDs are prefixed by their region (`town_`, `sewers_`, ...). Every
+    region is owned by a single shard - a worker process keeping the state of
+    its maps and playing the turns of the players there (see `ShardWorker`).
+    This process only accepts connections and passes lines between
+    the players and the workers. When a player leaves a region, the player's
+    state is handed off to the shard owning the new one.
+
+    Map inventories are shared by the players of a shard, i.e. by all
+    the players in a region, as in `GameServer`. NPCs don't leave
+    the regions of their shard.
+    """
+    def __init__(self, world: OtherWorldGame, shards: int, items_path: str,
+        maps_path: str, npcs_path: str, max_resident_maps: Optional[int] = None,
+        isolated: bool = False) -> None:
+        """
+        Args:
+            world (OtherWorldGame): Game with the loaded world, its maps are
+                used to split the regions
+            shards (int): Number of worker processes
+            items_path (str): Directory the workers load the items from
+            maps_path (str): Directory the workers load the maps from
+            npcs_path (str): Directory the workers load the NPCs from
+            max_resident_maps (Optional[int], optional): Maximum number of maps
+                kept in the memory of a worker. Defaults to None (all).
+            isolated (bool, optional): If every player should have their own
+                world state. Defaults to False.
+        """
+        super().__init__(world, isolated)
+        self.shards = shards
+        self.owners = assign_regions(world.maps, shards)
+        self.world_args = (items_path, maps_path, npcs_path, max_resident_maps,
+            isolated)
+        self.session_shards: dict[int, int] = {}    # Session -> its shard
+        self._sids = count()
+        self._pending: dict[int, asyncio.Future] = {}
+        self._processes: list[multiprocessing.Process] = []
+        self._queues: list[SimpleQueue] = []
+        self._replies: list[Connection] = []
+
+
+    async def start_tcp(self, host: str, port: int) -> None:
+        self._start_workers()
+        await super().start_tcp(host, port)
+
+
+    async def start_unix(self, path: str) -> None:
+        self._start_workers()
+        await super().start_unix(path)
+
+
+    def close(self) -> None:
+        """
+        Stop the worker processes.
+        """
+        for queue in self._queues:
+            queue.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+
+    def _start_workers(self) -> None:
+        loop = asyncio.get_running_loop()
+        for shard in range(self.shards):
+            requests_out, requests_in = MP_CONTEXT.Pipe(duplex=False)
+            replies_out, replies_in = MP_CONTEXT.Pipe(duplex=False)
+            process = MP_CONTEXT.Process(target=run_worker, daemon=True,
+                args=(requests_out, replies_in, shard, self.owners, self.shards,
+                    *self.world_args))
+            process.start()
+            self._processes.append(process)
+
+            # Sending could block the event loop while a worker is busy,
+            # so requests are sent by a thread.
+            queue: SimpleQueue = SimpleQueue()
+            threading.Thread(target=self._send_requests, args=(queue, requests_in),
+                daemon=True).start()
+            self._queues.append(queue)
+            self._replies.append(replies_out)
+            loop.add_reader(replies_out.fileno(), self._receive_replies, shard)
+
+
+    @staticmethod
+    def _send_requests(queue: SimpleQueue, conn: Connection) -> None:
+        # Requests queued while the previous batch was being sent make
+        # the next batch.
+        while True:
+            batch = [queue.get()]
+            while not queue.empty():
+                batch.append(queue.get())
+            stop = batch[-1] is None
+            if stop:
+                batch.pop()
+            if batch:
+                conn.send(batch)
+            if stop:
+                conn.send(None)
+                return
+
+
+    def _receive_replies(self, shard: int) -> None:
+        conn = self._replies[shard]
+        try:
+            while conn.poll():
+                for reply in conn.recv():
+                    self._handle_reply(reply)
+        except (EOFError, OSError):
+            asyncio.get_running_loop().remove_reader(conn.fileno())
+            for sid, each in list(self.session_shards.items()):
+                future = self._pending.pop(sid, None)
+                if each == shard and future is not None and not future.done():
+                    future.set_exception(ConnectionError(f"Shard {shard} has stopped."))
+
+
+    def _handle_reply(self, reply: tuple) -> None:
+        if reply[0] == "handoff":
+            _, sid, shard, msg, state = reply
+            self.session_shards[sid] = shard
+            self._queues[shard].put(("join", sid, None, state, msg))
+            if STATS.enabled:
+                STATS.count("shard.handoff")
+            return
+
+        _, sid, *result = reply
+        future = self._pending.pop(sid, None)
+        if future is not None and not future.done():
+            future.set_result(result)
+
+
+    async def _request(self, sid: int, request: tuple) -> list[Any]:
+        """
+        Send a message to the shard of a session and wait for the answer.
+
+        Returns:
+            list[Any]: Message, HP of the player and a flag indicating
+                the session should finish.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending[sid] = future
+        self._queues[self.session_shards[sid]].put(request)
+        return await future
+
+
+    async def handle_client(self, reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter) -> None:
+        """
+        Session loop of a single connection. Mirrors `GameServer.handle_client()`,
+        the turns are played by the workers.
+        """
+        sid: Optional[int] = None
+        try:
+            writer.write(b"Welcome to OtherWorld!\r\nWhat's your name? ")
+            name = await self._read_line(reader)
+            if name is None:
+                return
+            sid = next(self._sids)
+            self.session_shards[sid] = shard_of(self.owners, self.shards,
+                self.world.current_map_id)
+
+            request = ("join", sid, name or "Adventurer", None, None)
+            while True:
+                msg, hp, finished = await self._request(sid, request)
+                if msg:
+                    self._write(writer, f"\n{msg}\n")
+                if finished:
+                    break
+
+                self._write(writer, f"\n[HP: {hp}]  Your action: ")
+                await writer.drain()
+                cmd = await self._read_line(reader)
+                if cmd is None:
+                    break
+                request = ("cmd", sid, cmd.lower())
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if sid is not None:
+                self._pending.pop(sid, None)
+                shard = self.session_shards.pop(sid)
+                # Isolated players leave their overlays in every shard visited
+                for queue in (self._queues if self.isolated else [self._queues[shard]]):
+                    queue.put(("leave", sid))
+            writer.close()
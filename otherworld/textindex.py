@@ -0,0 +1,208 @@
+import math
+import re
+
+from array import array
+from collections import Counter
+from typing import Optional
+
+import numpy as np
+
+
+# Words too common to tell documents apart, they are not indexed
+STOP_WORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the "
+    "there this to was with you your".split())
+
+# Title words weigh as much as this many occurrences in the description
+TITLE_WEIGHT = 3
+
+# Candidates covering more than this fraction of all the documents are
+# intersected with other posting lists by scattering rather than searching
+DENSE_FRACTION = 1 / 16
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Split a text into indexed words - lower case, without stop words,
+    plurals folded to singulars (`sewers` -> `sewer`).
+
+    Args:
+        text (str): The text
+
+    Returns:
+        list[str]: The words in the order of the text
+    """
+    return [_fold(x) for x in _WORD_RE.findall(text.lower()) if x not in STOP_WORDS]
+
+
+def _fold(word: str) -> str:
+    # A crude stemmer, good enough for English nouns in descriptions
+    if len(word) > 3 and word[-1] == "s" and word[-2] not in "su":
+        return word[:-1]
+    return word
+
+
+class TextIndex:
+    """
+    Inverted full-text index of titles and descriptions of maps and items.
+
+    Every word has a posting list - IDs of the documents containing it and
+    the word's frequency there - kept in compact arrays. Posting lists only
+    grow: a changed document is added anew and its old version is marked
+    deleted.
+
+    Queries match the documents containing all the words. The candidates
+    are taken from the rarest word and looked up in the other lists
+    by a binary search, so a query takes time proportional to the size of
+    the rarest list rather than to the size of the world. Matches are ranked
+    by tf-idf with title words weighing more. Posting lists are converted
+    to numpy arrays when a query needs them and kept until they change.
+    """
+    def __init__(self) -> None:
+        self._docs: list[str] = []          # Document -> ID
+        self._titles: list[str] = []        # Document -> title
+        self._kinds = bytearray()           # Document -> index to `kinds`
+        self.kinds: list[str] = []          # e.g. "item", "map"
+        self._by_id: list[dict[str, int]] = []  # Per kind: ID -> document
+        self._live = bytearray()            # Document -> 0 if removed
+        self._removed = 0
+        self._post_docs: dict[str, array] = {}
+        self._post_tf: dict[str, array] = {}
+        self._compiled: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        self.complete = False   # If all the maps of the world have been indexed
+
+
+    def __len__(self) -> int:
+        return len(self._docs) - self._removed
+
+
+    def add(self, kind: str, id: str, title: str, description: str) -> None:
+        """
+        Index a document, replacing its previous version.
+
+        Args:
+            kind (str): Kind of the document, e.g. "map"
+            id (str): ID of the document
+            title (str): Title
+            description (str): Description
+        """
+        kind_idx = self._kind_index(kind)
+        self.remove(kind, id)
+        doc = len(self._docs)
+        self._docs.append(id)
+        self._titles.append(title)
+        self._kinds.append(kind_idx)
+        self._live.append(1)
+        self._by_id[kind_idx][id] = doc
+
+        counts = Counter(tokenize(description))
+        for word in tokenize(title):
+            counts[word] += TITLE_WEIGHT
+        for word, tf in counts.items():
+            docs = self._post_docs.get(word)
+            if docs is None:
+                docs = self._post_docs[word] = array("i")
+                self._post_tf[word] = array("H")
+            docs.append(doc)
+            self._post_tf[word].append(min(tf, 0xFFFF))
+            self._compiled.pop(word, None)
+
+
+    def remove(self, kind: str, id: str) -> None:
+        """
+        Remove a document. Unknown documents are ignored.
+
+        Args:
+            kind (str): Kind of the document
+            id (str): ID of the document
+        """
+        if kind not in self.kinds:
+            return
+        doc = self._by_id[self.kinds.index(kind)].pop(id, None)
+        if doc is not None:
+            self._live[doc] = 0
+            self._removed += 1
+
+
+    def has(self, kind: str, id: str) -> bool:
+        return kind in self.kinds and id in self._by_id[self.kinds.index(kind)]
+
+
+    def search(self, query: str, limit: int = 10,
+        kind: Optional[str] = None) -> list[tuple[str, str, str, float]]:
+        """
+        Find documents containing all the words of a query.
+
+        Args:
+            query (str): The query
+            limit (int, optional): Maximum number of results. Defaults to 10.
+            kind (Optional[str], optional): Search only documents of this kind.
+                Defaults to None (all kinds).
+
+        Returns:
+            list[tuple[str, str, str, float]]: Kind, ID, title and score
+                of the best matches, best first
+        """
+        words = list(dict.fromkeys(tokenize(query)))
+        if not words or any(x not in self._post_docs for x in words):
+            return []
+        postings = sorted((self._posting(x) for x in words), key=lambda x: len(x[0]))
+
+        docs, weights = postings[0]
+        scores = weights * self._idf(len(docs))
+        for other_docs, other_weights in postings[1:]:
+            if len(docs) < DENSE_FRACTION * len(self._docs):
+                idx = np.searchsorted(other_docs, docs)
+                idx[idx == len(other_docs)] = 0
+                found = other_docs[idx] == docs
+                other = np.zeros(docs.size)
+                other[found] = other_weights[idx[found]]
+            else:
+                dense = np.zeros(len(self._docs))
+                dense[other_docs] = other_weights
+                other = dense[docs]
+                found = other > 0   # Weights are at least 1
+            docs = docs[found]
+            scores = scores[found] + other[found] * self._idf(len(other_docs))
+            if not docs.size:
+                return []
+
+        if kind is not None:
+            if kind not in self.kinds:
+                return []
+            keep = np.frombuffer(self._kinds, dtype=np.uint8)[docs] == self.kinds.index(kind)
+            docs, scores = docs[keep], scores[keep]
+        if self._removed:
+            keep = np.frombuffer(self._live, dtype=np.uint8)[docs].astype(bool)
+            docs, scores = docs[keep], scores[keep]
+
+        if docs.size > limit:
+            best = np.argpartition(-scores, limit - 1)[:limit]
+            docs, scores = docs[best], scores[best]
+        order = np.lexsort((docs, -scores))     # Ties in the order of indexing
+        return [(self.kinds[self._kinds[x]], self._docs[x], self._titles[x], y)
+            for x, y in zip(docs[order].tolist(), scores[order].tolist())]
+
+
+    def _posting(self, word: str) -> tuple[np.ndarray, np.ndarray]:
+        posting = self._compiled.get(word)
+        if posting is None:
+            docs = np.array(self._post_docs[word], dtype=np.int32)
+            # Sublinear term frequency, a word repeated ten times isn't
+            # ten times as relevant
+            weights = 1.0 + np.log(np.array(self._post_tf[word], dtype=np.float64))
+            posting = self._compiled[word] = (docs, weights)
+        return posting
+
+
+    def _idf(self, df: int) -> float:
+        return math.log(1 + len(self._docs) / df)
+
+
+    def _kind_index(self, kind: str) -> int:
+        if kind not in self.kinds:
+            self.kinds.append(kind)
+            self._by_id.append({})
+        return self.kinds.index(kind)
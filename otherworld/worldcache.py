@@ -0,0 +1,130 @@
+import hashlib
+import os
+import pickle
+
+from pathlib import Path
+from typing import Any, NamedTuple, Optional
+
+
+# Bump whenever the pickled game objects change their layout.
+# Snapshots written with a different version are ignored.
+CACHE_VERSION = 6
+
+
+class CacheEntry(NamedTuple):
+    mtime_ns: int
+    size: int
+    digest: str
+    blob: bytes
+
+
+class WorldCache:
+    """
+    Compiled snapshot of the parsed world.
+
+    Every YAML source file has its own entry holding the pickled game object
+    (an item or a map) built from the file. An entry is valid as long as
+    the file has the same modification time and size, or - if those changed -
+    the same content hash. Only files without a valid entry have to be parsed
+    again.
+
+    The objects are pickled when stored, so later changes of the live
+    game objects (e.g. a player taking an item from a map) never leak
+    into the snapshot.
+    """
+    def __init__(self, path: str) -> None:
+        self.path = Path(path)
+        self.entries: dict[str, CacheEntry] = {}
+        self.modified = False
+        self._seen: set[str] = set()
+
+
+    def load(self) -> None:
+        """
+        Load the snapshot from the disk. A missing, corrupted or outdated
+        snapshot results in an empty cache.
+        """
+        self.entries = {}
+        try:
+            with self.path.open("rb") as fd:
+                version, entries = pickle.load(fd)
+            if version == CACHE_VERSION:
+                self.entries = entries
+        except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+            pass
+        self.modified = False
+        self._seen = set()
+
+
+    def save(self) -> None:
+        """
+        Write the snapshot to the disk if anything has changed.
+
+        Entries of deleted source files are dropped.
+        """
+        # Only files not requested since the last `load()` may be gone.
+        # Maps loaded on demand may not have been requested at all.
+        stale = [x for x in self.entries.keys() - self._seen
+            if not os.path.exists(x)]
+        if not (self.modified or stale):
+            return
+        for key in stale:
+            del self.entries[key]
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with tmp_path.open("wb") as fd:
+            pickle.dump((CACHE_VERSION, self.entries), fd,
+                protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+        self.modified = False
+
+
+    def get(self, file: Path) -> Optional[Any]:
+        """
+        Get a game object built from the file.
+
+        Args:
+            file (Path): Path to the source YAML file
+
+        Returns:
+            Optional[Any]: A fresh copy of the cached object, or None if the file
+                is not cached or it has changed since.
+        """
+        key = str(file.resolve())
+        self._seen.add(key)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+
+        st = file.stat()
+        if entry.mtime_ns != st.st_mtime_ns or entry.size != st.st_size:
+            # The file has been touched - check the content.
+            if entry.digest != self._digest(file):
+                return None
+            self.entries[key] = entry._replace(
+                mtime_ns=st.st_mtime_ns, size=st.st_size)
+            self.modified = True
+        return pickle.loads(entry.blob)
+
+
+    def put(self, file: Path, obj: Any) -> None:
+        """
+        Store a game object built from the file.
+
+        Args:
+            file (Path): Path to the source YAML file
+            obj (Any): Game object loaded from the file
+        """
+        key = str(file.resolve())
+        st = file.stat()
+        self._seen.add(key)
+        self.entries[key] = CacheEntry(st.st_mtime_ns, st.st_size,
+            self._digest(file),
+            pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+        self.modified = True
+
+
+    @staticmethod
+    def _digest(file: Path) -> str:
+        return hashlib.blake2b(file.read_bytes(), digest_size=16).hexdigest()
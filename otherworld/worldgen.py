@@ -0,0 +1,236 @@
+"""
+Generator of synthetic worlds for scale testing.
+
+Writes item and map YAML files in the format of `./resources/`:
+
+    python otherworld/worldgen.py /tmp/world --maps 1000000 --items 100000
+
+The world is played with `python otherworld --world /tmp/world`.
+"""
+import json
+import random
+
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Optional
+
+from constants import FILE_ENCODING, FLAG_COLLECTABLE, FLAG_CONSUMABLE, \
+    FLAG_DROPABLE, MAP_START
+from effect import STAT_NAMES
+
+
+# Maps are split into regions of consecutive maps, the first one is `town`
+REGIONS = ("town", "fields", "forest", "sewers", "caves", "swamp", "hills", "ruins")
+
+# Exits linking consecutive maps come first, the rest leads to random maps
+EXIT_NAMES = ("north", "south", "east", "west", "up", "down", "northeast",
+    "southwest", "northwest", "southeast")
+
+ADJECTIVES = ("green", "red", "rusty", "small", "heavy", "broken", "shiny",
+    "old", "wooden", "stone", "golden", "dusty", "sharp", "soft", "cold",
+    "bitter", "sweet", "tiny", "strange", "ancient")
+NOUNS = ("mushroom", "rock", "bone", "key", "coin", "sword", "apple", "ring",
+    "bottle", "scroll", "torch", "rope", "shield", "feather", "herb", "lamp",
+    "candle", "gem", "mug", "map")
+PLACES = ("square", "street", "meadow", "clearing", "tunnel", "cellar",
+    "crossroads", "bridge", "hut", "yard", "pond", "gate")
+
+# Sorted for reproducible output
+STATS = tuple(sorted(STAT_NAMES))
+
+EFFECT_NAMES = {1: ("food", "blessing", "strength"), -1: ("poison", "curse", "fatigue")}
+
+
+class WorldGenerator:
+    """
+    Generates a world deterministically from a seed.
+
+    Maps are numbered and consecutive maps are linked in both directions,
+    so every map is reachable from the map 0, which is the start map of
+    the game (`MAP_START`) whatever the size of the world.
+    Further exits lead to random maps. Files are written one by one, so
+    the memory used doesn't depend on the size of the world.
+    """
+    def __init__(self, maps: int, items: int, fan_out: int = 4,
+        items_per_map: int = 2, effects_per_item: int = 1, seed: int = 0) -> None:
+        """
+        Args:
+            maps (int): Number of maps
+            items (int): Number of items
+            fan_out (int, optional): Number of exits of a map, at least 2.
+                Defaults to 4.
+            items_per_map (int, optional): Number of item stacks on a map.
+                Defaults to 2.
+            effects_per_item (int, optional): Number of effects of an item.
+                Defaults to 1.
+            seed (int, optional): Random seed. Defaults to 0.
+        """
+        self.map_count = maps
+        self.item_count = items
+        self.fan_out = max(2, min(fan_out, len(EXIT_NAMES)))
+        self.items_per_map = min(items_per_map, items)
+        self.effects_per_item = effects_per_item
+        self.seed = seed
+        self._regions = REGIONS[:max(1, min(len(REGIONS), maps // 1000))]
+        self._region_size = -(-maps // len(self._regions))
+        self._item_width = max(4, len(str(items)))
+
+
+    def map_id(self, idx: int) -> str:
+        """
+        Get ID of a map. The map 0 is the start map. Numbers are padded
+        to 4 digits like in `./resources/`, larger ones just get longer.
+
+        Args:
+            idx (int): Number of the map
+
+        Returns:
+            str: ID of the map
+        """
+        if idx == 0:
+            return MAP_START
+        region, num = divmod(idx, self._region_size)
+        return f"{self._regions[region]}_{num + 1:04d}"
+
+
+    def item_id(self, idx: int) -> str:
+        return f"item_{idx + 1:0{self._item_width}d}"
+
+
+    def item_name(self, idx: int) -> str:
+        """
+        Get a unique name of an item.
+
+        Args:
+            idx (int): Number of the item
+
+        Returns:
+            str: Name of the item
+        """
+        adjective = ADJECTIVES[idx % len(ADJECTIVES)]
+        rest, noun = divmod(idx // len(ADJECTIVES), len(NOUNS))
+        name = f"{adjective} {NOUNS[noun]}"
+        return f"{name} {rest + 1}" if rest else name
+
+
+    def write(self, path: str) -> None:
+        """
+        Write the world to `items` and `maps` subdirectories.
+
+        Args:
+            path (str): Path to the output directory
+        """
+        root = Path(path)
+        for name, render, count in (("items", self.render_item, self.item_count),
+            ("maps", self.render_map, self.map_count)):
+            folder = root / name
+            folder.mkdir(parents=True, exist_ok=True)
+            rng = random.Random(f"{self.seed}/{name}")
+            for idx in range(count):
+                file_id, text = render(idx, rng)
+                with open(folder / f"{file_id}.yaml", "w", encoding=FILE_ENCODING) as fd:
+                    fd.write(text)
+
+
+    def render_item(self, idx: int, rng: random.Random) -> tuple[str, str]:
+        """
+        Render YAML of an item.
+
+        Args:
+            idx (int): Number of the item
+            rng (random.Random): Random generator
+
+        Returns:
+            tuple[str, str]: ID and YAML of the item
+        """
+        item_id = self.item_id(idx)
+        name = self.item_name(idx)
+        flags = [FLAG_COLLECTABLE]
+        if rng.random() < 0.8:
+            flags.append(FLAG_DROPABLE)
+        if rng.random() < 0.3:
+            flags.append(FLAG_CONSUMABLE)
+        effects = []
+        for _ in range(self.effects_per_item):
+            sign = rng.choice((1, -1))
+            effects.append(
+                f"{{name: {_quote(rng.choice(EFFECT_NAMES[sign]))}, "
+                f"stat: {_quote(rng.choice(STATS))}, effect: {sign * rng.randint(1, 3)}, "
+                f"duration: {rng.randint(0, 10)}}}")
+        lines = [
+            f"id: {_quote(item_id)}",
+            f"name: {_quote(name)}",
+            f"title: {_quote(name.capitalize())}",
+            f"description: {_quote(f'It is a {name}, number {idx + 1} of its kind.')}",
+            f"weight: {rng.randint(1, 500) / 100}",
+            f"flags: [{', '.join(_quote(x) for x in flags)}]",
+            f"effects: [{', '.join(effects)}]",
+        ]
+        return (item_id, "\n".join(lines) + "\n")
+
+
+    def render_map(self, idx: int, rng: random.Random) -> tuple[str, str]:
+        """
+        Render YAML of a map.
+
+        Args:
+            idx (int): Number of the map
+            rng (random.Random): Random generator
+
+        Returns:
+            tuple[str, str]: ID and YAML of the map
+        """
+        map_id = self.map_id(idx)
+        place = rng.choice(PLACES)
+        lines = [
+            f"id: {_quote(map_id)}",
+            f"title: {_quote(f'{place.capitalize()} {idx + 1}')}",
+            f"description: {_quote(f'A {rng.choice(ADJECTIVES)} {place}.')}",
+        ]
+
+        exits = []
+        if idx + 1 < self.map_count:
+            exits.append((EXIT_NAMES[0], idx + 1))
+        if idx > 0:
+            exits.append((EXIT_NAMES[1], idx - 1))
+        if self.map_count > 1:
+            for name in EXIT_NAMES[2:self.fan_out]:
+                exits.append((name, rng.randrange(self.map_count)))
+        if exits:
+            lines.append("exits:")
+            lines.extend(f"  - {name}: {_quote(self.map_id(x))}" for name, x in exits)
+
+        stacks = rng.sample(range(self.item_count), self.items_per_map)
+        if stacks:
+            lines.append("items: [" + ", ".join(
+                f"[{_quote(self.item_id(x))}, {rng.randint(1, 5)}]" for x in stacks) + "]")
+        return (map_id, "\n".join(lines) + "\n")
+
+
+def _quote(text: str) -> str:
+    # JSON strings are valid YAML double-quoted scalars
+    return json.dumps(text)
+
+
+def parse_args(argv: Optional[list[str]] = None):
+    parser = ArgumentParser(prog="worldgen",
+        description="Generate a synthetic OtherWorld world.")
+    parser.add_argument("path", help="output directory")
+    parser.add_argument("--maps", type=int, default=1000, help="number of maps")
+    parser.add_argument("--items", type=int, default=100, help="number of items")
+    parser.add_argument("--fan-out", type=int, default=4,
+        help=f"number of exits of a map (2-{len(EXIT_NAMES)})")
+    parser.add_argument("--items-per-map", type=int, default=2,
+        help="number of item stacks on a map")
+    parser.add_argument("--effects-per-item", type=int, default=1,
+        help="number of effects of an item")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    generator = WorldGenerator(args.maps, args.items, args.fan_out,
+        args.items_per_map, args.effects_per_item, args.seed)
+    generator.write(args.path)
+    print(f"{args.maps} maps and {args.items} items written to {args.path}")
@@ -0,0 +1,211 @@
+from array import array
+from collections import deque
+from typing import Iterable, Mapping, Optional
+
+
+class WorldGraph:
+    """
+    Exits of all the maps compiled into an integer-indexed graph.
+
+    Maps are numbered and their exits are stored in compressed sparse row
+    arrays - `targets[offsets[i]:offsets[i + 1]]` are the maps reachable
+    from map `i` in one move. The reverse graph and connected components
+    are precomputed as well, so routes are found by a bidirectional
+    breadth-first search and routes between disconnected parts of the world
+    are rejected immediately.
+
+    Compiling also validates the world: it collects exits leading to
+    unknown maps and maps unreachable from the start map.
+    """
+    def __init__(self) -> None:
+        self.ids: list[str] = []
+        self.index: dict[str, int] = {}
+        self.offsets = array("l", [0])
+        self.targets = array("l")
+        self.sources = array("l")           # Parallel to `targets`
+        self.exit_names: list[str] = []     # Parallel to `targets`
+        self.rev_offsets = array("l")
+        self.rev_edges = array("l")         # Edges grouped by their targets
+        self.components = array("l")        # Weakly connected components
+        self.dangling: list[tuple[str, str, str]] = []
+        self.unreachable: list[str] = []
+
+
+    @classmethod
+    def compile(cls, maps: Iterable[tuple[str, Mapping[str, str]]],
+        start_id: str) -> "WorldGraph":
+        """
+        Compile the graph in a single pass over the maps.
+
+        Args:
+            maps (Iterable[tuple[str, Mapping[str, str]]]): IDs and exits
+                of all the maps of the world, see `MapStore.iter_exits()`
+            start_id (str): ID of the start map
+
+        Returns:
+            WorldGraph: The graph
+        """
+        graph = cls()
+        exits: list[list[tuple[str, str]]] = []
+        for map_id, map_exits in maps:
+            graph.index[map_id] = len(graph.ids)
+            graph.ids.append(map_id)
+            exits.append(list(map_exits.items()))
+
+        for map_id, map_exits in zip(graph.ids, exits):
+            for name, target in map_exits:
+                idx = graph.index.get(target)
+                if idx is None:
+                    graph.dangling.append((map_id, name, target))
+                else:
+                    graph.sources.append(len(graph.offsets) - 1)
+                    graph.targets.append(idx)
+                    graph.exit_names.append(name)
+            graph.offsets.append(len(graph.targets))
+
+        graph._build_reverse()
+        graph._build_components()
+        if start_id in graph.index:
+            seen = graph._reachable(graph.index[start_id])
+            graph.unreachable = [x for idx, x in enumerate(graph.ids) if not seen[idx]]
+        else:
+            graph.unreachable = list(graph.ids)
+        return graph
+
+
+    def report(self) -> str:
+        """
+        Describe problems found in the world.
+
+        Returns:
+            str: Rendered report, one problem per line
+        """
+        lines = [f"Maps: {len(self.ids)}, exits: {len(self.targets)}"]
+        for map_id, name, target in self.dangling:
+            lines.append(f"Dangling exit: {map_id} --{name}--> {target}")
+        for map_id in self.unreachable:
+            lines.append(f"Unreachable map: {map_id}")
+        if not (self.dangling or self.unreachable):
+            lines.append("No problems found.")
+        return "\n".join(lines)
+
+
+    def route(self, source_id: str, target_id: str) -> Optional[list[str]]:
+        """
+        Find a shortest route between two maps.
+
+        Args:
+            source_id (str): ID of the map to start at
+            target_id (str): ID of the destination map
+
+        Returns:
+            Optional[list[str]]: Names of the exits to take, None if there's
+                no route.
+        """
+        src = self.index.get(source_id)
+        dst = self.index.get(target_id)
+        if src is None or dst is None:
+            return None
+        if src == dst:
+            return []
+        if self.components[src] != self.components[dst]:
+            return None
+
+        # Bidirectional BFS, always expanding the smaller frontier
+        parent = {src: (-1, -1)}    # Node -> (previous node, edge)
+        child = {dst: (-1, -1)}     # Node -> (next node, edge)
+        front, back = [src], [dst]
+        offsets, targets = self.offsets, self.targets
+        rev_offsets, rev_edges = self.rev_offsets, self.rev_edges
+        meet = -1
+        while front and back and meet < 0:
+            if len(front) <= len(back):
+                next_front = []
+                for node in front:
+                    for edge in range(offsets[node], offsets[node + 1]):
+                        target = targets[edge]
+                        if target not in parent:
+                            parent[target] = (node, edge)
+                            if target in child:
+                                meet = target
+                                break
+                            next_front.append(target)
+                    if meet >= 0:
+                        break
+                front = next_front
+            else:
+                next_back = []
+                for node in back:
+                    for rev in range(rev_offsets[node], rev_offsets[node + 1]):
+                        edge = rev_edges[rev]
+                        source = self.sources[edge]
+                        if source not in child:
+                            child[source] = (node, edge)
+                            if source in parent:
+                                meet = source
+                                break
+                            next_back.append(source)
+                    if meet >= 0:
+                        break
+                back = next_back
+        if meet < 0:
+            return None
+
+        result = []
+        node = meet
+        while parent[node][0] >= 0:
+            node, edge = parent[node]
+            result.append(self.exit_names[edge])
+        result.reverse()
+        node = meet
+        while child[node][0] >= 0:
+            node, edge = child[node]
+            result.append(self.exit_names[edge])
+        return result
+
+
+    def _build_reverse(self) -> None:
+        counts = [0] * (len(self.ids) + 1)
+        for target in self.targets:
+            counts[target + 1] += 1
+        for idx in range(len(self.ids)):
+            counts[idx + 1] += counts[idx]
+        self.rev_offsets = array("l", counts)
+        self.rev_edges = array("l", bytes(self.targets.itemsize * len(self.targets)))
+        fill = counts[:-1]
+        for edge, target in enumerate(self.targets):
+            self.rev_edges[fill[target]] = edge
+            fill[target] += 1
+
+
+    def _build_components(self) -> None:
+        self.components = array("l", [-1] * len(self.ids))
+        for start in range(len(self.ids)):
+            if self.components[start] >= 0:
+                continue
+            self.components[start] = start
+            queue = deque([start])
+            while queue:
+                node = queue.popleft()
+                neighbours = [self.targets[x]
+                    for x in range(self.offsets[node], self.offsets[node + 1])]
+                neighbours += [self.sources[self.rev_edges[x]]
+                    for x in range(self.rev_offsets[node], self.rev_offsets[node + 1])]
+                for each in neighbours:
+                    if self.components[each] < 0:
+                        self.components[each] = start
+                        queue.append(each)
+
+
+    def _reachable(self, start: int) -> list[bool]:
+        seen = [False] * len(self.ids)
+        seen[start] = True
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            for edge in range(self.offsets[node], self.offsets[node + 1]):
+                target = self.targets[edge]
+                if not seen[target]:
+                    seen[target] = True
+                    queue.append(target)
+        return seen
@@ -0,0 +1,67 @@
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Optional, TextIO
+
+from yaml import load
+
+try:
+    # libyaml bindings are much faster than the pure-Python parser
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+from constants import FILE_ENCODING
+
+
+# Starting worker processes costs more than parsing a few files serially.
+PARALLEL_MIN_FILES = 256
+
+
+def load_yaml(fd: TextIO) -> Any:
+    """
+    Parse a YAML document using the fastest available safe loader.
+
+    Args:
+        fd (TextIO): File descriptor of the source YAML file
+
+    Returns:
+        Any: Parsed data
+    """
+    return load(fd, Loader=SafeLoader)
+
+
+def load_yaml_file(path: Path) -> Any:
+    """
+    Parse a YAML file. The file is closed before returning.
+
+    Args:
+        path (Path): Path to the YAML file
+
+    Returns:
+        Any: Parsed data
+    """
+    with open(path, encoding=FILE_ENCODING) as fd:
+        return load_yaml(fd)
+
+
+def load_yaml_files(paths: list[Path], workers: Optional[int] = None) -> list[Any]:
+    """
+    Parse several YAML files, in a process pool if there are enough of them.
+
+    Args:
+        paths (list[Path]): Paths to the YAML files
+        workers (Optional[int], optional): Number of worker processes.
+            Defaults to the number of CPUs.
+
+    Returns:
+        list[Any]: Parsed data in the order of `paths`
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers < 2 or len(paths) < PARALLEL_MIN_FILES:
+        return [load_yaml_file(each) for each in paths]
+
+    chunksize = max(1, len(paths) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(load_yaml_file, paths, chunksize=chunksize))